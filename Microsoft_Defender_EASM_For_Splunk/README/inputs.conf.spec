@@ -30,6 +30,53 @@ sourcetype = <string>
 index = <string>
 * Target index for ingested events.
 
+checkpoint_every_items = <integer>
+* Paged listings (inventory, ASNs, SSL certificates, DNS records, WHOIS
+  contacts, exposure insights) save a resume point after every page and
+  every this many items within a page, never ahead of the events
+  written. A run stopped by SIGTERM/SIGINT, an error or a crash resumes
+  at the next unwritten item instead of the start of the listing.
+* 0 saves at page boundaries only. Partitioned slices (partitions > 1)
+  always resume at page boundaries.
+* Default: 500
+
+max_runtime = <integer>
+* Seconds a run may take. Once spent, paged listings save their resume
+  point and stop, and the next run continues from there; pulls without
+  a resume point (control-plane snapshots) finish what they started.
+* Independently of this setting, a run that starts while the previous
+  run of the same stanza is still going is skipped, recorded in the run
+  history as "skipped" and, with metrics on, written as a
+  defender:easm:metrics record=run status=skipped event.
+* 0 = no limit.
+* Default: 0
+
+metrics = <boolean>
+* Writes a run summary to sourcetype defender:easm:metrics when each run
+  ends (record=run): pages, items, bytes received/written, request
+  latency percentiles and histogram, retries, 429s, token fetch time,
+  time blocked on the event output, and checkpoint lag. Counters are
+  pre-aggregated in memory, so this is cheap enough to leave on.
+* Feeds the Health dashboard.
+* Default: true
+
+metrics_pages = <boolean>
+* Also writes one record=page event per listed page (path, items,
+  bytes, seconds, page size), at most 10000 per run.
+* Default: false
+
+profile = <boolean>
+* Profiles each run with cProfile and tracemalloc. The merged pstats and
+  a report of the top functions and allocation sites are written to
+  $SPLUNK_HOME/var/lib/splunk/modinputs/Microsoft_Defender_EASM_For_Splunk/profiles
+  (newest 40 files, within profile_max_mb of the setup settings), plus a
+  record=profile event to defender:easm:metrics naming the hottest
+  functions.
+* Can also be turned on from the setup page (profile_inputs), without
+  editing the stanza.
+* Profiling slows the run; meant for diagnosing a slow input.
+* Default: false
+
 ############################
 # CORE INVENTORY (DATA PLANE)
 ############################
@@ -37,18 +84,320 @@ index = <string>
 [defender_easm_domains]
 * Collects domain assets from Defender EASM.
 
+partitions = <integer>
+* Splits the listing into this many OData $filter slices on
+  partition_field and drains them concurrently. A $count probe sizes
+  the slices; each slice keeps its own resumable cursor and progress/ETA
+  is logged to splunkd.log.
+* 1 pages serially.
+* Default: 1
+
+partition_field = <string>
+* Timestamp field the slices are cut on. Use an immutable field so
+  assets cannot move between slices during the pull.
+* Default: firstSeen
+
+delta_mode = <boolean>
+* Writes only assets that are new or whose content changed since the
+  last complete pull. A digest index (16 bytes per asset, in the
+  checkpoint directory) compares a hash of each asset's canonical JSON,
+  ignoring delta_ignore_fields.
+* Default: false
+
+full_snapshot_every = <integer>
+* In delta mode, every Nth complete run writes every asset, so searches
+  such as dc(easm_id) over the snapshot interval stay complete.
+* 0 writes a full snapshot only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+delta_ignore_fields = <string>
+* Comma-separated fields left out of the digest because they change on
+  every crawl, each as its full dotted path from the top of the asset
+  (asset.lastSeen is the lastSeen inside "asset"; a bare lastSeen is only
+  the top-level one). Paths do not descend into lists.
+* Default: updatedDate,lastSeen,asset.lastSeen,asset.count
+
+track_removals = <boolean>
+* Keeps a sorted snapshot of asset id hashes (8 bytes per asset, in the
+  checkpoint directory) and, after each complete pull, writes one
+  defender:easm:asset_removed event per asset that was in the previous
+  snapshot but is no longer returned. Interrupted pulls resume their
+  snapshot; a pull that returns no assets writes no tombstones.
+* Default: false
+
+incremental = <boolean>
+* Lists only assets whose watermark_field is at or after the newest
+  value seen by the last complete pull (OData $filter ... ge ...). Ids
+  already written at that exact instant are kept with the watermark and
+  skipped, so assets sharing a timestamp are neither lost nor duplicated.
+  Values within 5 minutes of the pull's start do not move the watermark;
+  those assets are listed again next run.
+* Incremental pulls do not track removals, and in delta mode they merge
+  into the digest index instead of replacing it.
+* Default: false
+
+watermark_field = <string>
+* Timestamp field the watermark is kept on (an OData property path such
+  as properties/lastSeen is allowed). Changing it starts over with a
+  full pull.
+* Default: updatedDate
+
+reconcile_every = <integer>
+* In incremental mode, every Nth run lists everything (a reconciliation
+  pull), so removal tracking and delta mode see the whole inventory.
+  In delta mode, full_snapshot_every then counts reconciliation pulls.
+* 0 lists everything only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+tenant_id = <string>
+client_id = <string>
+client_secret = <string>
+subscription_id = <string>
+resource_group = <string>
+workspace_name = <string>
+* Optional. Each one set here replaces the value from the app setup for
+  this input only, so one stanza per tenant or workspace can collect
+  from several EASM workspaces. Keys left unset fall back to the setup.
+* client_secret here is stored in clear text in inputs.conf; prefer the
+  setup page (storage/passwords) where a single tenant is enough.
+* Also accepted by hosts, pages, ip_addresses and ip_blocks.
+
 [defender_easm_hosts]
 * Collects host assets from Defender EASM.
 
+partitions = <integer>
+* Splits the listing into this many OData $filter slices on
+  partition_field and drains them concurrently. A $count probe sizes
+  the slices; each slice keeps its own resumable cursor and progress/ETA
+  is logged to splunkd.log.
+* 1 pages serially.
+* Default: 1
+
+partition_field = <string>
+* Timestamp field the slices are cut on. Use an immutable field so
+  assets cannot move between slices during the pull.
+* Default: firstSeen
+
+delta_mode = <boolean>
+* Writes only assets that are new or whose content changed since the
+  last complete pull. A digest index (16 bytes per asset, in the
+  checkpoint directory) compares a hash of each asset's canonical JSON,
+  ignoring delta_ignore_fields.
+* Default: false
+
+full_snapshot_every = <integer>
+* In delta mode, every Nth complete run writes every asset, so searches
+  such as dc(easm_id) over the snapshot interval stay complete.
+* 0 writes a full snapshot only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+delta_ignore_fields = <string>
+* Comma-separated fields left out of the digest because they change on
+  every crawl, each as its full dotted path from the top of the asset
+  (asset.lastSeen is the lastSeen inside "asset"; a bare lastSeen is only
+  the top-level one). Paths do not descend into lists.
+* Default: updatedDate,lastSeen,asset.lastSeen,asset.count
+
+track_removals = <boolean>
+* Keeps a sorted snapshot of asset id hashes (8 bytes per asset, in the
+  checkpoint directory) and, after each complete pull, writes one
+  defender:easm:asset_removed event per asset that was in the previous
+  snapshot but is no longer returned. Interrupted pulls resume their
+  snapshot; a pull that returns no assets writes no tombstones.
+* Default: false
+
+incremental = <boolean>
+* Lists only assets whose watermark_field is at or after the newest
+  value seen by the last complete pull (OData $filter ... ge ...). Ids
+  already written at that exact instant are kept with the watermark and
+  skipped, so assets sharing a timestamp are neither lost nor duplicated.
+  Values within 5 minutes of the pull's start do not move the watermark;
+  those assets are listed again next run.
+* Incremental pulls do not track removals, and in delta mode they merge
+  into the digest index instead of replacing it.
+* Default: false
+
+watermark_field = <string>
+* Timestamp field the watermark is kept on (an OData property path such
+  as properties/lastSeen is allowed). Changing it starts over with a
+  full pull.
+* Default: updatedDate
+
+reconcile_every = <integer>
+* In incremental mode, every Nth run lists everything (a reconciliation
+  pull), so removal tracking and delta mode see the whole inventory.
+  In delta mode, full_snapshot_every then counts reconciliation pulls.
+* 0 lists everything only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+tenant_id = <string>
+client_id = <string>
+client_secret = <string>
+subscription_id = <string>
+resource_group = <string>
+workspace_name = <string>
+* Optional per-stanza connection. See [defender_easm_domains].
+
 [defender_easm_pages]
 * Collects discovered web page assets from Defender EASM.
 
+partitions = <integer>
+* Splits the listing into this many OData $filter slices on
+  partition_field and drains them concurrently. A $count probe sizes
+  the slices; each slice keeps its own resumable cursor and progress/ETA
+  is logged to splunkd.log.
+* 1 pages serially.
+* Default: 1
+
+partition_field = <string>
+* Timestamp field the slices are cut on. Use an immutable field so
+  assets cannot move between slices during the pull.
+* Default: firstSeen
+
+delta_mode = <boolean>
+* Writes only assets that are new or whose content changed since the
+  last complete pull. A digest index (16 bytes per asset, in the
+  checkpoint directory) compares a hash of each asset's canonical JSON,
+  ignoring delta_ignore_fields.
+* Default: false
+
+full_snapshot_every = <integer>
+* In delta mode, every Nth complete run writes every asset, so searches
+  such as dc(easm_id) over the snapshot interval stay complete.
+* 0 writes a full snapshot only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+delta_ignore_fields = <string>
+* Comma-separated fields left out of the digest because they change on
+  every crawl, each as its full dotted path from the top of the asset
+  (asset.lastSeen is the lastSeen inside "asset"; a bare lastSeen is only
+  the top-level one). Paths do not descend into lists.
+* Default: updatedDate,lastSeen,asset.lastSeen,asset.count
+
+track_removals = <boolean>
+* Keeps a sorted snapshot of asset id hashes (8 bytes per asset, in the
+  checkpoint directory) and, after each complete pull, writes one
+  defender:easm:asset_removed event per asset that was in the previous
+  snapshot but is no longer returned. Interrupted pulls resume their
+  snapshot; a pull that returns no assets writes no tombstones.
+* Default: false
+
+incremental = <boolean>
+* Lists only assets whose watermark_field is at or after the newest
+  value seen by the last complete pull (OData $filter ... ge ...). Ids
+  already written at that exact instant are kept with the watermark and
+  skipped, so assets sharing a timestamp are neither lost nor duplicated.
+  Values within 5 minutes of the pull's start do not move the watermark;
+  those assets are listed again next run.
+* Incremental pulls do not track removals, and in delta mode they merge
+  into the digest index instead of replacing it.
+* Default: false
+
+watermark_field = <string>
+* Timestamp field the watermark is kept on (an OData property path such
+  as properties/lastSeen is allowed). Changing it starts over with a
+  full pull.
+* Default: updatedDate
+
+reconcile_every = <integer>
+* In incremental mode, every Nth run lists everything (a reconciliation
+  pull), so removal tracking and delta mode see the whole inventory.
+  In delta mode, full_snapshot_every then counts reconciliation pulls.
+* 0 lists everything only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+tenant_id = <string>
+client_id = <string>
+client_secret = <string>
+subscription_id = <string>
+resource_group = <string>
+workspace_name = <string>
+* Optional per-stanza connection. See [defender_easm_domains].
+
 [defender_easm_ip_addresses]
 * Collects individual IP address assets from Defender EASM.
 
+delta_mode = <boolean>
+* Writes only assets that are new or whose content changed since the
+  last complete pull. A digest index (16 bytes per asset, in the
+  checkpoint directory) compares a hash of each asset's canonical JSON,
+  ignoring delta_ignore_fields.
+* Default: false
+
+full_snapshot_every = <integer>
+* In delta mode, every Nth complete run writes every asset, so searches
+  such as dc(easm_id) over the snapshot interval stay complete.
+* 0 writes a full snapshot only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+delta_ignore_fields = <string>
+* Comma-separated fields left out of the digest because they change on
+  every crawl, each as its full dotted path from the top of the asset
+  (asset.lastSeen is the lastSeen inside "asset"; a bare lastSeen is only
+  the top-level one). Paths do not descend into lists.
+* Default: updatedDate,lastSeen,asset.lastSeen,asset.count
+
+track_removals = <boolean>
+* Keeps a sorted snapshot of asset id hashes (8 bytes per asset, in the
+  checkpoint directory) and, after each complete pull, writes one
+  defender:easm:asset_removed event per asset that was in the previous
+  snapshot but is no longer returned. Interrupted pulls resume their
+  snapshot; a pull that returns no assets writes no tombstones.
+* Default: false
+
+incremental = <boolean>
+* Lists only assets whose watermark_field is at or after the newest
+  value seen by the last complete pull (OData $filter ... ge ...). Ids
+  already written at that exact instant are kept with the watermark and
+  skipped, so assets sharing a timestamp are neither lost nor duplicated.
+  Values within 5 minutes of the pull's start do not move the watermark;
+  those assets are listed again next run.
+* Incremental pulls do not track removals, and in delta mode they merge
+  into the digest index instead of replacing it.
+* Default: false
+
+watermark_field = <string>
+* Timestamp field the watermark is kept on (an OData property path such
+  as properties/lastSeen is allowed). Changing it starts over with a
+  full pull.
+* Default: updatedDate
+
+reconcile_every = <integer>
+* In incremental mode, every Nth run lists everything (a reconciliation
+  pull), so removal tracking and delta mode see the whole inventory.
+  In delta mode, full_snapshot_every then counts reconciliation pulls.
+* 0 lists everything only on the first run.
+* Default: 4 (daily at the default 6 hour interval)
+
+tenant_id = <string>
+client_id = <string>
+client_secret = <string>
+subscription_id = <string>
+resource_group = <string>
+workspace_name = <string>
+* Optional per-stanza connection. See [defender_easm_domains].
+
 [defender_easm_ip_blocks]
 * Collects IP block assets from Defender EASM.
 
+incremental = <boolean>
+* See [defender_easm_domains].
+* Default: false
+
+watermark_field = <string>
+* Default: updatedDate
+
+reconcile_every = <integer>
+* Default: 4
+
+tenant_id = <string>
+client_id = <string>
+client_secret = <string>
+subscription_id = <string>
+resource_group = <string>
+workspace_name = <string>
+* Optional per-stanza connection. See [defender_easm_domains].
+
 [defender_easm_asns]
 * Collects Autonomous System Number (ASN) assets from Defender EASM.
 
@@ -121,3 +470,67 @@ index = <string>
 
 [defender_easm_license]
 * Collects Defender EASM license information.
+
+############################
+# AGGREGATE (SINGLE INSTANCE)
+############################
+
+[defender_easm_all_assets]
+* Collects several asset types concurrently in one modular input
+* process (use_single_instance), sharing one HTTP session, one token
+* per API plane and one event stream. Checkpoints are kept per asset type.
+
+asset_types = <string>
+* Comma-separated asset types, or "all".
+* Supported: domains, hosts, pages, ip_addresses, ip_blocks, asns,
+  ssl_certificates, dns_records, whois_contacts, exposure_insights,
+  discovery_templates, discovery_runs, tasks, data_connections,
+  data_connection_validation, reports, report_output,
+  rbac_role_definitions, rbac_role_assignments, workspaces,
+  operations, license
+* Default: all
+
+max_workers = <integer>
+* Number of asset types pulled concurrently.
+* Inventory pulls may use at most max_workers - 1 workers, so short
+  control-plane pulls (tasks, operations, license, ...) always have one.
+* Default: 4
+
+partitions = <integer>
+* Applies to the inventory listings (domains, hosts, pages, ip_addresses,
+  ip_blocks, asns, ssl_certificates); see [defender_easm_domains].
+* Default: 1
+
+partition_field = <string>
+* Default: firstSeen
+
+delta_mode = <boolean>
+* Applies to the inventory listings; see [defender_easm_domains].
+* Default: false
+
+full_snapshot_every = <integer>
+* Default: 4
+
+delta_ignore_fields = <string>
+* Default: updatedDate,lastSeen,asset.lastSeen,asset.count
+
+track_removals = <boolean>
+* Applies to domains, hosts, pages and ip_addresses; see [defender_easm_domains].
+* Default: false
+
+incremental = <boolean>
+* Applies to the management-plane inventory (domains, hosts, pages,
+  ip_addresses, ip_blocks); see [defender_easm_domains].
+* Default: false
+
+watermark_field = <string>
+* Default: updatedDate
+
+reconcile_every = <integer>
+* Default: 4
+
+max_runtime = <integer>
+* Budget for the whole stanza; see [<stanza>]. When set, the asset types
+  that waited longest since their last run are started first, so types
+  cut off by the budget are not starved run after run.
+* Default: 0
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Microsoft Defender EASM for Splunk App
+Modular Input: All Asset Types (single instance)
+
+Runs any chosen set of asset types in one warm process instead of one
+cold process per inputs.conf stanza.
+
+Responsibilities:
+- One keep-alive session and one token per API plane for every asset type
+- Bounded worker pool; long inventory pulls and short control-plane
+  pulls are scheduled so the short ones never queue behind the long ones
+- Per-type checkpoints (scoped to this stanza), keyed and indexed as
+  the type's own input does
+- One EventWriter shared by all workers
+
+Design constraints:
+- No enrichment
+- No field mutation
+- Raw JSON only
+"""
+
+import sys
+import time
+import importlib
+import threading
+import traceback
+from collections import deque
+
+import splunklib.modularinput as smi
+
+from defender_easm_common import (
+    APP_NAME,
+    SHUTDOWN_JOIN_SECONDS,
+    EASMAssetListInput,
+    EASMSharedEventWriter,
+    EASMShutdown,
+    build_api_client,
+    get_logger,
+    get_state_store,
+    install_shutdown_handlers,
+    open_event_writer,
+    open_run_guard,
+    run_context_bound,
+    shutdown_requested,
+)
+
+# Scheduling classes
+BULK = "bulk"
+CONTROL = "control"
+
+DEFAULT_MAX_WORKERS = 4
+
+# EASMModularInput collectors reused as-is, so each type keeps the
+# checkpoint keys and index of its own input:
+#   name -> (module, class, scheduling class)
+COLLECTOR_TYPES = {
+    "domains": ("defender_easm_domains", "DefenderEASMDomains", BULK),
+    "hosts": ("defender_easm_hosts", "DefenderEASMHosts", BULK),
+    "pages": ("defender_easm_pages", "DefenderEASMPages", BULK),
+    "ip_addresses": ("defender_easm_ip_addresses", "DefenderEASMIPAddresses", BULK),
+    "ip_blocks": ("defender_easm_ip_blocks", "DefenderEASMIPBlocks", BULK),
+    "asns": ("defender_easm_asns", "DefenderEASMAsns", BULK),
+    "ssl_certificates": ("defender_easm_ssl_certificates", "DefenderEASMSslCertificatesCollector", BULK),
+    "dns_records": ("defender_easm_dns_records", "DefenderEASMDnsRecords", BULK),
+    "whois_contacts": ("defender_easm_whois_contacts", "DefenderEASMWhoisContacts", BULK),
+    "exposure_insights": ("defender_easm_exposure_insights", "DefenderEASMExposureInsights", BULK),
+    "discovery_templates": ("defender_easm_discovery_templates", "DefenderEASMDiscoveryTemplates", CONTROL),
+    "discovery_runs": ("defender_easm_discovery_runs", "DefenderEASMDiscoveryRuns", CONTROL),
+    "tasks": ("defender_easm_tasks", "DefenderEASMTasks", CONTROL),
+    "data_connections": ("defender_easm_data_connections", "DefenderEASMDataConnections", CONTROL),
+    "data_connection_validation": (
+        "defender_easm_data_connection_validation", "DefenderEASMDataConnectionValidation", CONTROL
+    ),
+    "reports": ("defender_easm_reports", "DefenderEASMReports", CONTROL),
+    "report_output": ("defender_easm_report_output", "DefenderEASMReportOutput", CONTROL),
+    "rbac_role_definitions": ("defender_easm_rbac_role_definitions", "DefenderEASMRbacRoleDefinitions", CONTROL),
+    "rbac_role_assignments": ("defender_easm_rbac_role_assignments", "DefenderEASMRbacRoleAssignments", CONTROL),
+    "workspaces": ("defender_easm_workspaces", "DefenderEASMWorkspaces", CONTROL),
+    "operations": ("defender_easm_operations", "DefenderEASMOperations", CONTROL),
+    "license": ("defender_easm_license", "DefenderEASMLicense", CONTROL),
+}
+
+ALL_TYPES = list(COLLECTOR_TYPES)
+
+
+def _build_collector(name):
+    """
+    Returns (collector, scheduling class) for an asset type name.
+    """
+    module_name, class_name, sched = COLLECTOR_TYPES[name]
+    module = importlib.import_module(module_name)
+    cls = getattr(module, class_name)
+    if issubclass(cls, EASMAssetListInput):
+        collector = cls(asset_name=name, sourcetype=module.SOURCETYPE, path=module.API_PATH)
+    else:
+        collector = cls(asset_name=name, sourcetype=module.SOURCETYPE)
+    return collector, sched
+
+
+def _parse_asset_types(value):
+    value = (value or "all").strip()
+    if value.lower() == "all":
+        return list(ALL_TYPES)
+
+    names = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [n for n in names if n not in COLLECTOR_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown asset_types: {', '.join(unknown)}")
+    return names
+
+
+class _FairScheduler:
+    """
+    Bounded worker pool with two queues.
+
+    Control-plane jobs are taken first, and bulk jobs may hold at most
+    max_workers - 1 workers, so one worker is always left for the short
+    pulls while the long inventories drain concurrently.
+
+    Under a max_runtime budget jobs carry the start of their last run
+    (waited_since) and the queue whose head has waited longer goes
+    first, so neither class is starved by runs that are cut short.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self.bulk_limit = max(1, self.max_workers - 1)
+
+        self._cond = threading.Condition()
+        self._queues = {CONTROL: deque(), BULK: deque()}
+        self._bulk_running = 0
+        self.errors = {}
+
+    def submit(self, sched, name, fn, waited_since=0.0):
+        self._queues[sched].append((waited_since, name, fn))
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                control = self._queues[CONTROL]
+                bulk = self._queues[BULK] if self._bulk_running < self.bulk_limit else None
+                if control and not (bulk and bulk[0][0] < control[0][0]):
+                    return CONTROL, control.popleft()[1:]
+                if bulk:
+                    self._bulk_running += 1
+                    return BULK, bulk.popleft()[1:]
+                if not self._queues[BULK]:
+                    return None, None
+                self._cond.wait()
+
+    def _worker(self):
+        while not shutdown_requested():
+            sched, job = self._next_job()
+            if job is None:
+                return
+
+            name, fn = job
+            try:
+                fn()
+            except EASMShutdown:
+                # Progress was saved on the way out; take no further jobs
+                pass
+            except Exception as exc:
+                self.errors[name] = exc
+            finally:
+                if sched == BULK:
+                    with self._cond:
+                        self._bulk_running -= 1
+                        self._cond.notify_all()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._worker, name=f"easm-worker-{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            while t.is_alive() and not shutdown_requested():
+                t.join(0.5)
+        if shutdown_requested():
+            # Workers stop at their next item; let them save where they are
+            # before the shared writer is closed
+            deadline = time.monotonic() + SHUTDOWN_JOIN_SECONDS
+            for t in threads:
+                t.join(max(0.0, deadline - time.monotonic()))
+        return self.errors
+
+
+def _last_started(namespace):
+    runs = get_state_store().runs(namespace, 1)
+    return runs[0]["started"] if runs else 0.0
+
+
+class DefenderEASMAllAssets(smi.Script):
+
+    def get_scheme(self):
+        scheme = smi.Scheme("Defender EASM All Asset Types")
+        scheme.description = (
+            "Collect several Defender EASM asset types concurrently in one process"
+        )
+        scheme.use_external_validation = True
+        scheme.use_single_instance = True
+
+        asset_types = smi.Argument("asset_types")
+        asset_types.title = "Asset types"
+        asset_types.description = (
+            "Comma-separated asset types to collect, or 'all'. "
+            f"Supported: {', '.join(ALL_TYPES)}"
+        )
+        asset_types.data_type = smi.Argument.data_type_string
+        asset_types.required_on_create = False
+        scheme.add_argument(asset_types)
+
+        max_workers = smi.Argument("max_workers")
+        max_workers.title = "Max workers"
+        max_workers.description = f"Concurrent asset-type pulls (default {DEFAULT_MAX_WORKERS})"
+        max_workers.data_type = smi.Argument.data_type_number
+        max_workers.required_on_create = False
+        scheme.add_argument(max_workers)
+
+        max_runtime = smi.Argument("max_runtime")
+        max_runtime.title = "Max runtime"
+        max_runtime.description = "Seconds a run may take before it saves its place and stops (default 0 = no limit)"
+        max_runtime.data_type = smi.Argument.data_type_number
+        max_runtime.required_on_create = False
+        scheme.add_argument(max_runtime)
+
+        metrics = smi.Argument("metrics")
+        metrics.title = "Run metrics"
+        metrics.description = "Write a run summary per asset type to defender:easm:metrics (default true)"
+        metrics.data_type = smi.Argument.data_type_boolean
+        metrics.required_on_create = False
+        scheme.add_argument(metrics)
+
+        metrics_pages = smi.Argument("metrics_pages")
+        metrics_pages.title = "Per-page metrics"
+        metrics_pages.description = "Also write one metrics record per page (default false)"
+        metrics_pages.data_type = smi.Argument.data_type_boolean
+        metrics_pages.required_on_create = False
+        scheme.add_argument(metrics_pages)
+
+        profile = smi.Argument("profile")
+        profile.title = "Profile runs"
+        profile.description = "Profile each asset type's run with cProfile and tracemalloc (default false)"
+        profile.data_type = smi.Argument.data_type_boolean
+        profile.required_on_create = False
+        scheme.add_argument(profile)
+
+        return scheme
+
+    def validate_input(self, definition):
+        _parse_asset_types(definition.parameters.get("asset_types"))
+
+        max_workers = definition.parameters.get("max_workers")
+        if max_workers not in (None, "") and int(max_workers) < 1:
+            raise ValueError("max_workers must be >= 1")
+
+    def stream_events(self, inputs, ew):
+        logger = get_logger("all_assets")
+        session_key = inputs.metadata["session_key"]
+        # A stop from splunkd saves progress instead of killing the run
+        install_shutdown_handlers()
+        # Every worker's events go through one batched writer (stdout or HEC)
+        writer = EASMSharedEventWriter(open_event_writer(ew, session_key))
+
+        try:
+            for stanza_name, stanza in inputs.inputs.items():
+                stanza = stanza or {}
+                # Skips while the last run of this stanza is still going
+                with open_run_guard(stanza, f"{APP_NAME}::all_assets::{stanza_name}", logger, writer, stanza_name) as guard:
+                    if guard.acquired:
+                        self._collect_stanza(session_key, stanza_name, stanza, writer, logger)
+        finally:
+            writer.close()
+
+    def _collect_stanza(self, session_key, stanza_name, stanza, writer, logger):
+        names = _parse_asset_types(stanza.get("asset_types"))
+        max_workers = int(stanza.get("max_workers") or DEFAULT_MAX_WORKERS)
+
+        scheduler = _FairScheduler(max_workers)
+
+        # One client per plane, shared by every worker; the pool is
+        # sized so each worker keeps its own keep-alive connection.
+        apis = {}
+        jobs = []
+        budgeted = float(stanza.get("max_runtime") or 0) > 0
+        for name in names:
+            collector, sched = _build_collector(name)
+            if collector.plane not in apis:
+                apis[collector.plane] = build_api_client(
+                    session_key, collector.plane, pool_size=max_workers * 2, logger=logger
+                )
+            collector.bind(session_key, stanza_name, stanza, apis[collector.plane], writer)
+            # Under a time budget the types that waited longest go first, so
+            # the ones queued last are not starved run after run
+            waited_since = _last_started(collector.state_namespace) if budgeted else 0.0
+            jobs.append((waited_since, sched, name, collector))
+
+        jobs.sort(key=lambda job: job[0])
+        for waited_since, sched, name, collector in jobs:
+            # Workers report to this stanza's run guard (retry budget) and
+            # profiler like the main thread would
+            scheduler.submit(sched, name, run_context_bound(collector.run_collect), waited_since)
+
+        logger.info(f"{stanza_name}: collecting {len(names)} asset types with {max_workers} workers")
+        errors = scheduler.run()
+
+        for name, exc in errors.items():
+            writer.log(
+                smi.EventWriter.ERROR,
+                f"defender_easm_all_assets {name} failed: {exc}\n"
+                f"{''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))}"
+            )
+
+        if shutdown_requested():
+            logger.info(f"{stanza_name}: stopped early; unfinished asset types continue next run")
+        logger.info(
+            f"{stanza_name}: {len(names) - len(errors)}/{len(names)} asset types collected"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(DefenderEASMAllAssets().run(sys.argv))
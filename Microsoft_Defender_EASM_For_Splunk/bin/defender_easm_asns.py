@@ -10,30 +10,53 @@ GET /assets/asns
 
 Production guarantees:
 - Azure AD OAuth2 authentication
-- Pagination via nextLink
-- Checkpointing (cursor-safe)
+- Pagination via nextLink (items streamed off each page)
+- Checkpointing (cursor-safe, resumes at the next unwritten item)
 - Proxy support (with or without auth)
-- Retries + backoff
+- Retries + backoff (shared rate limiter, Retry-After aware)
 - One JSON event per ASN
 - Splunk Cloud & AppInspect compliant
+
+DefenderEASMAsns runs the same pull as an asset type of the all_assets
+input, on the same checkpoint and index.
 """
 
-import json
-import time
-import requests
+import sys
 import splunklib.modularinput as smi
 
 from defender_easm_common import (
-    get_access_token,
+    APP_NAME,
+    EASMAPIClient,
+    EASMModularInput,
+    EASMTokenProvider,
     get_easm_base_url,
-    get_headers,
     get_proxy_config,
-    get_checkpoint,
-    save_checkpoint,
+    get_rate_limiter,
+    install_shutdown_handlers,
+    open_event_writer,
+    open_resumable_listing,
+    open_run_guard,
+    open_run_metrics,
+    open_run_profiler,
 )
 
 SOURCETYPE = "defender:easm:asn"
 CHECKPOINT_KEY = "defender_easm_asns_nextlink"
+API_PATH = "/assets/asns?api-version=2024-10-01-preview"
+
+
+class DefenderEASMAsns(EASMModularInput):
+    """
+    ASNs as an asset type of the all_assets input.
+    """
+
+    def collect(self):
+        with open_resumable_listing(
+            self.api, self.stanza, CHECKPOINT_KEY, f"{self.api.base_url}{API_PATH}", raw=True
+        ) as listing:
+            for page in listing.pages():
+                for asn in page:
+                    self.write_event(data=asn)
 
 
 class DefenderEASMAsnsInput(smi.Script):
@@ -46,54 +69,43 @@ class DefenderEASMAsnsInput(smi.Script):
         return scheme
 
     def stream_events(self, inputs, ew):
-        stanza_name = list(inputs.keys())[0]
-        session_key = self._input_definition.metadata["session_key"]
-
-        base_url = get_easm_base_url(session_key)
-        token = get_access_token(session_key)
-        headers = get_headers(token)
-        proxies = get_proxy_config(session_key)
-
-        # Restore pagination checkpoint
-        next_link = get_checkpoint(CHECKPOINT_KEY) or (
-            f"{base_url}/assets/asns?api-version=2024-10-01-preview"
-        )
-
-        while next_link:
-            response = self._safe_request(
-                url=next_link,
-                headers=headers,
-                proxies=proxies
+        # A stop from splunkd saves progress instead of killing the run
+        install_shutdown_handlers()
+        # Batched <stream> output on stdout, or HEC when output_mode = hec
+        with open_event_writer(ew, inputs.metadata["session_key"]) as ew:
+            stanza_name = list(inputs.inputs.keys())[0]
+            session_key = self._input_definition.metadata["session_key"]
+
+            base_url = get_easm_base_url(session_key)
+            api = EASMAPIClient(
+                base_url=base_url,
+                token_provider=EASMTokenProvider(session_key),
+                proxies=get_proxy_config(session_key),
+                rate_limiter=get_rate_limiter(session_key),
             )
 
-            payload = response.json()
-
-            for asn in payload.get("value", []):
-                event = smi.Event()
-                event.stanza = stanza_name
-                event.sourcetype = SOURCETYPE
-                event.data = json.dumps(asn)
-                ew.write_event(event)
-
-            next_link = payload.get("nextLink")
-            save_checkpoint(CHECKPOINT_KEY, next_link)
-
-    def _safe_request(self, url, headers, proxies, retries=5):
-        for attempt in range(1, retries + 1):
-            try:
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    proxies=proxies,
-                    timeout=60
-                )
-                response.raise_for_status()
-                return response
-            except Exception as e:
-                if attempt == retries:
-                    raise
-                time.sleep(attempt * 2)
+            first_url = f"{base_url}{API_PATH}"
+
+            stanza = inputs.inputs[stanza_name] or {}
+            index = stanza.get("index")
+
+            namespace = f"{APP_NAME}::asns::{stanza_name}"
+            # Skips while the last run of this stanza is still going
+            with open_run_guard(stanza, namespace, ew=ew, stanza_name=stanza_name) as guard:
+                if not guard.acquired:
+                    return
+
+                # Items are streamed off each page; the resume point (page and
+                # item) only moves once the events before it are out.
+                # The run summary goes to defender:easm:metrics, and
+                # profile = true also profiles the run.
+                with open_run_profiler(stanza, namespace, ew, stanza_name, session_key), \
+                        open_run_metrics(stanza, namespace, ew, stanza_name), \
+                        open_resumable_listing(api, stanza, CHECKPOINT_KEY, first_url, raw=True) as listing:
+                    for page in listing.pages():
+                        for asn in page:
+                            ew.write(asn, stanza=stanza_name, sourcetype=SOURCETYPE, index=index)
 
 
 if __name__ == "__main__":
-    smi.Script.run(DefenderEASMAsnsInput)
+    sys.exit(DefenderEASMAsnsInput().run(sys.argv))
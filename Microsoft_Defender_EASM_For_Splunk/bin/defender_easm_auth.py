@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_auth.py
+
+Microsoft Defender EASM for Splunk App
+Authentication and endpoints.
+
+Includes:
+- Azure AD OAuth2 client-credentials token (cross-process encrypted cache)
+- Per-stanza connection overrides
+- Data-plane / management-plane base URL builders (configurable / future-proof)
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+import splunklib.modularinput as smi
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:  # tokens are then kept in memory only, never on disk
+    AESGCM = None
+
+from defender_easm_config import (
+    checkpoint_dir,
+    get_app_config,
+    get_client_secret,
+    get_logger,
+    get_proxy_config,
+    on_config_invalidated,
+)
+from defender_easm_state import EASMFileLock, current_run_metrics
+from defender_easm_session import get_http_session
+
+
+# ----------------------------
+# Azure AD OAuth2
+# ----------------------------
+
+DEFAULT_SCOPE = "https://api.easm.defender.microsoft.com/.default"
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+
+# Tokens are reused until this many seconds before they expire
+TOKEN_REFRESH_SKEW = 300
+
+_token_memo: Dict[str, Dict[str, Any]] = {}
+_token_memo_lock = threading.Lock()
+
+# Set once the missing-cryptography warning has been logged
+_token_cache_disabled_logged = False
+
+
+# Connection keys an input stanza may set for itself, overriding the app
+# setup: one stanza per tenant / workspace in multi-tenant deployments
+STANZA_CONNECTION_KEYS = (
+    "tenant_id",
+    "client_id",
+    "client_secret",
+    "subscription_id",
+    "resource_group",
+    "workspace_name",
+)
+
+
+def stanza_connection(input_item: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Returns the STANZA_CONNECTION_KEYS an input stanza sets (non-empty
+    values only), to lay over the app-level settings.
+    """
+    overrides: Dict[str, str] = {}
+    for key in STANZA_CONNECTION_KEYS:
+        value = str((input_item or {}).get(key) or "").strip()
+        if value:
+            overrides[key] = value
+    return overrides
+
+
+def add_connection_arguments(scheme: smi.Scheme) -> None:
+    """
+    Declares the optional STANZA_CONNECTION_KEYS on a management-plane
+    input's scheme.
+    """
+    for key in STANZA_CONNECTION_KEYS:
+        scheme.add_argument(smi.Argument(
+            name=key,
+            description=f"Overrides {key} from the app setup for this input (multi-tenant)",
+            required_on_create=False
+        ))
+
+
+def _fetch_token(session_key: str, cfg: Dict[str, str], scope: str, client_secret: str) -> Dict[str, Any]:
+    """
+    Azure AD client-credentials flow. Returns {"access_token", "expires_at"}.
+    """
+    tenant_id = (cfg.get("tenant_id") or "").strip()
+    client_id = (cfg.get("client_id") or "").strip()
+    authority_url = (cfg.get("authority_url") or "https://login.microsoftonline.com").strip()
+
+    if not tenant_id or not client_id:
+        raise RuntimeError("Missing tenant_id or client_id in app configuration.")
+
+    token_url = f"{authority_url.rstrip('/')}/{tenant_id}/oauth2/v2.0/token"
+    data = {
+        "grant_type": "client_credentials",
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "scope": scope,
+    }
+
+    proxies = get_proxy_config(session_key)
+
+    resp = get_http_session().post(token_url, data=data, proxies=proxies, timeout=60)
+    resp.raise_for_status()
+    payload = resp.json()
+
+    token = payload.get("access_token")
+    if not token:
+        raise RuntimeError(f"Token response missing access_token: {payload}")
+
+    expires_in = int(payload.get("expires_in") or 3599)
+    return {"access_token": token, "expires_at": int(time.time()) + expires_in}
+
+
+class EASMTokenProvider:
+    """
+    Bearer tokens for one (tenant, client, scope), shared across processes.
+
+    Lookup order:
+      1. in-process memo
+      2. on-disk cache (locked, owner-only, AES-GCM encrypted; shared by
+         every input process). Skipped without the cryptography package:
+         a live token is never written in plaintext
+      3. Azure AD token endpoint
+
+    A token is reused until TOKEN_REFRESH_SKEW seconds before expiry.
+    refresh() is used after a 401 to replace a token the service rejected.
+
+    overrides (see stanza_connection) replace the app-level tenant_id,
+    client_id and client_secret for one input stanza.
+    """
+
+    def __init__(self, session_key: str, scope: Optional[str] = None, overrides: Optional[Dict[str, str]] = None):
+        self.session_key = session_key
+        self.cfg = {**get_app_config(session_key), **(overrides or {})}
+        # Only a stanza's own secret replaces storage/passwords
+        self._client_secret = (overrides or {}).get("client_secret")
+        self.scope = (scope or self.cfg.get("scope") or DEFAULT_SCOPE).strip()
+
+        self.cache_key = hashlib.sha256(
+            "|".join((
+                (self.cfg.get("authority_url") or "https://login.microsoftonline.com").strip().rstrip("/"),
+                (self.cfg.get("tenant_id") or "").strip(),
+                (self.cfg.get("client_id") or "").strip(),
+                self.scope,
+            )).encode("utf-8")
+        ).hexdigest()
+
+    def get_token(self) -> str:
+        with _token_memo_lock:
+            entry = _token_memo.get(self.cache_key)
+        if _token_is_fresh(entry):
+            return entry["access_token"]
+        return self._load_or_fetch(stale_token=None)
+
+    def refresh(self, stale_token: Optional[str] = None) -> str:
+        """
+        Returns a token other than stale_token, fetching one if no other
+        process has already replaced it.
+        """
+        return self._load_or_fetch(stale_token=stale_token)
+
+    def _load_or_fetch(self, stale_token: Optional[str]) -> str:
+        secret = self._client_secret or get_client_secret(self.session_key)
+
+        with EASMFileLock(_token_cache_path() + ".lock"):
+            entry = _token_cache_read(self.cache_key, secret)
+            usable = _token_is_fresh(entry) and entry["access_token"] != stale_token
+
+            if not usable:
+                started = time.perf_counter()
+                entry = _fetch_token(self.session_key, self.cfg, self.scope, secret)
+                metrics = current_run_metrics()
+                if metrics is not None:
+                    metrics.add("token_fetches")
+                    metrics.add_seconds("token_fetch", time.perf_counter() - started)
+                _token_cache_write(self.cache_key, secret, entry)
+
+        with _token_memo_lock:
+            _token_memo[self.cache_key] = entry
+        return entry["access_token"]
+
+
+def _token_is_fresh(entry: Optional[Dict[str, Any]]) -> bool:
+    return bool(entry) and entry.get("expires_at", 0) - TOKEN_REFRESH_SKEW > time.time()
+
+
+def _token_cache_path() -> str:
+    return os.path.join(checkpoint_dir(), "token_cache.json")
+
+
+def _token_cipher(secret: str, cache_key: str):
+    # The key derives from the client secret, which never touches disk,
+    # so only a process able to read storage/passwords can use the cache
+    key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"defender_easm token cache|{cache_key}".encode("utf-8"),
+    ).derive(secret.encode("utf-8"))
+    return AESGCM(key)
+
+
+def _token_cache_read(cache_key: str, secret: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_token_cache_path(), "r", encoding="utf-8") as f:
+            record = (json.load(f) or {}).get(cache_key)
+
+        # Plaintext records (older releases) are a miss, and dropped on
+        # the next write
+        if not record or "ciphertext" not in record or AESGCM is None:
+            return None
+
+        # InvalidTag (secret rotated, file tampered with) is a miss
+        token = _token_cipher(secret, cache_key).decrypt(
+            base64.b64decode(record["nonce"]),
+            base64.b64decode(record["ciphertext"]),
+            cache_key.encode("utf-8"),
+        ).decode("utf-8")
+        return {"access_token": token, "expires_at": int(record["expires_at"])}
+    except Exception:
+        return None
+
+
+def _token_cache_write(cache_key: str, secret: str, entry: Dict[str, Any]) -> None:
+    """
+    Caller must hold the token cache lock. Without the cryptography
+    package nothing is written (warned about once per process).
+    """
+    global _token_cache_disabled_logged
+    if AESGCM is None:
+        if not _token_cache_disabled_logged:
+            _token_cache_disabled_logged = True
+            get_logger("auth").warning(
+                "cryptography package not available: access tokens are cached in memory only, "
+                "so each input process fetches its own"
+            )
+        return
+
+    path = _token_cache_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f) or {}
+    except Exception:
+        records = {}
+
+    now = time.time()
+    records = {
+        k: v for k, v in records.items()
+        if "ciphertext" in v and v.get("expires_at", 0) > now
+    }
+
+    nonce = os.urandom(12)
+    ciphertext = _token_cipher(secret, cache_key).encrypt(
+        nonce, entry["access_token"].encode("utf-8"), cache_key.encode("utf-8")
+    )
+    records[cache_key] = {
+        "expires_at": entry["expires_at"],
+        "nonce": base64.b64encode(nonce).decode("ascii"),
+        "ciphertext": base64.b64encode(ciphertext).decode("ascii"),
+    }
+
+    # Created owner-only rather than chmod-ed afterwards, so the tokens
+    # are never readable by others, not even briefly
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.remove(tmp)  # left behind by a crashed process with this pid
+    except FileNotFoundError:
+        pass
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    os.replace(tmp, path)
+
+
+@on_config_invalidated
+def _drop_cached_tokens() -> None:
+    # Cached tokens may belong to the old client
+    with _token_memo_lock:
+        _token_memo.clear()
+    try:
+        os.remove(_token_cache_path())
+    except OSError:
+        pass
+
+
+def get_access_token(session_key: str, scope: Optional[str] = None) -> str:
+    """
+    Azure AD client-credentials flow.
+    Uses:
+      tenant_id, client_id, authority_url
+    Secret:
+      client_secret (storage/passwords)
+
+    Scope:
+      explicit argument, else config key "scope"
+      default: https://api.easm.defender.microsoft.com/.default
+
+    Served from the shared token cache while the cached token is fresh.
+    """
+    return EASMTokenProvider(session_key, scope=scope).get_token()
+
+
+def get_headers(access_token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+
+
+# ----------------------------
+# Data-plane / management-plane base URLs
+# ----------------------------
+
+MANAGEMENT_API_ROOT = "https://management.azure.com"
+MANAGEMENT_RESOURCE_PROVIDER = "Microsoft.Security"
+
+
+def get_easm_base_url(session_key: str) -> str:
+    """
+    Returns the *data-plane* base URL for Defender EASM.
+
+    Preferred config key:
+      data_plane_endpoint
+
+    Defaults to:
+      https://api.easm.defender.microsoft.com
+
+    Then constructs:
+      {endpoint}/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Easm/workspaces/{workspace_name}
+
+    You can override the full base with:
+      easm_base_url
+    """
+    cfg = get_app_config(session_key)
+
+    explicit_base = (cfg.get("easm_base_url") or "").strip()
+    if explicit_base:
+        return explicit_base.rstrip("/")
+
+    endpoint = (cfg.get("data_plane_endpoint") or "https://api.easm.defender.microsoft.com").strip().rstrip("/")
+
+    subscription_id = (cfg.get("subscription_id") or "").strip()
+    resource_group = (cfg.get("resource_group") or "").strip()
+    workspace_name = (cfg.get("workspace_name") or "").strip()
+
+    if not subscription_id or not resource_group or not workspace_name:
+        raise RuntimeError("Missing subscription_id, resource_group, or workspace_name in app configuration.")
+
+    return (
+        f"{endpoint}"
+        f"/subscriptions/{subscription_id}"
+        f"/resourceGroups/{resource_group}"
+        f"/providers/Microsoft.Easm"
+        f"/workspaces/{workspace_name}"
+    )
+
+
+def get_management_base_url(session_key: str, overrides: Optional[Dict[str, str]] = None) -> str:
+    """
+    Returns the *management-plane* (ARM) base URL of the EASM workspace,
+    used by the domain / host / page / IP asset inputs.
+
+    Config key management_endpoint overrides https://management.azure.com;
+    overrides (see stanza_connection) replace subscription_id,
+    resource_group and workspace_name for one input stanza.
+    """
+    cfg = {**get_app_config(session_key), **(overrides or {})}
+
+    endpoint = (cfg.get("management_endpoint") or MANAGEMENT_API_ROOT).strip().rstrip("/")
+
+    subscription_id = (cfg.get("subscription_id") or "").strip()
+    resource_group = (cfg.get("resource_group") or "").strip()
+    workspace_name = (cfg.get("workspace_name") or "").strip()
+
+    if not subscription_id or not resource_group or not workspace_name:
+        raise RuntimeError("Missing subscription_id, resource_group, or workspace_name in app configuration.")
+
+    return (
+        f"{endpoint}"
+        f"/subscriptions/{subscription_id}"
+        f"/resourceGroups/{resource_group}"
+        f"/providers/{MANAGEMENT_RESOURCE_PROVIDER}"
+        f"/externalAttackSurfaceManagementWorkspaces/{workspace_name}"
+    )
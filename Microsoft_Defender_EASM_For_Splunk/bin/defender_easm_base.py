@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_base.py
+
+Microsoft Defender EASM for Splunk App
+Collector base classes.
+
+Includes:
+- Base classes for data-plane collectors (EASMModularInput, EASMCheckpoint)
+- "List everything at a path" collectors (EASMAssetListInput)
+- Management-plane asset inventory inputs (EASMManagementAssetInput)
+"""
+
+import sys
+import time
+import itertools
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+import splunklib.modularinput as smi
+
+from defender_easm_config import (
+    APP_NAME,
+    EASMAPIError,
+    get_app_config,
+    get_logger,
+    get_proxy_config,
+)
+from defender_easm_state import get_checkpoint, get_state_store, save_checkpoint
+from defender_easm_session import DEFAULT_POOL_SIZE, get_http_session
+from defender_easm_auth import (
+    MANAGEMENT_SCOPE,
+    EASMTokenProvider,
+    add_connection_arguments,
+    get_easm_base_url,
+    get_management_base_url,
+    stanza_connection,
+)
+from defender_easm_runs import (
+    install_shutdown_handlers,
+    open_run_guard,
+    open_run_metrics,
+    open_run_profiler,
+    run_status,
+)
+from defender_easm_ratelimit import get_rate_limiter
+from defender_easm_paging import DEFAULT_PREFETCH_PAGES
+from defender_easm_http import EASMAPIClient
+from defender_easm_delta import DEFAULT_FULL_SNAPSHOT_EVERY
+from defender_easm_removals import REMOVED_SOURCETYPE, open_removal_tracker
+from defender_easm_output import open_event_writer
+from defender_easm_listing import (
+    DEFAULT_PARTITION_FIELD,
+    DEFAULT_RECONCILE_EVERY,
+    DEFAULT_WATERMARK_FIELD,
+    collect_listing,
+)
+
+
+# ----------------------------
+# Collector base classes
+# ----------------------------
+
+class EASMSharedEventWriter:
+    """
+    Serializes write_event/write/log calls from several collector threads
+    onto one event writer (one stdout stream or HEC sender per process).
+    """
+
+    def __init__(self, ew: smi.EventWriter):
+        self._ew = ew
+        self._lock = threading.Lock()
+
+    def write_event(self, event: smi.Event) -> None:
+        with self._lock:
+            self._ew.write_event(event)
+
+    def write(self, data: str, **meta) -> None:
+        with self._lock:
+            self._ew.write(data, **meta)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._ew.flush()
+
+    def log(self, severity: str, message: str) -> None:
+        with self._lock:
+            self._ew.log(severity, message)
+
+    def close(self) -> None:
+        with self._lock:
+            self._ew.close()
+
+
+class EASMCheckpoint:
+    """
+    Watermark checkpoint scoped to one collector stanza.
+    """
+
+    def __init__(self, modinput: "EASMModularInput", name: str = "watermark"):
+        self.key = f"{modinput.state_namespace}::{name}"
+
+    def get(self) -> Optional[str]:
+        return get_checkpoint(self.key)
+
+    def set(self, value: Optional[str]) -> None:
+        save_checkpoint(self.key, value)
+
+
+class EASMModularInput(smi.Script):
+    """
+    Base class for data-plane collectors.
+
+    Subclasses implement collect() using:
+      self.api          EASMAPIClient bound to the workspace data-plane
+      self.write_event  one raw JSON event
+      self.logger       stderr logger (splunkd.log)
+      EASMCheckpoint(self)
+
+    A collector can also be hosted by the aggregate input: bind() attaches
+    a shared client and writer, then collect() runs as usual. The writer
+    is whatever open_event_writer() chose (stdout batches or HEC),
+    possibly behind an EASMSharedEventWriter.
+    """
+
+    # Which API the collector talks to: "data" or "management"
+    plane = "data"
+
+    def __init__(self, asset_name: str, sourcetype: str):
+        super().__init__()
+        self.asset_name = asset_name
+        self.sourcetype = sourcetype
+        self.logger = get_logger(asset_name)
+
+        self.api: Optional[EASMAPIClient] = None
+        self.session_key: Optional[str] = None
+        self.stanza_name: Optional[str] = None
+        self.stanza: Dict[str, Any] = {}
+        self.index: Optional[str] = None
+
+        self._ew: Optional[smi.EventWriter] = None
+        self._failure: Optional[Exception] = None
+        # next() on a count is atomic, so worker threads can share it
+        self._events = itertools.count()
+
+    def get_scheme(self):
+        title = self.asset_name.replace("_", " ").title()
+        scheme = smi.Scheme(f"Defender EASM {title}")
+        scheme.description = f"Collect {title} from Microsoft Defender EASM"
+        scheme.use_external_validation = False
+        scheme.use_single_instance = False
+        return scheme
+
+    def bind(self, session_key: str, stanza_name: str, stanza: Dict[str, Any], api: EASMAPIClient, ew) -> None:
+        self.session_key = session_key
+        self.stanza_name = stanza_name
+        self.stanza = stanza or {}
+        self.index = self.event_index()
+        self.api = api
+        self._ew = ew
+
+    def event_index(self) -> Optional[str]:
+        """
+        Index the bound stanza's events are written to.
+        """
+        return self.stanza.get("index")
+
+    def api_client(self, session_key: str, stanza: Dict[str, Any]) -> EASMAPIClient:
+        """
+        Client a stanza is collected with: one per process, unless a
+        subclass needs one per stanza.
+        """
+        return self.api or build_api_client(session_key, self.plane, logger=self.logger)
+
+    def stream_events(self, inputs, ew):
+        session_key = inputs.metadata["session_key"]
+        # A stop from splunkd saves progress instead of killing the run
+        install_shutdown_handlers()
+
+        with open_event_writer(ew, session_key) as writer:
+            for stanza_name, stanza in inputs.inputs.items():
+                self.bind(session_key, stanza_name, stanza, self.api_client(session_key, stanza or {}), writer)
+                try:
+                    # Skips while the last run of this stanza is still going
+                    with open_run_guard(
+                        self.stanza, self.state_namespace, self.logger, self._ew, self.stanza_name
+                    ) as guard:
+                        if guard.acquired:
+                            self.run_collect()
+                except EASMAPIError as exc:
+                    # Surfaced again from run() so main() can map it to its exit code
+                    self._failure = exc
+                    raise
+
+    @property
+    def state_namespace(self) -> str:
+        return f"{APP_NAME}::{self.asset_name}::{self.stanza_name}"
+
+    def collect(self):
+        raise NotImplementedError
+
+    def run_collect(self) -> None:
+        """
+        collect(), recorded in the state store's run history, with its
+        run metrics (and opt-in profile) written to the event stream.
+        """
+        started = time.time()
+        self._events = itertools.count()
+        status, detail = "ok", None
+        try:
+            # Summary written to defender:easm:metrics when the run ends;
+            # the run is also profiled when profiling is on for it
+            with open_run_profiler(
+                self.stanza, self.state_namespace, self._ew, self.stanza_name, self.session_key, self.logger
+            ), open_run_metrics(self.stanza, self.state_namespace, self._ew, self.stanza_name, self.logger):
+                self.collect()
+        except BaseException as exc:
+            status = run_status(type(exc))
+            if status == "error":
+                detail = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            try:
+                get_state_store().record_run(
+                    self.state_namespace, started, time.time(), status, next(self._events), detail
+                )
+            except sqlite3.Error as exc:
+                self.logger.warning(f"Could not record run history: {exc}")
+
+    def write_event(self, data: str, sourcetype: Optional[str] = None) -> None:
+        next(self._events)
+        self._ew.write(
+            data,
+            stanza=self.stanza_name,
+            sourcetype=sourcetype or self.sourcetype,
+            index=self.index,
+        )
+
+    def run(self, args=None) -> int:
+        exit_code = super().run(sys.argv if args is None else args)
+        if self._failure is not None:
+            raise self._failure
+        return exit_code
+
+
+class EASMAssetListInput(EASMModularInput):
+    """
+    Generic "list everything at a path" collector.
+
+    Emits one raw JSON event per item, passed through exactly as the API
+    sent it, and checkpoints its position in the listing (see
+    EASMResumableListing), so an interrupted run resumes at the next
+    unwritten item.
+    """
+
+    def __init__(self, asset_name: str, sourcetype: str, path: str, plane: str = "data"):
+        super().__init__(asset_name=asset_name, sourcetype=sourcetype)
+        self.path = path
+        self.plane = plane
+
+    def collect(self):
+        delta_key = EASMCheckpoint(self, "delta").key
+        removals = open_removal_tracker(
+            self.stanza,
+            EASMCheckpoint(self, "ids").key,
+            self.asset_name,
+            lambda raw: self.write_event(data=raw, sourcetype=REMOVED_SOURCETYPE),
+            self.logger,
+        )
+        # delta_mode = true writes only new or changed items; every id
+        # goes into the removal snapshot either way. Management-plane
+        # inventory can also be pulled incrementally (incremental = true)
+        total = collect_listing(
+            self.api,
+            self.path,
+            self._write_page,
+            self.stanza,
+            checkpoint_key=EASMCheckpoint(self, "partitions").key,
+            logger=self.logger,
+            delta_key=delta_key,
+            removals=removals,
+            resume_key=EASMCheckpoint(self, "nextlink").key,
+            watermark_key=EASMCheckpoint(self, "watermark").key if self.plane == "management" else None,
+        )
+        self.logger.info(f"{self.asset_name} collection complete — {total} records ingested")
+
+    def _write_page(self, items) -> None:
+        for item in items:
+            self.write_event(data=item)
+
+
+# Stanza arguments of the management-plane asset inputs, in the groups an
+# input declares (see EASMManagementAssetInput)
+PARTITION_ARGUMENTS = (
+    ("partitions", "Parallel $filter slices for one listing (default 1 = serial)",
+     smi.Argument.data_type_number),
+    ("partition_field", f"Timestamp field used to slice the listing (default {DEFAULT_PARTITION_FIELD})",
+     smi.Argument.data_type_string),
+)
+DELTA_ARGUMENTS = (
+    ("delta_mode", "Write only new or changed assets (default false)",
+     smi.Argument.data_type_boolean),
+    ("full_snapshot_every",
+     f"In delta mode, write every asset every N runs (default {DEFAULT_FULL_SNAPSHOT_EVERY}, 0 = never)",
+     smi.Argument.data_type_number),
+    ("track_removals", "Write a tombstone event for assets no longer returned (default false)",
+     smi.Argument.data_type_boolean),
+)
+RUN_ARGUMENTS = (
+    ("incremental", "List only assets changed since the last pull, by watermark (default false)",
+     smi.Argument.data_type_boolean),
+    ("watermark_field", f"Timestamp field the watermark is kept on (default {DEFAULT_WATERMARK_FIELD})",
+     smi.Argument.data_type_string),
+    ("reconcile_every",
+     f"In incremental mode, list everything every N runs (default {DEFAULT_RECONCILE_EVERY}, 0 = never)",
+     smi.Argument.data_type_number),
+    ("max_runtime", "Seconds a run may take before it saves its place and stops (default 0 = no limit)",
+     smi.Argument.data_type_number),
+    ("metrics", "Write a run summary to defender:easm:metrics (default true)",
+     smi.Argument.data_type_boolean),
+    ("metrics_pages", "Also write one metrics record per page (default false)",
+     smi.Argument.data_type_boolean),
+    ("profile", "Profile each run with cProfile and tracemalloc (default false)",
+     smi.Argument.data_type_boolean),
+)
+
+
+class EASMManagementAssetInput(EASMAssetListInput):
+    """
+    Management-plane (ARM) asset inventory input: hosts, domains, pages,
+    IP addresses, IP blocks.
+
+    Lists path like EASMAssetListInput (resume point, watermark, delta
+    mode, tombstones and partitions, all keyed on the stanza) and
+    declares the stanza arguments for them. A stanza that names its own
+    tenant / workspace (stanza_connection()) gets a client of its own.
+    """
+
+    # Name shown in Splunk Web ("Defender EASM <title>")
+    title = ""
+    # Argument groups beyond RUN_ARGUMENTS, as inputs.conf.spec declares them
+    partitioned = True
+    delta = True
+
+    def __init__(self, asset_name: str, sourcetype: str, path: str):
+        super().__init__(asset_name=asset_name, sourcetype=sourcetype, path=path, plane="management")
+
+    def get_scheme(self):
+        title = self.title or self.asset_name.replace("_", " ").title()
+        scheme = smi.Scheme(f"Defender EASM {title}")
+        scheme.description = f"Collect {title} from Microsoft Defender EASM"
+        scheme.use_external_validation = True
+        scheme.use_single_instance = False
+
+        arguments = RUN_ARGUMENTS
+        if self.delta:
+            arguments = DELTA_ARGUMENTS + arguments
+        if self.partitioned:
+            arguments = PARTITION_ARGUMENTS + arguments
+        for name, description, data_type in arguments:
+            scheme.add_argument(smi.Argument(
+                name=name,
+                description=description,
+                data_type=data_type,
+                required_on_create=False
+            ))
+        add_connection_arguments(scheme)
+        return scheme
+
+    def api_client(self, session_key: str, stanza: Dict[str, Any]) -> EASMAPIClient:
+        # Credentials come from the app setup unless the stanza names its
+        # own tenant / workspace (multi-tenant)
+        return build_api_client(
+            session_key, self.plane, logger=self.logger, connection=stanza_connection(stanza)
+        )
+
+
+def build_api_client(
+    session_key: str,
+    plane: str = "data",
+    pool_size: int = DEFAULT_POOL_SIZE,
+    logger: Optional[logging.Logger] = None,
+    connection: Optional[Dict[str, str]] = None,
+) -> EASMAPIClient:
+    """
+    Returns an EASMAPIClient for the data plane or the management (ARM) plane.
+    Prefetch depth comes from the app config key prefetch_pages;
+    adaptive_paging = false turns off the AIMD page-size controller (which
+    only runs on data-plane ADAPTIVE_PAGING_PATHS anyway), and
+    stream_pages = false decodes whole pages instead of streaming items.
+    connection (see stanza_connection) overrides the management-plane
+    tenant / workspace.
+    """
+    cfg = get_app_config(session_key)
+    if plane == "management":
+        base_url = get_management_base_url(session_key, connection)
+        scope = MANAGEMENT_SCOPE
+    else:
+        base_url = get_easm_base_url(session_key)
+        scope = None
+        connection = None
+
+    return EASMAPIClient(
+        base_url=base_url,
+        token_provider=EASMTokenProvider(session_key, scope=scope, overrides=connection),
+        proxies=get_proxy_config(session_key),
+        session=get_http_session(pool_size),
+        prefetch_pages=int(cfg.get("prefetch_pages") or DEFAULT_PREFETCH_PAGES),
+        logger=logger,
+        rate_limiter=get_rate_limiter(session_key),
+        adaptive=(cfg.get("adaptive_paging") or "true").strip().lower() in ("1", "true", "yes", "on"),
+        stream=(cfg.get("stream_pages") or "true").strip().lower() in ("1", "true", "yes", "on"),
+        plane=plane,
+    )
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_delta.py
+
+Microsoft Defender EASM for Splunk App
+Delta mode.
+
+Includes:
+- Only new/changed assets written, via a content-digest index (EASMDeltaIndex)
+"""
+
+import os
+import sys
+import json
+import array
+import bisect
+import hashlib
+import struct
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from defender_easm_config import checkpoint_dir, get_logger
+from defender_easm_state import commit_after_events, get_state_store
+
+
+# ----------------------------
+# Delta mode (content digests)
+# ----------------------------
+
+# Fields that change on every crawl without the asset changing, as dotted
+# paths from the top of the item; dropped before an item is hashed. A name
+# only matches at its full path, so a nested "count" elsewhere still counts.
+DELTA_VOLATILE_FIELDS = ("updatedDate", "lastSeen", "asset.lastSeen", "asset.count")
+
+# Runs between full snapshots (every asset written regardless); 0 = never
+DEFAULT_FULL_SNAPSHOT_EVERY = 4
+
+_DELTA_MAGIC = b"EASMDLT1"
+_DELTA_HEADER = struct.Struct("<8sQQQ")  # magic, complete runs, base entries, partial entries
+
+
+def hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _path_tree(paths: Iterable[str]) -> Dict[str, Any]:
+    """
+    Dotted paths as a nested dict, None marking a path's last key:
+    ("a", "b.c", "b.d") -> {"a": None, "b": {"c": None, "d": None}}.
+    A path covered by a shorter one ("b" and "b.c") collapses into it.
+    """
+    tree: Dict[str, Any] = {}
+    for path in sorted(paths, key=lambda p: p.count(".")):
+        node = tree
+        *parents, last = path.split(".")
+        for name in parents:
+            node = node.setdefault(name, {})
+            if node is None:
+                break
+        else:
+            node[last] = None
+    return tree
+
+
+def _drop_paths(obj: Dict[str, Any], tree: Dict[str, Any]) -> None:
+    """
+    Removes the paths in tree (see _path_tree) from obj in place. Only
+    objects are descended; a path through a list or a scalar matches nothing.
+    """
+    for name, sub in tree.items():
+        if name not in obj:
+            continue
+        if sub is None:
+            del obj[name]
+        elif isinstance(obj[name], dict):
+            _drop_paths(obj[name], sub)
+
+
+def content_digest(obj: Any) -> int:
+    """
+    64-bit digest of obj as canonical JSON (sorted keys, compact).
+    """
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hash64(canonical.encode("utf-8"))
+
+
+def _sorted_pairs(ids: "array.array", digests: "array.array") -> Tuple["array.array", "array.array"]:
+    """
+    Sorts (id, digest) pairs by id; for repeated ids the last pair wins.
+    """
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    out_ids, out_digests = array.array("Q"), array.array("Q")
+    for i in order:
+        if out_ids and out_ids[-1] == ids[i]:
+            out_digests[-1] = digests[i]
+        else:
+            out_ids.append(ids[i])
+            out_digests.append(digests[i])
+    return out_ids, out_digests
+
+
+def _lookup(ids: "array.array", digests: "array.array", key: int) -> Optional[int]:
+    i = bisect.bisect_left(ids, key)
+    if i < len(ids) and ids[i] == key:
+        return digests[i]
+    return None
+
+
+class EASMDeltaIndex:
+    """
+    Persistent asset id -> content digest index for delta mode.
+
+    Items are written only when their id is new or their digest (canonical
+    JSON without the volatile field paths) differs from the last complete pull, except on
+    full-snapshot runs (every full_every complete runs) where everything
+    is written so dc(easm_id) style searches over a day stay right.
+
+    The index is one binary file in the checkpoint dir: two sorted uint64
+    arrays (id hash, digest) for the last complete pull, plus the same for
+    a pull that was interrupted, so a resumed pull neither re-writes what
+    it already wrote nor forgets it. 16 bytes per asset; lookups bisect
+    the arrays. A complete pull replaces the index with exactly what it
+    saw (assets that disappeared leave it); an incremental pull (see
+    incremental()) merges what it saw into it instead. The file is
+    committed with commit_after_events(), never ahead of the events it
+    records.
+
+    Disabled instances pass items straight through.
+    """
+
+    def __init__(
+        self,
+        key: Optional[str],
+        enabled: bool = True,
+        full_every: int = DEFAULT_FULL_SNAPSHOT_EVERY,
+        volatile: Iterable[str] = DELTA_VOLATILE_FIELDS,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.enabled = enabled and bool(key)
+        self.key = key
+        self.full_every = full_every
+        self.volatile = frozenset(volatile)
+        self.logger = logger or get_logger("delta")
+        self._volatile_tree = _path_tree(self.volatile)
+        self.stats: Dict[str, int] = {"seen": 0, "new": 0, "changed": 0, "unchanged": 0}
+
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._base = (array.array("Q"), array.array("Q"))
+        self._partial = (array.array("Q"), array.array("Q"))
+        self._seen = (array.array("Q"), array.array("Q"))
+        if self.enabled:
+            self._load()
+        self.snapshot = self.enabled and (self._runs == 0 or (full_every > 0 and self._runs % full_every == 0))
+        self.merge = False
+
+    @property
+    def path(self) -> str:
+        return os.path.join(checkpoint_dir(), hashlib.sha256(self.key.encode("utf-8")).hexdigest() + ".delta")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        magic, runs, n_base, n_partial = _DELTA_HEADER.unpack_from(data)
+        if magic != _DELTA_MAGIC:
+            self.logger.warning(f"Ignoring unreadable delta index {self.path}")
+            return
+
+        arrays = []
+        offset = _DELTA_HEADER.size
+        for n in (n_base, n_base, n_partial, n_partial):
+            a = array.array("Q")
+            a.frombytes(data[offset:offset + 8 * n])
+            if sys.byteorder != "little":
+                a.byteswap()
+            arrays.append(a)
+            offset += 8 * n
+        self._runs = runs
+        self._base = (arrays[0], arrays[1])
+        self._partial = (arrays[2], arrays[3])
+
+    def _previous(self, id_hash: int) -> Optional[int]:
+        digest = _lookup(*self._partial, id_hash)
+        if digest is None:
+            digest = _lookup(*self._base, id_hash)
+        return digest
+
+    def incremental(self) -> None:
+        """
+        The pull lists only assets changed since a watermark: write the
+        changed ones (never a full snapshot) and merge them into the index
+        rather than replace it. Incremental pulls do not count towards
+        full_every.
+        """
+        self.merge = True
+        self.snapshot = False
+
+    def filter(self, items: Iterable[str]) -> Iterable[str]:
+        """
+        Yields the raw items that should be written and records every
+        item's digest.
+        """
+        if not self.enabled:
+            yield from items
+            return
+
+        for raw in items:
+            obj = json.loads(raw)
+            item_id = obj.get("id") if isinstance(obj, dict) else None
+            if item_id is None:
+                yield raw
+                continue
+            # Volatile fields are gone from the item before it is hashed
+            _drop_paths(obj, self._volatile_tree)
+
+            id_hash = hash64(str(item_id).encode("utf-8"))
+            digest = content_digest(obj)
+            previous = self._previous(id_hash)
+
+            with self._lock:
+                self._seen[0].append(id_hash)
+                self._seen[1].append(digest)
+                self.stats["seen"] += 1
+                if previous is None:
+                    self.stats["new"] += 1
+                elif previous != digest:
+                    self.stats["changed"] += 1
+                else:
+                    self.stats["unchanged"] += 1
+
+            if self.snapshot or previous != digest:
+                yield raw
+
+    def commit(self, complete: bool) -> None:
+        """
+        Saves the index once the events written so far are safe.
+        complete=False (interrupted pull) keeps the last complete pull
+        as the baseline and carries this run's digests into the next.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            ids = self._partial[0] + self._seen[0]
+            digests = self._partial[1] + self._seen[1]
+            stats = dict(self.stats)
+        merged = _sorted_pairs(ids, digests)
+
+        if complete and self.merge:
+            base = _sorted_pairs(self._base[0] + merged[0], self._base[1] + merged[1])
+            runs, partial = self._runs, (array.array("Q"), array.array("Q"))
+        elif complete:
+            runs, base, partial = self._runs + 1, merged, (array.array("Q"), array.array("Q"))
+        else:
+            runs, base, partial = self._runs, self._base, merged
+
+        header = _DELTA_HEADER.pack(_DELTA_MAGIC, runs, len(base[0]), len(partial[0]))
+        blobs = [header]
+        for a in (base[0], base[1], partial[0], partial[1]):
+            if sys.byteorder != "little":
+                a = array.array("Q", a)
+                a.byteswap()
+            blobs.append(a.tobytes())
+        path = self.path
+
+        def write():
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(b"".join(blobs))
+            # Cursor checkpoints staged before this commit land first
+            get_state_store().flush()
+            os.replace(tmp, path)
+
+        commit_after_events(write)
+        written = stats["seen"] if self.snapshot else stats["new"] + stats["changed"]
+        self.logger.info(
+            f"Delta index {'(full snapshot) ' if self.snapshot else '(incremental) ' if self.merge else ''}"
+            f"{'complete' if complete else 'interrupted'}: {stats['seen']} seen, {stats['new']} new, "
+            f"{stats['changed']} changed, {stats['unchanged']} unchanged, {written} written"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.commit(complete=exc_type is None)
+
+
+def open_delta_index(
+    stanza: Dict[str, Any],
+    key: Optional[str],
+    logger: Optional[logging.Logger] = None,
+) -> EASMDeltaIndex:
+    """
+    Returns the stanza's delta index (delta_mode, full_snapshot_every,
+    delta_ignore_fields), or a pass-through one when delta mode is off.
+    """
+    enabled = str(stanza.get("delta_mode") or "false").strip().lower() in ("1", "true", "yes", "on")
+    full_every = stanza.get("full_snapshot_every")
+    volatile = stanza.get("delta_ignore_fields")
+    return EASMDeltaIndex(
+        key,
+        enabled=enabled,
+        full_every=int(full_every) if full_every not in (None, "") else DEFAULT_FULL_SNAPSHOT_EVERY,
+        volatile=[f.strip() for f in volatile.split(",") if f.strip()] if volatile else DELTA_VOLATILE_FIELDS,
+        logger=logger,
+    )
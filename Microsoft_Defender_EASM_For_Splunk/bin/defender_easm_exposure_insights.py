@@ -15,7 +15,8 @@ Responsibilities:
 - Handle pagination (nextLink)
 - Respect proxy configuration
 - Write raw JSON events to Splunk
-- Maintain checkpoint state (incremental collection)
+- Maintain checkpoint state (incremental collection, plus an item-level
+  resume point while a pull is in progress)
 
 Design constraints:
 - No enrichment
@@ -32,6 +33,7 @@ from defender_easm_common import (
     EASMModularInput,
     EASMCheckpoint,
     EASMAPIError,
+    open_resumable_listing,
 )
 
 SOURCETYPE = "defender:easm:exposure_insight"
@@ -112,34 +114,41 @@ class DefenderEASMExposureInsights(EASMModularInput):
                 f"properties/lastUpdatedDateTime gt {_odata_datetimeoffset(last_checkpoint)}"
             )
 
-        next_url = ENDPOINT
         event_count = 0
-        newest_timestamp = last_checkpoint
 
-        while next_url:
-            response = self.api.get(next_url, params=params)
-
-            # After first request, nextLink is expected to be fully-formed.
-            # Many APIs include query params in nextLink, so we must stop passing params.
-            records = response.get("value") or []
-            next_url = response.get("nextLink")
-            params = None
-
-            for rec in records:
-                self.write_event(data=json.dumps(rec), sourcetype=SOURCETYPE)
-                event_count += 1
-
-                observed = _pick_timestamp(rec)
-                if observed and (not newest_timestamp or observed > newest_timestamp):
-                    newest_timestamp = observed
-
-            self.logger.info(
-                f"Fetched {len(records)} exposure insights (total so far: {event_count})"
-            )
-
-        if newest_timestamp and newest_timestamp != last_checkpoint:
-            checkpoint.set(newest_timestamp)
-            self.logger.info(f"Checkpoint updated to {newest_timestamp}")
+        # Resumes at the next unwritten item (with the newest timestamp
+        # seen so far) if the last run was stopped part way; params only
+        # apply to the first request, nextLink carries the query after that.
+        # Items are written as the raw JSON text they came in, never
+        # re-encoded; they are still decoded for _pick_timestamp(), whose
+        # candidates sit too deep in the item for raw_fields() to pay off
+        resume_key = EASMCheckpoint(self, "resume").key
+        with open_resumable_listing(
+            self.api, self.stanza, resume_key, ENDPOINT, params, raw=True, logger=self.logger
+        ) as listing:
+            newest_timestamp = listing.state or last_checkpoint
+
+            for page in listing.pages():
+                page_count = 0
+
+                for raw in page:
+                    self.write_event(data=raw, sourcetype=SOURCETYPE)
+                    event_count += 1
+                    page_count += 1
+
+                    observed = _pick_timestamp(json.loads(raw))
+                    if observed and (not newest_timestamp or observed > newest_timestamp):
+                        newest_timestamp = observed
+                        listing.state = newest_timestamp
+
+                self.logger.info(
+                    f"Fetched {page_count} exposure insights (total so far: {event_count})"
+                )
+
+            # Watermark and cleared resume point commit together
+            listing.finish({checkpoint.key: newest_timestamp})
+            if newest_timestamp and newest_timestamp != last_checkpoint:
+                self.logger.info(f"Checkpoint updated to {newest_timestamp}")
 
         self.logger.info(
             f"Exposure Insights collection complete — {event_count} records ingested"
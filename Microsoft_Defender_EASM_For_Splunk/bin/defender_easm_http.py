@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_http.py
+
+Microsoft Defender EASM for Splunk App
+API client.
+
+Includes:
+- AIMD page-size / in-flight controller per endpoint (EASMAdaptiveController)
+- Authenticated requests + nextLink paging (EASMAPIClient)
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from defender_easm_config import APP_NAME, EASMAPIError, get_logger
+from defender_easm_state import (
+    current_run_metrics,
+    get_state_store,
+    legacy_checkpoint_path,
+    read_legacy_checkpoint,
+)
+from defender_easm_session import (
+    DEFAULT_API_VERSION,
+    DEFAULT_TIMEOUT,
+    get_http_session,
+    resolve_next_link,
+)
+from defender_easm_auth import EASMTokenProvider, get_headers
+from defender_easm_runs import check_shutdown
+from defender_easm_ratelimit import (
+    MAX_RETRIES,
+    RETRYABLE_STATUS,
+    EASMRateLimiter,
+    backoff_delay,
+    get_rate_limiter,
+    retry_after_seconds,
+)
+from defender_easm_paging import (
+    DEFAULT_PREFETCH_PAGES,
+    EASMPage,
+    EASMPageStream,
+    EASMPrefetchedPage,
+    EASMPrefetcher,
+    close_iterator,
+    page_batches,
+)
+
+
+# ----------------------------
+# Adaptive paging (AIMD)
+# ----------------------------
+
+# OData page-size parameter sent on the first request of a walk. The
+# nextLinks that follow are the service's own and are requested as they
+# are, so a new page size takes effect from the next walk on.
+PAGE_SIZE_PARAM = "$top"
+
+# Data-plane list paths (and their sub-paths) known to accept $top.
+# Management-plane (ARM) listings and anything else page at the
+# service's default size, untouched.
+ADAPTIVE_PAGING_PATHS = ("/assets", "/sslCertificates")
+
+DEFAULT_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 1000
+PAGE_SIZE_STEP = 25
+
+# In-flight requests per endpoint (partition slices / workers sharing a client)
+MAX_IN_FLIGHT = 16
+
+# Pages larger than this stop growing the page size
+MAX_PAGE_BYTES = 8 * 1024 * 1024
+
+# A request slower than LATENCY_SPIKE_FACTOR x the running per-item
+# average, or slower than LATENCY_CEILING seconds outright, is congestion.
+# Requests under LATENCY_SPIKE_FLOOR seconds never count as a spike (noise).
+LATENCY_SPIKE_FACTOR = 3.0
+LATENCY_SPIKE_FLOOR = 1.0
+LATENCY_CEILING = 30.0
+
+# At most one multiplicative decrease per this many seconds, so a burst
+# of failures from concurrent requests only halves the limits once.
+AIMD_DECREASE_COOLDOWN = 2.0
+
+
+class EASMAdaptiveController:
+    """
+    AIMD controller for one endpoint: page size ($top) and in-flight requests.
+
+    Every response is recorded with its latency, payload size and status.
+      healthy                -> page_size += PAGE_SIZE_STEP, limit += 1/limit
+      429 / 5xx / transport  -> page_size and limit halved
+      latency spike          -> page_size and limit halved
+
+    Latency is compared per requested item, so a bigger page being slower
+    in proportion is not mistaken for a spike. The page size only grows
+    while a page of the next size stays under MAX_PAGE_BYTES, judged on
+    the bytes per item actually read: a streamed (possibly chunked) body
+    is sized by record_bytes() once it has been drained, and a page found
+    over the cap shrinks the page size to fit. The learned page size and
+    limit are kept in the state store's tuning table, so the next run
+    starts from them instead of rediscovering them.
+    """
+
+    def __init__(self, endpoint: str, page_size: int = DEFAULT_PAGE_SIZE, max_in_flight: int = MAX_IN_FLIGHT):
+        self.endpoint = endpoint
+        self.legacy_key = f"{APP_NAME}::aimd::{endpoint}"
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+
+        self._page_size = float(page_size)
+        self.limit = float(self.max_in_flight)
+        self.latency_per_item: Optional[float] = None
+        # Body size per item of the last page read (None until one is)
+        self.bytes_per_item: Optional[float] = None
+        self.stats: Dict[str, int] = {"requests": 0, "increases": 0, "decreases": 0}
+
+        self._load()
+
+    @property
+    def page_size(self) -> int:
+        return int(self._page_size)
+
+    def _load(self) -> None:
+        store = get_state_store()
+        learned = store.get_tuning(self.endpoint)
+        if learned is None:
+            # Kept as a checkpoint before the state store had a tuning table
+            legacy = read_legacy_checkpoint(self.legacy_key)
+            if not legacy:
+                return
+            try:
+                learned = json.loads(legacy)
+            except ValueError:
+                return
+            store.set_tuning(self.endpoint, learned)
+            os.remove(legacy_checkpoint_path(self.legacy_key))
+        try:
+            self._page_size = float(min(MAX_PAGE_SIZE, max(MIN_PAGE_SIZE, int(learned["page_size"]))))
+            self.limit = float(min(self.max_in_flight, max(1, int(learned["limit"]))))
+            self.latency_per_item = learned.get("latency_per_item")
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    def save(self) -> None:
+        with self._cond:
+            learned = {
+                "page_size": self.page_size,
+                "limit": int(self.limit),
+                "latency_per_item": self.latency_per_item,
+            }
+        # Tuning state, not event progress: no need to wait on delivery
+        get_state_store().set_tuning(self.endpoint, learned)
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, latency: float, nbytes: Optional[int], status: Optional[int], page_size: Optional[int]) -> None:
+        """
+        Feeds one response (status None for a transport error) into the
+        controller. nbytes is None for a streamed body not read yet; its
+        size comes later through record_bytes().
+        """
+        items = max(1, page_size or self.page_size)
+        per_item = latency / items
+
+        with self._cond:
+            self.stats["requests"] += 1
+
+            congested = status is None or status == 429 or status >= 500
+            if not congested and status < 400:
+                if latency > LATENCY_CEILING:
+                    congested = True
+                elif (
+                    self.latency_per_item is not None
+                    and latency > LATENCY_SPIKE_FLOOR
+                    and per_item > self.latency_per_item * LATENCY_SPIKE_FACTOR
+                ):
+                    congested = True
+
+            if congested:
+                now = time.monotonic()
+                if now - self._last_decrease >= AIMD_DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self._page_size = max(float(MIN_PAGE_SIZE), self._page_size / 2)
+                    self.limit = max(1.0, self.limit / 2)
+                    self.stats["decreases"] += 1
+                self._cond.notify_all()
+                return
+
+            if status >= 400:
+                return
+
+            # EWMA of healthy latencies only
+            if self.latency_per_item is None:
+                self.latency_per_item = per_item
+            else:
+                self.latency_per_item = 0.8 * self.latency_per_item + 0.2 * per_item
+
+            if nbytes is not None:
+                self.bytes_per_item = nbytes / items
+            bytes_per_item = self.bytes_per_item or 0.0
+            if (self._page_size + PAGE_SIZE_STEP) * bytes_per_item <= MAX_PAGE_BYTES:
+                self._page_size = min(float(MAX_PAGE_SIZE), self._page_size + PAGE_SIZE_STEP)
+            self.limit = min(float(self.max_in_flight), self.limit + 1.0 / max(self.limit, 1.0))
+            self.stats["increases"] += 1
+            self._cond.notify_all()
+
+    def record_bytes(self, nbytes: int, items: int) -> None:
+        """
+        Feeds the size of a streamed page (items in nbytes) once its body
+        has been read. Shrinks the page size if pages of it would exceed
+        MAX_PAGE_BYTES.
+        """
+        if items <= 0:
+            return
+        bytes_per_item = nbytes / items
+        with self._cond:
+            self.bytes_per_item = bytes_per_item
+            if self._page_size * bytes_per_item > MAX_PAGE_BYTES:
+                self._page_size = max(float(MIN_PAGE_SIZE), float(int(MAX_PAGE_BYTES / bytes_per_item)))
+
+
+# ----------------------------
+# API client
+# ----------------------------
+
+class EASMAPIClient:
+    """
+    Thin client over the shared session for one EASM base URL.
+
+    get()        -> one decoded JSON payload
+    iter_pages() -> the value/nextLink paging loop, done once for everyone
+    list_pages() -> the same walk as page objects whose items are streamed
+                    off the response (stream=True) or decoded whole (stream=False),
+                    read ahead by the prefetcher either way
+
+    With a token_provider, a 401 refreshes the bearer token and replays the
+    request once, so a long pagination survives token expiry.
+
+    With adaptive paging, walks of the data-plane ADAPTIVE_PAGING_PATHS
+    send $top from a per-endpoint EASMAdaptiveController, which also caps
+    in-flight requests to that endpoint; a caller's $top is only the
+    starting point. nextLinks are always followed unmodified.
+
+    Every request is paced by the shared EASMRateLimiter. 429s, 5xx and
+    transport errors are retried (Retry-After first, else jittered
+    exponential backoff) up to MAX_RETRIES, within the run's retry budget;
+    only 429s are retried for non-idempotent methods.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token_provider: Optional[EASMTokenProvider] = None,
+        proxies: Optional[Dict[str, str]] = None,
+        api_version: Optional[str] = DEFAULT_API_VERSION,
+        timeout: int = DEFAULT_TIMEOUT,
+        session: Optional[requests.Session] = None,
+        headers: Optional[Dict[str, str]] = None,
+        prefetch_pages: int = DEFAULT_PREFETCH_PAGES,
+        logger: Optional[logging.Logger] = None,
+        rate_limiter: Optional[EASMRateLimiter] = None,
+        adaptive: bool = True,
+        stream: bool = True,
+        plane: str = "data",
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.plane = plane
+        self.prefetch_pages = prefetch_pages
+        self.logger = logger or get_logger("http")
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.adaptive = adaptive
+        self.stream = stream
+        self._controllers: Dict[str, EASMAdaptiveController] = {}
+        self._controllers_lock = threading.Lock()
+        self.token_provider = token_provider
+        self.proxies = proxies
+        self.api_version = api_version
+        self.timeout = timeout
+        self.session = session or get_http_session()
+        self._static_headers = headers
+
+    def _headers(self) -> Tuple[Dict[str, str], Optional[str]]:
+        if self.token_provider is None:
+            return self._static_headers or {}, None
+        token = self.token_provider.get_token()
+        return get_headers(token), token
+
+    def adapts(self, path: str) -> bool:
+        """
+        True when a walk starting at path gets an adaptive page size: a
+        data-plane path under ADAPTIVE_PAGING_PATHS, not a stored nextLink.
+        """
+        if not self.adaptive or self.plane != "data" or path.startswith(("https://", "http://")):
+            return False
+        rel = "/" + urlsplit(path).path.lstrip("/")
+        return any(rel == known or rel.startswith(known + "/") for known in ADAPTIVE_PAGING_PATHS)
+
+    def controller_for(self, path: str, page_size: Optional[int] = None) -> EASMAdaptiveController:
+        """
+        Returns the adaptive controller for the endpoint behind path (query ignored).
+        """
+        parts = urlsplit(resolve_next_link(self.base_url, path))
+        endpoint = f"{parts.netloc}{parts.path}"
+        with self._controllers_lock:
+            ctrl = self._controllers.get(endpoint)
+            if ctrl is None:
+                ctrl = EASMAdaptiveController(endpoint, page_size=page_size or DEFAULT_PAGE_SIZE)
+                self._controllers[endpoint] = ctrl
+            return ctrl
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        controller: Optional[EASMAdaptiveController] = None,
+        page_size: Optional[int] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        url = resolve_next_link(self.base_url, path)
+
+        params = dict(params or {})
+        if self.api_version and "api-version=" not in url and "api-version" not in params:
+            params["api-version"] = self.api_version
+
+        host = urlsplit(url).netloc
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS")
+        refreshed = False
+        attempt = 0
+        metrics = current_run_metrics()
+
+        while True:
+            if metrics is None:
+                self.rate_limiter.acquire(host)
+            else:
+                paced = time.perf_counter()
+                self.rate_limiter.acquire(host)
+                metrics.add_seconds("rate_limited", time.perf_counter() - paced)
+            headers, token = self._headers()
+
+            sent = time.perf_counter()
+            try:
+                resp = self._timed_send(method, url, params, headers, controller, page_size, stream)
+            except EASMAPIError as exc:
+                if metrics is not None:
+                    metrics.request(time.perf_counter() - sent, None)
+                if not idempotent or not self._may_retry(attempt):
+                    raise
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"{method} {url}: {exc}; retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                if metrics is not None:
+                    metrics.add("retries")
+                continue
+
+            if metrics is not None:
+                # Streamed bodies are counted by EASMPageStream as they are read
+                metrics.request(time.perf_counter() - sent, resp.status_code)
+                if not stream:
+                    metrics.add("bytes_received", len(resp.content))
+
+            self.rate_limiter.observe(host, resp.headers)
+
+            if resp.status_code == 401 and self.token_provider is not None and not refreshed:
+                resp.close()
+                self.token_provider.refresh(stale_token=token)
+                refreshed = True
+                continue
+
+            retryable = resp.status_code == 429 or (idempotent and resp.status_code in RETRYABLE_STATUS)
+            if retryable and self._may_retry(attempt):
+                retry_after = retry_after_seconds(resp.headers)
+                if retry_after is not None:
+                    # Small spread so processes released together do not
+                    # all hit the service in the same instant
+                    delay = retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.1))
+                else:
+                    delay = backoff_delay(attempt)
+
+                self.logger.warning(
+                    f"{method} {url}: HTTP {resp.status_code}; retry {attempt + 1} in {delay:.1f}s"
+                )
+                resp.close()
+                if resp.status_code == 429:
+                    # Shared pause: acquire() makes every process wait it out
+                    self.rate_limiter.block(host, delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+                if metrics is not None:
+                    metrics.add("retries")
+                continue
+
+            if resp.status_code >= 400:
+                raise EASMAPIError(
+                    f"{method} {url} failed: HTTP {resp.status_code}: {resp.text[:500]}",
+                    status_code=resp.status_code,
+                    url=url,
+                )
+            return resp
+
+    def _may_retry(self, attempt: int) -> bool:
+        if attempt >= MAX_RETRIES:
+            return False
+        if not self.rate_limiter.take_retry():
+            self.logger.error("Retry budget for this run exhausted; not retrying")
+            return False
+        return True
+
+    def _page_reopener(
+        self,
+        url: str,
+        controller: Optional[EASMAdaptiveController],
+        page_size: Optional[int],
+    ) -> Callable[[int, EASMAPIError], requests.Response]:
+        """
+        Returns the EASMPageStream reopen hook: re-requests the page at url
+        after a backoff, drawing on the same retry limit and run budget as
+        request() does.
+        """
+
+        def reopen(attempt: int, exc: EASMAPIError) -> requests.Response:
+            if controller is not None:
+                controller.record(0.0, 0, None, page_size)
+            if not self._may_retry(attempt):
+                raise exc
+            delay = backoff_delay(attempt)
+            self.logger.warning(f"GET {url}: {exc}; re-reading page, retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            metrics = current_run_metrics()
+            if metrics is not None:
+                metrics.add("retries")
+            # url is the one actually sent: query and api-version included
+            return self.request("GET", url, controller=controller, page_size=page_size, stream=True)
+
+        return reopen
+
+    def _timed_send(
+        self,
+        method: str,
+        url: str,
+        params: Dict[str, Any],
+        headers: Dict[str, str],
+        controller: Optional[EASMAdaptiveController],
+        page_size: Optional[int],
+        stream: bool = False,
+    ) -> requests.Response:
+        if controller is None:
+            return self._send(method, url, params, headers, stream)
+
+        controller.acquire()
+        started = time.perf_counter()
+        try:
+            resp = self._send(method, url, params, headers, stream)
+        except EASMAPIError:
+            controller.record(time.perf_counter() - started, 0, None, page_size)
+            raise
+        finally:
+            controller.release()
+
+        # A streamed body is not read yet: time to headers now, its size
+        # once drained (record_bytes; chunked bodies declare none)
+        nbytes = None if stream else len(resp.content)
+        controller.record(time.perf_counter() - started, nbytes, resp.status_code, page_size)
+        return resp
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        params: Dict[str, Any],
+        headers: Dict[str, str],
+        stream: bool = False,
+    ) -> requests.Response:
+        try:
+            return self.session.request(
+                method,
+                url,
+                params=params or None,
+                headers=headers,
+                proxies=self.proxies,
+                timeout=self.timeout,
+                stream=stream,
+            )
+        except requests.RequestException as exc:
+            raise EASMAPIError(f"{method} {url} failed: {exc}", url=url) from exc
+
+    def get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        controller: Optional[EASMAdaptiveController] = None,
+        page_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        resp = self.request("GET", path, params=params, controller=controller, page_size=page_size)
+        return self._decode(resp)
+
+    @staticmethod
+    def _decode(resp: requests.Response) -> Dict[str, Any]:
+        try:
+            return resp.json()
+        except ValueError as exc:
+            raise EASMAPIError(f"GET {resp.url} returned invalid JSON: {exc}", resp.status_code, resp.url) from exc
+
+    def iter_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields each page payload, following nextLink until exhausted.
+        nextLink already carries the query, so params only apply to the first request.
+
+        Pages are fetched ahead by an EASMPrefetcher (prefetch, default
+        self.prefetch_pages), so the next request is in flight while the
+        caller writes the current page. A stop request is acted on before
+        each page is handed out.
+        """
+        depth = self.prefetch_pages if prefetch is None else prefetch
+        pages = self._walk_pages(path, params)
+        if depth > 0:
+            pages = EASMPrefetcher(pages, depth=depth, label=path, logger=self.logger)
+        return self._checked_pages(pages)
+
+    @staticmethod
+    def _checked_pages(pages: Iterable[Any]) -> Iterator[Any]:
+        try:
+            for page in pages:
+                check_shutdown()
+                yield page
+        finally:
+            # A caller that stops early stops the fetcher and the walk with it
+            close_iterator(pages)
+
+    def list_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[Any]:
+        """
+        Yields one page object per page (iterate it for the items, then
+        read next_link). With self.stream the items are decoded off the
+        response as they arrive; otherwise pages come decoded from the
+        prefetching iter_pages().
+
+        Streamed pages are read ahead by the same fetcher thread, in
+        batches of PREFETCH_BATCH_ITEMS up to prefetch (default
+        self.prefetch_pages) batches deep, so the next page is requested
+        while the caller is still writing this one. prefetch=0 reads
+        items straight off the socket as they are consumed, bounding
+        memory to one item at the cost of that overlap.
+
+        raw=True yields each item as JSON text for writing unchanged:
+        the original bytes when streaming, compact re-encoding otherwise.
+
+        A page must be fully consumed before the next one is handed out.
+        """
+        if not self.stream:
+            return (EASMPage(payload, raw=raw) for payload in self.iter_pages(path, params=params, prefetch=prefetch))
+
+        depth = self.prefetch_pages if prefetch is None else prefetch
+        pages = self._walk_pages(path, params, stream=True, raw=raw)
+        if depth <= 0:
+            return pages
+        return self._prefetched_pages(pages, depth, path)
+
+    def _prefetched_pages(self, pages: Iterator[Any], depth: int, label: str) -> Iterator[EASMPrefetchedPage]:
+        with EASMPrefetcher(page_batches(pages), depth=depth, label=label, logger=self.logger) as prefetcher:
+            feed = iter(prefetcher)
+            for first in feed:
+                page = EASMPrefetchedPage(feed, first)
+                yield page
+                page.close()
+
+    def _walk_pages(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]],
+        stream: bool = False,
+        raw: bool = False,
+    ) -> Iterator[Any]:
+        ctrl = None
+        page_size = None
+        if self.adapts(path):
+            params = dict(params or {})
+            hint = params.get(PAGE_SIZE_PARAM)
+            ctrl = self.controller_for(path, page_size=int(hint) if hint else None)
+            # Sent once; the nextLinks carry it on
+            page_size = params[PAGE_SIZE_PARAM] = ctrl.page_size
+
+        next_url: Optional[str] = path
+        try:
+            while next_url:
+                metrics = current_run_metrics()
+                started = time.perf_counter()
+                if stream:
+                    resp = self.request(
+                        "GET", next_url, params=params, controller=ctrl, page_size=page_size, stream=True
+                    )
+                    params = None
+                    page = EASMPageStream(resp, raw=raw, reopen=self._page_reopener(resp.url, ctrl, page_size))
+                    try:
+                        yield page
+                    finally:
+                        page.close()
+                        if metrics is not None:
+                            # Request until the page was drained (written)
+                            metrics.page(
+                                urlsplit(resp.url).path, page.count, page.nbytes,
+                                time.perf_counter() - started, page_size,
+                            )
+                    if ctrl is not None:
+                        ctrl.record_bytes(page.nbytes, page.count)
+                    next_url = page.next_link
+                    continue
+
+                resp = self.request("GET", next_url, params=params, controller=ctrl, page_size=page_size)
+                payload = self._decode(resp)
+                params = None
+                if metrics is not None:
+                    metrics.page(
+                        urlsplit(resp.url).path, len(payload.get("value") or []), len(resp.content),
+                        time.perf_counter() - started, page_size,
+                    )
+                yield payload
+                next_url = payload.get("nextLink") or payload.get("@odata.nextLink")
+        finally:
+            if ctrl is not None:
+                ctrl.save()
@@ -10,10 +10,12 @@ GET /assets/ipAddresses
 (api-version=2024-10-01-preview)
 
 Responsibilities:
-- Authenticate via Azure AD (client credentials)
+- Authenticate via Azure AD (client credentials, shared token cache)
 - Call Defender EASM Assets API
-- Handle pagination via nextLink
-- Emit raw JSON events to Splunk
+- Handle pagination via nextLink, resumable to the item
+- Optionally list only what changed since the last pull (watermark)
+- Emit raw JSON events to Splunk (only new or changed ones in delta mode)
+- Emit tombstones for IP addresses gone since the last complete pull
 
 Design constraints:
 - NO enrichment
@@ -22,74 +24,19 @@ Design constraints:
 """
 
 import sys
-import json
-import time
-import requests
-from splunklib.modularinput import Script, Event, EventWriter
-from azure.identity import ClientSecretCredential
 
+from defender_easm_common import EASMManagementAssetInput
 
-API_VERSION = "2024-10-01-preview"
-RESOURCE = "https://management.azure.com/.default"
+SOURCETYPE = "defender:easm:ip_address"
+API_PATH = "/assets/ipAddresses"
 
 
-class DefenderEASMIPAddresses(Script):
+class DefenderEASMIPAddresses(EASMManagementAssetInput):
 
-    def get_scheme(self):
-        scheme = self.Scheme("Defender EASM IP Addresses")
-        scheme.use_external_validation = True
-        scheme.streaming_mode_xml = False
-        scheme.use_single_instance = False
-        return scheme
-
-    def stream_events(self, inputs, ew: EventWriter):
-        for input_name, input_item in inputs.inputs.items():
-            self.collect_ip_addresses(input_item, ew)
-
-    def collect_ip_addresses(self, input_item, ew):
-        tenant_id = input_item["tenant_id"]
-        client_id = input_item["client_id"]
-        client_secret = input_item["client_secret"]
-        subscription_id = input_item["subscription_id"]
-        resource_group = input_item["resource_group"]
-        workspace_name = input_item["workspace_name"]
-
-        credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret
-        )
-
-        token = credential.get_token(RESOURCE).token
-
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = (
-            f"https://management.azure.com/subscriptions/{subscription_id}"
-            f"/resourceGroups/{resource_group}"
-            f"/providers/Microsoft.Security"
-            f"/externalAttackSurfaceManagementWorkspaces/{workspace_name}"
-            f"/assets/ipAddresses"
-            f"?api-version={API_VERSION}"
-        )
-
-        while url:
-            resp = requests.get(url, headers=headers, timeout=60)
-            resp.raise_for_status()
-            payload = resp.json()
-
-            for item in payload.get("value", []):
-                ew.write_event(Event(
-                    data=json.dumps(item),
-                    sourcetype="defender:easm:ip_address"
-                ))
-
-            url = payload.get("nextLink")
-            time.sleep(0.2)
+    title = "IP Addresses"
+    # No partitions options on this input (inputs.conf.spec)
+    partitioned = False
 
 
 if __name__ == "__main__":
-    sys.exit(DefenderEASMIPAddresses().run(sys.argv))
+    sys.exit(DefenderEASMIPAddresses(asset_name="ip_addresses", sourcetype=SOURCETYPE, path=API_PATH).run(sys.argv))
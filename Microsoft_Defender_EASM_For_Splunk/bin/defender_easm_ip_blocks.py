@@ -10,9 +10,10 @@ GET /assets/ipBlocks
 (api-version=2024-10-01-preview)
 
 Responsibilities:
-- Authenticate via Azure AD (client credentials)
+- Authenticate via Azure AD (client credentials, shared token cache)
 - Call Defender EASM Assets API
-- Handle pagination via nextLink
+- Handle pagination via nextLink, resumable to the item
+- Optionally list only what changed since the last pull (watermark)
 - Emit raw JSON events to Splunk
 
 Design constraints:
@@ -22,74 +23,20 @@ Design constraints:
 """
 
 import sys
-import json
-import time
-import requests
-from splunklib.modularinput import Script, Event, EventWriter
-from azure.identity import ClientSecretCredential
 
+from defender_easm_common import EASMManagementAssetInput
 
-API_VERSION = "2024-10-01-preview"
-RESOURCE = "https://management.azure.com/.default"
+SOURCETYPE = "defender:easm:ip_block"
+API_PATH = "/assets/ipBlocks"
 
 
-class DefenderEASMIPBlocks(Script):
+class DefenderEASMIPBlocks(EASMManagementAssetInput):
 
-    def get_scheme(self):
-        scheme = self.Scheme("Defender EASM IP Blocks")
-        scheme.use_external_validation = True
-        scheme.streaming_mode_xml = False
-        scheme.use_single_instance = False
-        return scheme
-
-    def stream_events(self, inputs, ew: EventWriter):
-        for input_name, input_item in inputs.inputs.items():
-            self.collect_ip_blocks(input_item, ew)
-
-    def collect_ip_blocks(self, input_item, ew):
-        tenant_id = input_item["tenant_id"]
-        client_id = input_item["client_id"]
-        client_secret = input_item["client_secret"]
-        subscription_id = input_item["subscription_id"]
-        resource_group = input_item["resource_group"]
-        workspace_name = input_item["workspace_name"]
-
-        credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret
-        )
-
-        token = credential.get_token(RESOURCE).token
-
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        url = (
-            f"https://management.azure.com/subscriptions/{subscription_id}"
-            f"/resourceGroups/{resource_group}"
-            f"/providers/Microsoft.Security"
-            f"/externalAttackSurfaceManagementWorkspaces/{workspace_name}"
-            f"/assets/ipBlocks"
-            f"?api-version={API_VERSION}"
-        )
-
-        while url:
-            response = requests.get(url, headers=headers, timeout=60)
-            response.raise_for_status()
-            payload = response.json()
-
-            for asset in payload.get("value", []):
-                ew.write_event(Event(
-                    data=json.dumps(asset),
-                    sourcetype="defender:easm:ip_block"
-                ))
-
-            url = payload.get("nextLink")
-            time.sleep(0.2)
+    title = "IP Blocks"
+    # Watermark / incremental options only (inputs.conf.spec)
+    partitioned = False
+    delta = False
 
 
 if __name__ == "__main__":
-    sys.exit(DefenderEASMIPBlocks().run(sys
+    sys.exit(DefenderEASMIPBlocks(asset_name="ip_blocks", sourcetype=SOURCETYPE, path=API_PATH).run(sys.argv))
@@ -0,0 +1,873 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_listing.py
+
+Microsoft Defender EASM for Splunk App
+Checkpointed listings.
+
+Includes:
+- Item-level resumable nextLink listings (EASMResumableListing)
+- Watermark $filter listings with boundary-tie ids and reconciliation pulls (EASMWatermark)
+- Partitioned parallel pagination of large listings (EASMPartitionedListing)
+- One entry point wiring them to delta mode and removal tracking (collect_listing)
+"""
+
+import json
+import time
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from defender_easm_config import EASMAPIError, get_logger
+from defender_easm_state import get_checkpoint, save_checkpoint, save_checkpoints
+from defender_easm_session import get_http_session
+from defender_easm_runs import check_shutdown, run_context_bound
+from defender_easm_paging import raw_fields
+from defender_easm_http import EASMAPIClient
+from defender_easm_delta import open_delta_index
+from defender_easm_removals import EASMRemovalTracker
+
+
+# ----------------------------
+# Resumable listings (item-level checkpoints)
+# ----------------------------
+
+# A mid-page resume point is saved every this many items (stanza key
+# checkpoint_every_items); page boundaries always save one
+DEFAULT_CHECKPOINT_EVERY_ITEMS = 500
+
+
+def _item_id(item: Any) -> Optional[str]:
+    if isinstance(item, str):
+        value = raw_fields(item, ("id",)).get("id")
+    elif isinstance(item, dict):
+        value = item.get("id")
+    else:
+        value = None
+    return None if value is None else str(value)
+
+
+class EASMResumePage:
+    """
+    One page of an EASMResumableListing: iterate it for the items (the
+    already-written prefix of a resumed page is skipped), then read
+    next_link / count as on the underlying page.
+    """
+
+    def __init__(self, listing: "EASMResumableListing", page: Any, skip: int, last_id: Optional[str]):
+        self.listing = listing
+        self.page = page
+        self._skip = skip
+        self._last_id = last_id
+
+    @property
+    def next_link(self) -> Optional[str]:
+        return self.page.next_link
+
+    @property
+    def count(self) -> int:
+        return self.page.count
+
+    def close(self) -> None:
+        self.page.close()
+
+    def __iter__(self):
+        listing = self.listing
+        items = iter(self.page)
+        if self._skip:
+            items = listing._realign(items, self._skip, self._last_id)
+
+        every = listing.every
+        for item in items:
+            check_shutdown()
+            yield item
+            # Asked for the next one: this item has been handled
+            listing.offset += 1
+            listing.last = item
+            if every and listing.offset % every == 0:
+                listing.save()
+
+
+class EASMResumableListing:
+    """
+    nextLink listing that remembers how far it got, down to the item.
+
+    The resume point is saved through save_checkpoint(), so never ahead
+    of the events it covers, at every page boundary and every `every`
+    items within a page:
+
+      cursor   nextLink of the page being written (None: the first page)
+      offset   items of that page already handled
+      last_id  id of the last handled item
+      state    caller state, e.g. the newest timestamp seen so far
+
+    A resumed run re-requests the cursor page and skips up to last_id
+    (found by id, so a page that shifted under us still lines up; a page
+    where it is gone is written whole rather than risk a gap). An
+    unfinished listing saves its exact position when the with-block is
+    left by an error or EASMShutdown. finish() clears the resume point
+    in the same transaction as the caller's own checkpoints (e.g. the new
+    watermark).
+
+    Pre-resume-point checkpoints (a bare nextLink) are read as a cursor.
+    """
+
+    def __init__(
+        self,
+        api: "EASMAPIClient",
+        key: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        raw: bool = False,
+        every: int = DEFAULT_CHECKPOINT_EVERY_ITEMS,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.api = api
+        self.key = key
+        self.path = path
+        self.params = params
+        self.raw = raw
+        self.every = max(0, int(every))
+        self.logger = logger or get_logger("resume")
+
+        self.cursor: Optional[str] = None
+        self.offset = 0
+        self.last: Any = None
+        self.state: Any = None
+        self.resumed = False
+        self._finished = False
+
+        stored = get_checkpoint(key)
+        point: Dict[str, Any] = {}
+        if stored:
+            try:
+                point = json.loads(stored)
+            except ValueError:
+                point = None
+            if not isinstance(point, dict):
+                point = {"cursor": stored}
+        self._point = point
+        self.state = point.get("state")
+
+    def pages(self) -> Iterator[EASMResumePage]:
+        point = self._point
+        self.cursor = point.get("cursor")
+        skip = int(point.get("offset") or 0)
+        last_id = point.get("last_id")
+        self.resumed = bool(self.cursor or skip)
+        if self.resumed:
+            self.logger.info(
+                f"{self.path}: resuming at item {skip} of {'page ' + self.cursor if self.cursor else 'the first page'}"
+            )
+
+        if self.cursor:
+            start, params = self.cursor, None
+        else:
+            start, params = self.path, self.params
+
+        for page in self.api.list_pages(start, params=params, raw=self.raw):
+            self.offset, self.last = 0, None
+            yield EASMResumePage(self, page, skip, last_id)
+            skip, last_id = 0, None
+
+            page.close()
+            if page.next_link:
+                self.cursor, self.offset, self.last = page.next_link, 0, None
+            # After the last page the point stays at its end until finish()
+            self.save()
+
+    def _realign(self, items: Iterator[Any], skip: int, last_id: Optional[str]) -> Iterator[Any]:
+        if last_id is None:
+            # No ids to go by: trust the offset
+            self.offset = sum(1 for _ in itertools.islice(items, skip))
+            return items
+
+        seen = []
+        for item in items:
+            seen.append(item)
+            if _item_id(item) == last_id:
+                if len(seen) != skip:
+                    self.logger.info(f"{self.path}: page shifted since the last run; resuming after item {len(seen)}")
+                self.offset, self.last = len(seen), item
+                return items
+
+        self.logger.warning(
+            f"{self.path}: last written item {last_id} is no longer on its page; writing the page again"
+        )
+        return iter(seen)
+
+    def save(self) -> None:
+        if self._finished:
+            return
+        point: Dict[str, Any] = {"cursor": self.cursor, "offset": self.offset, "last_id": None}
+        if self.last is not None:
+            point["last_id"] = _item_id(self.last)
+        if self.state is not None:
+            point["state"] = self.state
+        save_checkpoint(self.key, json.dumps(point, separators=(",", ":")))
+
+    def finish(self, checkpoints: Optional[Dict[str, Optional[str]]] = None) -> None:
+        """
+        Clears the resume point, together with checkpoints (e.g. the new
+        watermark) in one transaction.
+        """
+        values = dict(checkpoints or {})
+        values[self.key] = None
+        save_checkpoints(values)
+        self._finished = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            if not self._finished:
+                self.finish()
+        else:
+            self.save()
+
+
+def open_resumable_listing(
+    api: "EASMAPIClient",
+    stanza: Dict[str, Any],
+    key: str,
+    path: str,
+    params: Optional[Dict[str, Any]] = None,
+    raw: bool = False,
+    logger: Optional[logging.Logger] = None,
+) -> EASMResumableListing:
+    """
+    EASMResumableListing with the stanza's checkpoint_every_items
+    (0 saves at page boundaries only).
+    """
+    every = stanza.get("checkpoint_every_items")
+    return EASMResumableListing(
+        api,
+        key,
+        path,
+        params=params,
+        raw=raw,
+        every=int(every) if every not in (None, "") else DEFAULT_CHECKPOINT_EVERY_ITEMS,
+        logger=logger,
+    )
+
+
+# ----------------------------
+# Watermark (incremental) listings
+# ----------------------------
+
+# Management-plane assets carry updatedDate, moved on every change
+DEFAULT_WATERMARK_FIELD = "updatedDate"
+
+# In incremental mode every Nth run is a full (reconciliation) pull
+DEFAULT_RECONCILE_EVERY = 4
+
+# Values this close to the pull's start are not trusted to move the
+# watermark (clock skew, assets changed while the pull ran): they are
+# listed again next run instead
+WATERMARK_SKEW_SECONDS = 300
+
+
+def _field_value(item: Any, field: str) -> Any:
+    # field is an OData property path ("updatedDate", "properties/lastSeen")
+    names = field.split("/")
+    if isinstance(item, str):
+        value = raw_fields(item, names[:1]).get(names[0])
+    else:
+        value = item.get(names[0]) if isinstance(item, dict) else None
+    for name in names[1:]:
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+class EASMWatermark:
+    """
+    High-water mark on a timestamp field for incremental listings.
+
+    An incremental pull asks for "<field> ge <watermark>" only. ge rather
+    than gt: several assets can share the watermark instant, and some of
+    them may not have existed yet at the last pull. The ids already
+    written at that instant are stored with the watermark and skipped, so
+    the boundary is neither lost nor written twice.
+
+    The first pull, a pull after the field changed, and every
+    reconcile_every-th pull list everything (no filter), so removal
+    tracking and the delta index see the whole inventory again.
+
+    The new watermark is the newest value seen that is older than the
+    pull's start less WATERMARK_SKEW_SECONDS, so assets that changed
+    while the pull ran are listed again rather than skipped over. The
+    kind and start time of a pull are saved when it begins, so an
+    interrupted pull resumes as the same kind; progress can ride along
+    as a resume point's state (resume() picks it up), and checkpoint() is
+    committed by the caller together with its own end-of-pull
+    checkpoints.
+
+    Disabled instances are full pulls that pass items straight through.
+    """
+
+    def __init__(
+        self,
+        key: Optional[str],
+        field: str = DEFAULT_WATERMARK_FIELD,
+        enabled: bool = True,
+        reconcile_every: int = DEFAULT_RECONCILE_EVERY,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.enabled = enabled and bool(key)
+        self.key = key
+        self.field = field
+        self.reconcile_every = max(0, int(reconcile_every))
+        self.logger = logger or get_logger("watermark")
+        self.stats: Dict[str, int] = {"seen": 0, "skipped": 0}
+
+        self.value: Optional[str] = None
+        self.full = True
+        self._at: Optional[float] = None
+        self._ties: set = set()
+        self._runs = 0
+        self._started = time.time()
+
+        self._lock = threading.Lock()
+        self._best: Optional[float] = None
+        self._best_ids: set = set()
+        # Newest value seen and the ids at it, as JSON-ready as a resume
+        # point needs it
+        self._progress: Dict[str, Any] = {}
+        if self.enabled:
+            self._begin()
+
+    def _begin(self) -> None:
+        stored = get_checkpoint(self.key)
+        point: Dict[str, Any] = {}
+        if stored:
+            try:
+                point = json.loads(stored)
+            except ValueError:
+                point = {}
+            if not isinstance(point, dict) or point.get("field") != self.field:
+                point = {}
+
+        self.value = point.get("value")
+        self._at = _parse_iso_utc(self.value)
+        self._ties = set(point.get("ids") or ())
+        self._runs = int(point.get("runs") or 0)
+
+        pending = point.get("pending")
+        if isinstance(pending, dict):
+            self.full = bool(pending.get("full"))
+            self._started = float(pending.get("started") or self._started)
+        else:
+            self.full = self._at is None or (self.reconcile_every > 0 and self._runs >= self.reconcile_every)
+            point.update({
+                "field": self.field,
+                "pending": {"full": self.full, "started": self._started},
+            })
+            save_checkpoint(self.key, json.dumps(point, separators=(",", ":")))
+
+        if self.full:
+            self.logger.info(f"{self.field}: full (reconciliation) pull")
+        else:
+            self.logger.info(f"{self.field}: incremental pull from {self.value} ({len(self._ties)} ids at the boundary)")
+
+    @property
+    def filter(self) -> Optional[str]:
+        """$filter clause for this pull, or None for a full pull."""
+        if not self.enabled or self.full:
+            return None
+        return f"{self.field} ge {self.value}"
+
+    def params(self, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """params with this pull's clause ANDed into their $filter."""
+        combined = _and_filter((params or {}).get("$filter"), self.filter)
+        if not combined:
+            return params
+        params = dict(params or {})
+        params["$filter"] = combined
+        return params
+
+    def track(self, items: Iterable[Any]) -> Iterable[Any]:
+        """
+        Yields the items to write, dropping those already written at the
+        watermark instant, and notes the newest value seen.
+        """
+        if not self.enabled:
+            yield from items
+            return
+
+        cap = self._started - WATERMARK_SKEW_SECONDS
+        incremental = not self.full
+        for item in items:
+            value = _field_value(item, self.field)
+            at = _parse_iso_utc(value)
+            item_id = _item_id(item)
+            with self._lock:
+                self.stats["seen"] += 1
+                if at is not None and at <= cap and item_id is not None:
+                    self._note(at, value, (item_id,))
+                if incremental and at is not None and at == self._at and item_id in self._ties:
+                    self.stats["skipped"] += 1
+                    continue
+            yield item
+
+    def _note(self, at: float, value: str, ids: Iterable[str]) -> None:
+        # Caller holds self._lock
+        if self._best is None or at > self._best:
+            self._best, self._best_ids = at, set(ids)
+            self._progress["value"] = value
+            self._progress["ids"] = list(self._best_ids)
+        elif at == self._best:
+            for item_id in ids:
+                if item_id not in self._best_ids:
+                    self._best_ids.add(item_id)
+                    self._progress["ids"].append(item_id)
+
+    @property
+    def progress(self) -> Dict[str, Any]:
+        """
+        Newest value seen so far, kept current as items go past: hand it
+        to a resume point as its state once, before the pull.
+        """
+        return self._progress
+
+    def resume(self, progress: Any) -> None:
+        """Picks up the newest value seen before the pull was interrupted."""
+        if not self.enabled or not isinstance(progress, dict):
+            return
+        at = _parse_iso_utc(progress.get("value"))
+        if at is None:
+            return
+        with self._lock:
+            self._note(at, progress["value"], progress.get("ids") or ())
+
+    def checkpoint(self) -> Dict[str, Optional[str]]:
+        """
+        The watermark a complete pull moves to, as {key: value} for
+        save_checkpoints() (empty when disabled).
+        """
+        if not self.enabled:
+            return {}
+
+        with self._lock:
+            if self._best is None or (self._at is not None and self._best < self._at):
+                value, ties = self.value, set(self._ties)
+            elif self._best == self._at:
+                value, ties = self.value, self._ties | self._best_ids
+            else:
+                value, ties = self._progress["value"], set(self._best_ids)
+
+        point = {
+            "field": self.field,
+            "value": value,
+            "ids": sorted(ties),
+            "runs": 1 if self.full else self._runs + 1,
+        }
+        self.logger.info(
+            f"{self.field}: {'full' if self.full else 'incremental'} pull saw {self.stats['seen']} items "
+            f"({self.stats['skipped']} already written at the boundary); watermark now {value}"
+        )
+        return {self.key: json.dumps(point, separators=(",", ":"))}
+
+
+def open_watermark(
+    stanza: Dict[str, Any],
+    key: Optional[str],
+    logger: Optional[logging.Logger] = None,
+) -> EASMWatermark:
+    """
+    Returns the stanza's watermark (incremental, watermark_field,
+    reconcile_every), or a pass-through one (full pulls) when
+    incremental mode is off.
+    """
+    enabled = str(stanza.get("incremental") or "false").strip().lower() in ("1", "true", "yes", "on")
+    reconcile_every = stanza.get("reconcile_every")
+    return EASMWatermark(
+        key,
+        field=(stanza.get("watermark_field") or DEFAULT_WATERMARK_FIELD).strip(),
+        enabled=enabled,
+        reconcile_every=int(reconcile_every) if reconcile_every not in (None, "") else DEFAULT_RECONCILE_EVERY,
+        logger=logger,
+    )
+
+
+# ----------------------------
+# Partitioned (parallel) listing
+# ----------------------------
+
+# firstSeen never changes for an asset, so items cannot drift between
+# slices while they are being drained (lastSeen would).
+DEFAULT_PARTITION_FIELD = "firstSeen"
+
+# Lower bound used when the service cannot tell us the oldest value
+PARTITION_EPOCH_FLOOR = 946684800  # 2000-01-01T00:00:00Z
+
+PROGRESS_LOG_INTERVAL = 30
+
+# Items a slice reads off its page before handing them to emit_page, so a
+# slice holds at most this many while another one has the writer
+SLICE_BATCH_ITEMS = 500
+
+
+def _iso_utc(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_iso_utc(value: Any) -> Optional[float]:
+    if not isinstance(value, str) or not value:
+        return None
+    text = value.replace("Z", "+00:00")
+    # fromisoformat before Python 3.11 takes exactly 3 or 6 fraction
+    # digits; the service sends up to 7
+    dot = text.find(".")
+    if dot != -1:
+        end = dot + 1
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        text = text[:dot + 1] + (text[dot + 1:end] + "000000")[:6] + text[end:]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def _and_filter(*clauses: Optional[str]) -> Optional[str]:
+    parts = [c for c in clauses if c]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    return " and ".join(f"({c})" for c in parts)
+
+
+class EASMPartitionedListing:
+    """
+    Drains one listing as N independent OData $filter slices in parallel.
+
+    Planning ($count probes):
+      - oldest/newest value of the partition field ($orderby ... $top=1)
+      - bisect the largest time window until there are N slices of
+        roughly equal item counts
+      - a final "field eq null" slice so undated items are not lost
+
+    Each slice keeps its own cursor (nextLink) and the number of items of
+    that page already emitted in the plan, which is checkpointed after
+    every batch, so an interrupted run resumes every unfinished slice at
+    the next unwritten item. The plan is only reused by a run listing the
+    same path with the same params, field and partition count.
+
+    Pages are streamed and handed to emit_page SLICE_BATCH_ITEMS at a time
+    (serialized), so the caller's writer needs no locking. Items are raw
+    JSON text (see EASMPageStream), ready to write.
+    """
+
+    def __init__(
+        self,
+        api: EASMAPIClient,
+        path: str,
+        checkpoint_key: str,
+        partitions: int,
+        field: str = DEFAULT_PARTITION_FIELD,
+        params: Optional[Dict[str, Any]] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.api = api
+        self.path = path
+        self.checkpoint_key = checkpoint_key
+        self.partitions = max(1, partitions)
+        self.field = field
+        self.params = dict(params or {})
+        self.logger = logger or get_logger("partitions")
+
+        self._lock = threading.Lock()
+        self._plan: Dict[str, Any] = {}
+        self._done = 0
+        self._started = 0.0
+        self._last_progress = 0.0
+
+        # One keep-alive connection per slice
+        get_http_session(self.partitions * 2)
+
+    # -------- planning --------
+
+    def _count(self, flt: Optional[str]) -> Optional[int]:
+        params = dict(self.params)
+        params.update({"$count": "true", "$top": 1})
+        combined = _and_filter(self.params.get("$filter"), flt)
+        if combined:
+            params["$filter"] = combined
+
+        try:
+            payload = self.api.get(self.path, params=params)
+        except EASMAPIError:
+            return None
+        for key in ("@odata.count", "count", "totalElements", "totalCount"):
+            if isinstance(payload.get(key), int):
+                return payload[key]
+        return None
+
+    def _bound(self, order: str) -> Optional[float]:
+        params = dict(self.params)
+        params.update({"$orderby": f"{self.field} {order}", "$top": 1})
+        try:
+            items = self.api.get(self.path, params=params).get("value") or []
+        except EASMAPIError:
+            return None
+        if not items:
+            return None
+
+        value: Any = items[0]
+        for key in self.field.split("/"):
+            value = value.get(key) if isinstance(value, dict) else None
+        return _parse_iso_utc(value)
+
+    def _window_filter(self, lo: float, hi: float) -> str:
+        return f"{self.field} ge {_iso_utc(lo)} and {self.field} lt {_iso_utc(hi)}"
+
+    def _plan_slices(self) -> Dict[str, Any]:
+        lo = self._bound("asc")
+        hi = self._bound("desc")
+        if lo is None or hi is None:
+            lo, hi = PARTITION_EPOCH_FLOOR, time.time()
+        lo, hi = float(int(lo)), float(int(hi) + 1)
+
+        total = self._count(None)
+        first = self._count(self._window_filter(lo, hi)) if total is not None else None
+
+        if first is None:
+            # No $count support: equal-width windows
+            step = (hi - lo) / self.partitions
+            windows = [(lo + i * step, lo + (i + 1) * step) for i in range(self.partitions)]
+        else:
+            sized = [(lo, hi, first)]
+            while len(sized) < self.partitions:
+                sized.sort(key=lambda w: w[2])
+                w_lo, w_hi, w_count = sized[-1]
+                if w_count <= 1 or w_hi - w_lo < 2:
+                    break
+                mid = float(int((w_lo + w_hi) / 2))
+                left = self._count(self._window_filter(w_lo, mid)) or 0
+                sized[-1:] = [(w_lo, mid, left), (mid, w_hi, max(0, w_count - left))]
+            windows = sorted((w_lo, w_hi) for w_lo, w_hi, _ in sized)
+
+        slices = []
+        for i, (w_lo, w_hi) in enumerate(windows):
+            # Open-ended outer slices also catch items newer than the plan
+            clauses = []
+            if i > 0:
+                clauses.append(f"{self.field} ge {_iso_utc(w_lo)}")
+            if i < len(windows) - 1:
+                clauses.append(f"{self.field} lt {_iso_utc(w_hi)}")
+            slices.append({"filter": " and ".join(clauses) or None, "cursor": None, "done": False})
+        slices.append({"filter": f"{self.field} eq null", "cursor": None, "done": False})
+
+        return {
+            "path": self.path,
+            "field": self.field,
+            "signature": self._signature(),
+            "total": total,
+            "done_items": 0,
+            "slices": slices,
+        }
+
+    def _signature(self) -> str:
+        """
+        What a stored plan must match to be resumed: a different query or
+        partitioning would slice a different listing.
+        """
+        return json.dumps(
+            [self.path, self.params, self.field, self.partitions], sort_keys=True, separators=(",", ":")
+        )
+
+    # -------- draining --------
+
+    def _save_plan(self) -> None:
+        self._plan["done_items"] = self._done
+        save_checkpoint(self.checkpoint_key, json.dumps(self._plan, separators=(",", ":")))
+
+    def _report_progress(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_progress < PROGRESS_LOG_INTERVAL:
+            return
+        self._last_progress = now
+
+        elapsed = max(now - self._started, 1e-6)
+        rate = self._done / elapsed
+        finished = sum(1 for sl in self._plan["slices"] if sl["done"])
+        total = self._plan.get("total")
+
+        if total:
+            remaining = max(total - self._done, 0)
+            eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+            self.logger.info(
+                f"{self.path}: {self._done}/{total} items ({100.0 * self._done / total:.1f}%), "
+                f"{rate:.0f} items/s, ETA {eta}, {finished}/{len(self._plan['slices'])} slices done"
+            )
+        else:
+            self.logger.info(
+                f"{self.path}: {self._done} items, {rate:.0f} items/s, "
+                f"{finished}/{len(self._plan['slices'])} slices done"
+            )
+
+    def _drain(self, index: int, emit_page) -> None:
+        sl = self._plan["slices"][index]
+
+        if sl["cursor"]:
+            start, params = sl["cursor"], None
+        else:
+            params = dict(self.params)
+            combined = _and_filter(self.params.get("$filter"), sl["filter"])
+            if combined:
+                params["$filter"] = combined
+            start = self.path
+
+        skip = int(sl.get("offset") or 0)
+        for page in self.api.list_pages(start, params=params, raw=True):
+            check_shutdown()
+            # Batches are read off the wire outside the lock; the plan
+            # records how far into the page each one got
+            batch = []
+            for item in page:
+                if skip:
+                    skip -= 1
+                    continue
+                batch.append(item)
+                if len(batch) >= SLICE_BATCH_ITEMS:
+                    self._emit(sl, emit_page, batch)
+                    batch = []
+            page.close()
+            self._emit(sl, emit_page, batch, end=True, next_link=page.next_link)
+            skip = 0
+
+    def _emit(self, sl: Dict[str, Any], emit_page, items: list, end: bool = False, next_link=None) -> None:
+        with self._lock:
+            if items:
+                emit_page(items)
+                self._done += len(items)
+            if end:
+                sl["cursor"], sl["offset"] = next_link, 0
+                sl["done"] = not next_link
+            else:
+                sl["offset"] = int(sl.get("offset") or 0) + len(items)
+            self._save_plan()
+            self._report_progress(force=sl["done"])
+
+    def run(self, emit_page) -> int:
+        """
+        Drains every slice; returns the number of items emitted this run.
+        """
+        stored = get_checkpoint(self.checkpoint_key)
+        plan = json.loads(stored) if stored else None
+        if plan and plan.get("signature") == self._signature():
+            self.logger.info(f"{self.path}: resuming partitioned pull")
+        else:
+            if plan:
+                self.logger.info(f"{self.path}: query or partitioning changed, discarding the stored plan")
+            plan = self._plan_slices()
+            self.logger.info(
+                f"{self.path}: planned {len(plan['slices'])} slices on {self.field} "
+                f"(total={plan.get('total')})"
+            )
+
+        self._plan = plan
+        self._done = int(plan.get("done_items") or 0)
+        resumed_from = self._done
+        self._started = time.time()
+        self._save_plan()
+
+        pending = [i for i, sl in enumerate(plan["slices"]) if not sl["done"]]
+        with ThreadPoolExecutor(max_workers=self.partitions, thread_name_prefix="easm-slice") as pool:
+            drain = run_context_bound(self._drain)
+            futures = [pool.submit(drain, i, emit_page) for i in pending]
+            errors = [f.exception() for f in futures if f.exception() is not None]
+
+        if errors:
+            # Plan (with per-slice cursors) stays checkpointed for the next run
+            raise errors[0]
+
+        self._report_progress(force=True)
+        save_checkpoint(self.checkpoint_key, None)
+        return self._done - resumed_from
+
+
+def collect_listing(
+    api: EASMAPIClient,
+    path: str,
+    emit_page,
+    stanza: Dict[str, Any],
+    checkpoint_key: str,
+    logger: Optional[logging.Logger] = None,
+    delta_key: Optional[str] = None,
+    removals: Optional["EASMRemovalTracker"] = None,
+    resume_key: Optional[str] = None,
+    watermark_key: Optional[str] = None,
+) -> int:
+    """
+    Lists path and hands each page's items to emit_page.
+
+    emit_page gets an iterable of raw JSON item text to write unchanged
+    (a streamed page, so iterate it once).
+
+    Serial nextLink walk by default, resumable to the item under
+    resume_key (see EASMResumableListing); when the stanza sets
+    partitions > 1 the listing is drained as parallel $filter slices
+    (partition_field, default firstSeen) with resumable per-slice cursors.
+
+    With delta_key and delta_mode = true on the stanza, only new or
+    changed items reach emit_page (see EASMDeltaIndex). removals (see
+    open_removal_tracker()) sees every item and writes tombstones for
+    assets gone since the last complete pull.
+
+    With watermark_key and incremental = true on the stanza, most pulls
+    list only what changed since the last one (see EASMWatermark); those
+    skip removal tracking and merge into the delta index.
+    """
+    removals = removals or EASMRemovalTracker(None, "", enabled=False)
+    with removals, open_delta_index(stanza, delta_key, logger) as delta:
+        watermark = open_watermark(stanza, watermark_key, logger)
+        if not watermark.full:
+            removals.disable()
+            delta.incremental()
+        params = watermark.params()
+
+        def pipeline(items):
+            return delta.filter(removals.track(watermark.track(items)))
+
+        partitions = int(stanza.get("partitions") or 1)
+        if partitions > 1:
+            listing = EASMPartitionedListing(
+                api,
+                path,
+                checkpoint_key=checkpoint_key,
+                partitions=partitions,
+                field=(stanza.get("partition_field") or DEFAULT_PARTITION_FIELD).strip(),
+                params=params,
+                logger=logger,
+            )
+            total = listing.run(lambda items: emit_page(pipeline(items)))
+            if watermark.enabled:
+                save_checkpoints(watermark.checkpoint())
+            return total
+
+        total = 0
+        if resume_key is None:
+            for page in api.list_pages(path, params=params, raw=True):
+                emit_page(pipeline(page))
+                total += page.count
+            if watermark.enabled:
+                save_checkpoints(watermark.checkpoint())
+            return total
+
+        with open_resumable_listing(api, stanza, resume_key, path, params=params, raw=True, logger=logger) as listing:
+            watermark.resume(listing.state)
+            listing.state = watermark.progress
+            for page in listing.pages():
+                emit_page(pipeline(page))
+                total += page.count
+            # New watermark and cleared resume point commit together
+            listing.finish(watermark.checkpoint())
+        return total
@@ -0,0 +1,767 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_output.py
+
+Microsoft Defender EASM for Splunk App
+Event output.
+
+Includes:
+- Batched, pre-escaped <stream> event output (EASMBatchEventWriter)
+- Optional HTTP Event Collector output, gzip batches in flight (EASMHECEventWriter),
+  with checkpoints committed after indexer acknowledgement
+"""
+
+import json
+import time
+import gzip
+import uuid
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+import splunklib.modularinput as smi
+
+from defender_easm_config import EASMAPIError, get_app_config, get_logger, get_stored_password
+from defender_easm_state import active_batch_writers, active_batch_writers_lock, current_run_metrics
+from defender_easm_session import DEFAULT_TIMEOUT
+from defender_easm_ratelimit import MAX_RETRIES, RETRYABLE_STATUS, backoff_delay, retry_after_seconds
+
+
+# ----------------------------
+# Event output (batched)
+# ----------------------------
+
+# One <stream> document is flushed to splunkd once this much event XML
+# is buffered, or when the oldest buffered event is this old.
+DEFAULT_BATCH_BYTES = 1024 * 1024
+DEFAULT_BATCH_SECONDS = 1.0
+
+# write() takes a splunklib-style "time" argument, which shadows the module
+_monotonic = time.monotonic
+
+
+def _xml_text(value: str) -> str:
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if not value.isascii():
+        # As ElementTree does: character references keep stdout ASCII-safe
+        value = value.encode("ascii", "xmlcharrefreplace").decode("ascii")
+    return value
+
+
+def _xml_attr(value: str) -> str:
+    return (
+        _xml_text(value)
+        .replace('"', "&quot;")
+        .replace("\n", "&#10;")
+        .replace("\r", "&#13;")
+        .replace("\t", "&#09;")
+    )
+
+
+def flush_event_writers() -> None:
+    """
+    Flushes every batch writer in the process.
+    """
+    with active_batch_writers_lock:
+        writers = list(active_batch_writers)
+    for writer in writers:
+        writer.flush()
+
+
+class EASMBatchEventWriter:
+    """
+    Drop-in replacement for the splunklib EventWriter on the hot path.
+
+    splunklib builds an ElementTree element per event, serializes it and
+    flushes stdout every time. This writer escapes each event's data with
+    plain string replaces, reuses the pre-escaped XML for the (stanza,
+    sourcetype, index, host, source) combination, and concatenates events
+    into batches, flushed on size (batch_bytes) or age (batch_seconds).
+
+    Output is byte for byte what splunklib would write for the same events
+    (element and attribute order, escaping): one <stream> document shared
+    with the wrapped EventWriter, opened on the first flush and closed by
+    its close() at the end of Script.run_script.
+
+    splunklib has no public call for text that is already XML
+    (write_xml_document serializes an ElementTree element, which is the
+    per-event cost this class avoids), so batches go to the EventWriter's
+    output stream, _out, and the opening tag is tracked on its
+    header_written flag. Both are the same from splunk-sdk 1.6 through
+    2.1 (the SDK versions this app supports, see README Requirements);
+    an EventWriter without them is refused up front rather than writing
+    a broken stream.
+
+    write()        fast path, no Event object
+    write_event()  accepts an smi.Event, for existing call sites
+    log()          passed through to the wrapped EventWriter
+    flush()/close() emit whatever is buffered
+    """
+
+    def __init__(
+        self,
+        ew: smi.EventWriter,
+        batch_bytes: int = DEFAULT_BATCH_BYTES,
+        batch_seconds: float = DEFAULT_BATCH_SECONDS,
+    ):
+        if not hasattr(ew, "_out") or not hasattr(ew, "header_written"):
+            raise RuntimeError(
+                "EASMBatchEventWriter needs splunk-sdk 1.6 - 2.x (EventWriter._out, header_written); "
+                "set output_mode = hec to use another SDK"
+            )
+        self._ew = ew
+        self._out = ew._out
+        self.batch_bytes = batch_bytes
+        self.batch_seconds = batch_seconds
+
+        self._lock = threading.RLock()
+        self._chunks: list = []
+        self._size = 0
+        self._first_at = 0.0
+        self._heads: Dict[Tuple, str] = {}
+        self.stats: Dict[str, int] = {"events": 0, "batches": 0, "bytes": 0}
+
+    def _head(self, stanza, sourcetype, index, host, source, unbroken) -> str:
+        key = (stanza, sourcetype, index, host, source, unbroken)
+        head = self._heads.get(key)
+        if head is None:
+            head = "<event"
+            if stanza is not None:
+                head += f' stanza="{_xml_attr(stanza)}"'
+            head += f' unbroken="{int(unbroken)}">'
+            self._heads[key] = head
+
+            tail = ""
+            for tag, value in (("source", source), ("sourcetype", sourcetype), ("index", index), ("host", host)):
+                if value is not None:
+                    tail += f"<{tag}>{_xml_text(value)}</{tag}>"
+            self._heads[key + ("tail",)] = tail
+        return head
+
+    def write(
+        self,
+        data: str,
+        stanza: Optional[str] = None,
+        sourcetype: Optional[str] = None,
+        index: Optional[str] = None,
+        host: Optional[str] = None,
+        source: Optional[str] = None,
+        time: Optional[Any] = None,
+        unbroken: bool = True,
+        done: bool = True,
+    ) -> None:
+        # Defaults match smi.Event (unbroken, done)
+        head = self._head(stanza, sourcetype, index, host, source, unbroken)
+        tail = self._heads[(stanza, sourcetype, index, host, source, unbroken, "tail")]
+
+        parts = [head]
+        if time is not None:
+            parts.append(f"<time>{_xml_text(str(time))}</time>")
+        parts.append(tail)
+        parts.append("<data>")
+        parts.append(_xml_text(data))
+        parts.append("</data><done /></event>" if done else "</data></event>")
+        chunk = "".join(parts)
+        metrics = current_run_metrics()
+
+        with self._lock:
+            if metrics is not None:
+                metrics.wrote(len(chunk))
+            if not self._chunks:
+                self._first_at = _monotonic()
+                with active_batch_writers_lock:
+                    active_batch_writers.add(self)
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self.stats["events"] += 1
+
+            if self._size >= self.batch_bytes or _monotonic() - self._first_at >= self.batch_seconds:
+                self._flush_locked()
+
+    def write_event(self, event: smi.Event) -> None:
+        if event.data is None:
+            raise ValueError("Events must have at least the data field set to be written to XML.")
+        self.write(
+            event.data,
+            stanza=event.stanza,
+            sourcetype=event.sourceType,
+            index=event.index,
+            host=event.host,
+            source=event.source,
+            time=event.time,
+            unbroken=event.unbroken,
+            done=event.done,
+        )
+
+    def _flush_locked(self) -> None:
+        if not self._chunks:
+            return
+        if not self._ew.header_written:
+            # Closed by EventWriter.close(), like its own write_event()
+            self._chunks.insert(0, "<stream>")
+            self._ew.header_written = True
+        document = "".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        with active_batch_writers_lock:
+            active_batch_writers.discard(self)
+
+        started = time.perf_counter()
+        self._out.write(document)
+        self._out.flush()
+        metrics = current_run_metrics()
+        if metrics is not None:
+            # splunkd not reading stdout fast enough shows up here
+            metrics.add_seconds("output_blocked", time.perf_counter() - started)
+        self.stats["batches"] += 1
+        self.stats["bytes"] += len(document)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def log(self, severity: str, message: str) -> None:
+        self._ew.log(severity, message)
+
+    def log_exception(self, message: str, exception=None, severity=None) -> None:
+        self._ew.log_exception(message, exception, severity)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------------------
+# Event output (HTTP Event Collector)
+# ----------------------------
+
+HEC_EVENT_PATH = "/services/collector/event"
+HEC_ACK_PATH = "/services/collector/ack"
+
+# Batches close at whichever comes first (uncompressed bytes / events),
+# or when the oldest event is DEFAULT_BATCH_SECONDS old.
+DEFAULT_HEC_BATCH_BYTES = 1024 * 1024
+DEFAULT_HEC_BATCH_EVENTS = 5000
+DEFAULT_HEC_MAX_IN_FLIGHT = 4
+HEC_GZIP_LEVEL = 6
+
+# Indexer acknowledgement (hec_ack = true)
+DEFAULT_HEC_MAX_UNACKED = 64        # batches sent but not yet acknowledged
+DEFAULT_HEC_ACK_TIMEOUT = 120.0     # seconds before an unacknowledged batch is resent
+HEC_ACK_POLL_SECONDS = 1.0
+HEC_ACK_RESENDS = 2
+
+
+class EASMHECEventWriter:
+    """
+    Sends events to a Splunk HTTP Event Collector instead of stdout.
+
+    Same interface as EASMBatchEventWriter, so collectors do not care
+    which one open_event_writer() returned. Events become HEC JSON
+    envelopes ({"sourcetype", "index", "source", "event": <raw text>}),
+    so _raw is the item text exactly as it would have been on stdout.
+
+    Batches are gzip-compressed and POSTed by a small thread pool over one
+    keep-alive session, with up to max_in_flight batches outstanding;
+    producers block once that many are queued. 429/5xx and transport
+    errors are retried with the usual backoff; any other rejection fails
+    the writer and the next write/flush raises it.
+
+    Checkpoints do not wait on delivery. save_checkpoint() hands the write
+    to commit_after(), which runs it once every batch submitted before it
+    is delivered: HTTP 200 by default, or, with ack=True, once the indexer
+    acknowledgement for each batch has come back on this writer's
+    channel. Acks are polled by a background thread while sending goes
+    on (at most max_unacked batches outstanding); a batch still
+    unacknowledged after ack_timeout is resent, so delivery is
+    at-least-once. Checkpoints still pending at close() are dropped and
+    the next run resumes from the last committed one.
+    """
+
+    def __init__(
+        self,
+        ew: smi.EventWriter,
+        url: str,
+        token: str,
+        verify: Any = True,
+        batch_bytes: int = DEFAULT_HEC_BATCH_BYTES,
+        batch_events: int = DEFAULT_HEC_BATCH_EVENTS,
+        batch_seconds: float = DEFAULT_BATCH_SECONDS,
+        max_in_flight: int = DEFAULT_HEC_MAX_IN_FLIGHT,
+        gzip_level: int = HEC_GZIP_LEVEL,
+        ack: bool = False,
+        ack_timeout: float = DEFAULT_HEC_ACK_TIMEOUT,
+        max_unacked: int = DEFAULT_HEC_MAX_UNACKED,
+        ack_poll_seconds: float = HEC_ACK_POLL_SECONDS,
+        timeout: int = DEFAULT_TIMEOUT,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self._ew = ew
+        url = url.rstrip("/")
+        base = url[: -len(HEC_EVENT_PATH)] if url.endswith(HEC_EVENT_PATH) else url
+        self.url = base + HEC_EVENT_PATH
+        self.ack_url = base + HEC_ACK_PATH
+        self.verify = verify
+        self.batch_bytes = batch_bytes
+        self.batch_events = batch_events
+        self.batch_seconds = batch_seconds
+        self.gzip_level = gzip_level
+        self.ack = ack
+        self.ack_timeout = ack_timeout
+        self.ack_poll_seconds = ack_poll_seconds
+        self.timeout = timeout
+        self.logger = logger or get_logger("hec")
+
+        max_in_flight = max(1, max_in_flight)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight + 1, pool_block=True, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Splunk {token}",
+            "Content-Type": "application/json",
+        })
+        if ack:
+            # Acks are per channel; the session also keeps any load
+            # balancer cookie so polls reach the indexer that has the data
+            self.channel = str(uuid.uuid4())
+            self.session.headers["X-Splunk-Request-Channel"] = self.channel
+        self._post_headers = {"Content-Encoding": "gzip"} if gzip_level > 0 else {}
+
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="easm-hec")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._unacked_slots = threading.BoundedSemaphore(max(1, max_unacked))
+
+        self._lock = threading.RLock()
+        self._chunks: list = []
+        self._size = 0
+        self._first_at = 0.0
+        self._heads: Dict[Tuple, str] = {}
+        self._seq = 0
+
+        self._state_lock = threading.Lock()
+        self._pending: "set" = set()
+        self._errors: list = []
+        self._unacked: Dict[int, Dict[str, Any]] = {}
+        self._done: "set" = set()
+        self._delivered_through = -1
+        self._commits: "deque" = deque()
+        self._commit_lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            "events": 0, "batches": 0, "bytes": 0, "sent_bytes": 0, "retries": 0, "acked": 0, "resent": 0,
+        }
+
+        self._stop = threading.Event()
+        self._poller = None
+        if ack:
+            self._poller = threading.Thread(target=self._poll_acks, name="easm-hec-ack", daemon=True)
+            self._poller.start()
+
+        with active_batch_writers_lock:
+            active_batch_writers.add(self)
+
+    def _head(self, source, sourcetype, index, host) -> str:
+        key = (source, sourcetype, index, host)
+        head = self._heads.get(key)
+        if head is None:
+            head = "{"
+            for name, value in (("source", source), ("sourcetype", sourcetype), ("index", index), ("host", host)):
+                if value is not None:
+                    head += f"{json.dumps(name)}:{json.dumps(value)},"
+            self._heads[key] = head
+        return head
+
+    def write(
+        self,
+        data: str,
+        stanza: Optional[str] = None,
+        sourcetype: Optional[str] = None,
+        index: Optional[str] = None,
+        host: Optional[str] = None,
+        source: Optional[str] = None,
+        time: Optional[Any] = None,
+        unbroken: bool = True,
+        done: bool = True,
+    ) -> None:
+        # A modular input's default source is its stanza name
+        chunk = self._head(source or stanza, sourcetype, index, host)
+        if time is not None:
+            chunk += f'"time":{float(time)},'
+        chunk += f'"event":{json.dumps(data)}}}\n'
+        metrics = current_run_metrics()
+
+        with self._lock:
+            self._raise_failure()
+            if metrics is not None:
+                metrics.wrote(len(chunk))
+            if not self._chunks:
+                self._first_at = _monotonic()
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self.stats["events"] += 1
+
+            if (
+                self._size >= self.batch_bytes
+                or len(self._chunks) >= self.batch_events
+                or _monotonic() - self._first_at >= self.batch_seconds
+            ):
+                self._submit_locked()
+
+    def write_event(self, event: smi.Event) -> None:
+        if event.data is None:
+            raise ValueError("Events must have at least the data field set to be written to XML.")
+        self.write(
+            event.data,
+            stanza=event.stanza,
+            sourcetype=event.sourceType,
+            index=event.index,
+            host=event.host,
+            source=event.source,
+            time=event.time,
+        )
+
+    def _raise_failure(self) -> None:
+        with self._state_lock:
+            if self._errors:
+                raise self._errors[0]
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._state_lock:
+            self._errors.append(exc)
+
+    # -------- sending --------
+
+    def _submit_locked(self) -> None:
+        if not self._chunks:
+            return
+        body = "".join(self._chunks).encode("utf-8")
+        count = len(self._chunks)
+        self._chunks = []
+        self._size = 0
+        seq = self._seq
+        self._seq += 1
+
+        # Backpressure: wait here while max_in_flight batches are being
+        # sent (and, with acks, while max_unacked are awaiting their ack)
+        started = time.perf_counter()
+        if self.ack:
+            self._unacked_slots.acquire()
+        self._slots.acquire()
+        metrics = current_run_metrics()
+        if metrics is not None:
+            metrics.add_seconds("output_blocked", time.perf_counter() - started)
+        self._run(self._deliver, seq, body, count)
+
+    def _run(self, fn, *args) -> None:
+        future = self._pool.submit(fn, *args)
+        with self._state_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future) -> None:
+        with self._state_lock:
+            self._pending.discard(future)
+            exc = future.exception()
+            if exc is not None:
+                self._errors.append(exc)
+
+    def _deliver(self, seq: int, body: bytes, count: int) -> None:
+        try:
+            # zlib releases the GIL, so batches compress in parallel
+            payload = gzip.compress(body, self.gzip_level) if self.gzip_level > 0 else body
+            ack_id = self._post(payload, count)
+        except BaseException:
+            if self.ack:
+                self._unacked_slots.release()
+            raise
+        finally:
+            self._slots.release()
+
+        with self._state_lock:
+            self.stats["batches"] += 1
+            self.stats["bytes"] += len(body)
+            self.stats["sent_bytes"] += len(payload)
+        self._sent(seq, payload, count, ack_id, resends=0)
+
+    def _resend(self, entry: Dict[str, Any]) -> None:
+        try:
+            ack_id = self._post(entry["payload"], entry["count"])
+        except BaseException:
+            self._unacked_slots.release()
+            raise
+        self._sent(entry["seq"], entry["payload"], entry["count"], ack_id, entry["resends"] + 1)
+
+    def _sent(self, seq: int, payload: bytes, count: int, ack_id: Optional[int], resends: int) -> None:
+        if not self.ack:
+            self._delivered(seq)
+            return
+        if ack_id is None:
+            # Token without indexer acknowledgement: HTTP 200 is all there is
+            self.logger.warning("HEC response carried no ackId; is indexer acknowledgement enabled on the token?")
+            self._unacked_slots.release()
+            self._delivered(seq)
+            return
+        with self._state_lock:
+            self._unacked[ack_id] = {
+                "seq": seq, "payload": payload, "count": count, "sent": _monotonic(), "resends": resends,
+            }
+
+    def _post(self, payload: bytes, count: int) -> Optional[int]:
+        """
+        POSTs one batch, retrying 429/5xx and transport errors.
+        Returns the ackId when the channel is acknowledged.
+        """
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(
+                    self.url, data=payload, headers=self._post_headers, timeout=self.timeout, verify=self.verify
+                )
+            except requests.RequestException as exc:
+                if attempt >= MAX_RETRIES:
+                    raise EASMAPIError(f"HEC POST {self.url} failed: {exc}", url=self.url) from exc
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"HEC POST failed: {exc}; retry {attempt + 1} in {delay:.1f}s")
+            else:
+                if resp.status_code < 300:
+                    if not self.ack:
+                        return None
+                    try:
+                        return resp.json().get("ackId")
+                    except ValueError:
+                        return None
+                if resp.status_code not in RETRYABLE_STATUS or attempt >= MAX_RETRIES:
+                    raise EASMAPIError(
+                        f"HEC rejected a batch of {count} events: HTTP {resp.status_code}: {resp.text[:500]}",
+                        status_code=resp.status_code,
+                        url=self.url,
+                    )
+                delay = retry_after_seconds(resp.headers)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                self.logger.warning(f"HEC busy (HTTP {resp.status_code}); retry {attempt + 1} in {delay:.1f}s")
+
+            with self._state_lock:
+                self.stats["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
+
+    # -------- acknowledgement --------
+
+    def _poll_acks(self) -> None:
+        while not self._stop.wait(self.ack_poll_seconds):
+            try:
+                self._check_acks()
+            except Exception as exc:
+                self.logger.warning(f"HEC ack poll failed: {exc}")
+
+    def _check_acks(self) -> None:
+        with self._state_lock:
+            ids = list(self._unacked)
+        if not ids:
+            return
+
+        resp = self.session.post(
+            self.ack_url,
+            params={"channel": self.channel},
+            json={"acks": ids},
+            timeout=self.timeout,
+            verify=self.verify,
+        )
+        if resp.status_code >= 300:
+            raise EASMAPIError(f"HTTP {resp.status_code}: {resp.text[:500]}", status_code=resp.status_code, url=self.ack_url)
+        acks = resp.json().get("acks") or {}
+
+        acked, expired = [], []
+        now = _monotonic()
+        with self._state_lock:
+            for ack_id in ids:
+                entry = self._unacked.get(ack_id)
+                if entry is None:
+                    continue
+                if acks.get(str(ack_id)):
+                    del self._unacked[ack_id]
+                    acked.append(entry)
+                elif now - entry["sent"] >= self.ack_timeout:
+                    del self._unacked[ack_id]
+                    expired.append(entry)
+            self.stats["acked"] += len(acked)
+
+        for entry in acked:
+            self._unacked_slots.release()
+            self._delivered(entry["seq"])
+
+        for entry in expired:
+            if entry["resends"] >= HEC_ACK_RESENDS:
+                self._unacked_slots.release()
+                self._fail(EASMAPIError(
+                    f"HEC never acknowledged a batch of {entry['count']} events "
+                    f"({entry['resends'] + 1} sends, {self.ack_timeout:g}s each)",
+                    url=self.url,
+                ))
+                continue
+            self.logger.warning(
+                f"HEC ack for a batch of {entry['count']} events timed out after "
+                f"{self.ack_timeout:g}s; resending"
+            )
+            with self._state_lock:
+                self.stats["resent"] += 1
+            self._run(self._resend, entry)
+
+    # -------- checkpoint commits --------
+
+    def _delivered(self, seq: int) -> None:
+        with self._state_lock:
+            self._done.add(seq)
+            while self._delivered_through + 1 in self._done:
+                self._delivered_through += 1
+                self._done.discard(self._delivered_through)
+        self._run_commits()
+
+    def _run_commits(self) -> None:
+        # One thread at a time, oldest first, so checkpoints never go backwards
+        with self._commit_lock:
+            while True:
+                with self._state_lock:
+                    if not self._commits or self._commits[0][0] > self._delivered_through:
+                        return
+                    _, fn = self._commits.popleft()
+                try:
+                    fn()
+                except Exception as exc:
+                    self.logger.error(f"Checkpoint commit failed: {exc}")
+
+    def commit_after(self, fn) -> None:
+        """
+        Runs fn() once every event written so far has been delivered.
+        """
+        with self._lock:
+            self._submit_locked()
+            with self._state_lock:
+                self._commits.append((self._seq - 1, fn))
+        self._run_commits()
+
+    # -------- lifecycle --------
+
+    def flush(self) -> None:
+        """
+        Sends the open batch and waits until every batch has been POSTed.
+        Acknowledgements are not waited for; see commit_after().
+        """
+        with self._lock:
+            self._submit_locked()
+            with self._state_lock:
+                pending = list(self._pending)
+        if pending:
+            futures_wait(pending)
+        self._raise_failure()
+
+    def _wait_acked(self) -> None:
+        while True:
+            self._raise_failure()
+            with self._state_lock:
+                if not self._unacked and not self._pending:
+                    return
+                pending = list(self._pending)
+            if pending:
+                futures_wait(pending)
+            else:
+                time.sleep(min(self.ack_poll_seconds, 0.1))
+
+    def log(self, severity: str, message: str) -> None:
+        self._ew.log(severity, message)
+
+    def log_exception(self, message: str, exception=None, severity=None) -> None:
+        self._ew.log_exception(message, exception, severity)
+
+    def close(self) -> None:
+        try:
+            self.flush()
+            if self.ack:
+                self._wait_acked()
+        finally:
+            self._stop.set()
+            if self._poller is not None:
+                self._poller.join()
+            with active_batch_writers_lock:
+                active_batch_writers.discard(self)
+            self._pool.shutdown(wait=True)
+            self.session.close()
+
+            with self._state_lock:
+                dropped = len(self._commits)
+            if dropped:
+                self.logger.warning(
+                    f"{dropped} checkpoint update(s) not committed: their events were not confirmed "
+                    f"delivered, so the next run resumes from the previous checkpoint"
+                )
+            self.logger.info(
+                f"HEC output: {self.stats['events']} events in {self.stats['batches']} batches, "
+                f"{self.stats['bytes']} bytes ({self.stats['sent_bytes']} on the wire), "
+                f"{self.stats['retries']} retries"
+                + (f", {self.stats['acked']} acked, {self.stats['resent']} resent" if self.ack else "")
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_hec_token(session_key: str) -> Optional[str]:
+    return get_stored_password(session_key, "hec_token")
+
+
+def open_event_writer(ew: smi.EventWriter, session_key: str):
+    """
+    Returns the event writer selected by the settings stanza:
+
+      output_mode = stdout (default)  EASMBatchEventWriter on the modular input stream
+      output_mode = hec               EASMHECEventWriter to hec_url, token from the
+                                      hec_token secret; hec_verify_ssl (true/false or
+                                      a CA bundle path), hec_batch_bytes,
+                                      hec_batch_events, hec_max_in_flight;
+                                      hec_ack = true commits checkpoints only
+                                      after indexer acknowledgement
+                                      (hec_ack_timeout, hec_max_unacked)
+    """
+    cfg = get_app_config(session_key)
+    mode = (cfg.get("output_mode") or "stdout").strip().lower()
+    if mode != "hec":
+        return EASMBatchEventWriter(ew)
+
+    url = (cfg.get("hec_url") or "").strip()
+    token = get_hec_token(session_key)
+    if not url or not token:
+        raise RuntimeError("output_mode = hec requires hec_url and the hec_token secret")
+
+    verify: Any = (cfg.get("hec_verify_ssl") or "true").strip()
+    if verify.lower() in ("1", "true", "yes", "on"):
+        verify = True
+    elif verify.lower() in ("0", "false", "no", "off"):
+        verify = False
+
+    return EASMHECEventWriter(
+        ew,
+        url,
+        token,
+        verify=verify,
+        batch_bytes=int(cfg.get("hec_batch_bytes") or DEFAULT_HEC_BATCH_BYTES),
+        batch_events=int(cfg.get("hec_batch_events") or DEFAULT_HEC_BATCH_EVENTS),
+        max_in_flight=int(cfg.get("hec_max_in_flight") or DEFAULT_HEC_MAX_IN_FLIGHT),
+        ack=(cfg.get("hec_ack") or "false").strip().lower() in ("1", "true", "yes", "on"),
+        ack_timeout=float(cfg.get("hec_ack_timeout") or DEFAULT_HEC_ACK_TIMEOUT),
+        max_unacked=int(cfg.get("hec_max_unacked") or DEFAULT_HEC_MAX_UNACKED),
+    )
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_paging.py
+
+Microsoft Defender EASM for Splunk App
+List page decoding.
+
+Includes:
+- Fetch/emit pipeline with a bounded prefetch queue (EASMPrefetcher)
+- Incremental decoding of list pages straight off the response (EASMPageStream)
+  with a raw passthrough mode that writes items without re-serializing them
+"""
+
+import json
+import time
+import codecs
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+from defender_easm_config import EASMAPIError
+from defender_easm_state import current_run_metrics
+from defender_easm_runs import run_context_bound
+
+
+# ----------------------------
+# Streaming page decoding
+# ----------------------------
+
+# Pages fetched ahead of the writer; 0 disables the fetcher thread
+DEFAULT_PREFETCH_PAGES = 2
+
+# Seconds close() waits for the fetcher thread to finish its current request
+PREFETCH_CLOSE_SECONDS = 10.0
+
+
+def close_iterator(it: Any) -> None:
+    """
+    Closes a generator (and whatever it holds open) that was not run to
+    the end; other iterators are left alone.
+    """
+    close = getattr(it, "close", None)
+    if close is not None:
+        close()
+
+
+class EASMPrefetcher:
+    """
+    Producer/consumer stage between the API and the event writer.
+
+    A fetcher thread pulls pages from the source iterator into a bounded
+    queue while the caller drains (serializes / writes) the previous page.
+    Errors raised by the source are re-raised in the consumer.
+
+    stats:
+      pages            pages (item batches, for streamed pages) handed to the consumer
+      avg_depth        mean queue depth seen by the consumer
+      max_depth        deepest queue seen by the consumer
+      fetcher_blocked  seconds the fetcher waited on a full queue  -> writer/indexer bound
+      writer_waiting   seconds the consumer waited on an empty queue -> API bound
+
+    Checkpoints must be saved by the consumer (after writing), never
+    inside the source iterator, which runs ahead.
+
+    A consumer that stops early closes the prefetcher (close(), or use it
+    as a context manager): the fetcher stops, the pages it read ahead
+    are dropped and the source generator is closed, releasing its
+    response.
+    """
+
+    def __init__(
+        self,
+        pages: Iterable[Any],
+        depth: int = DEFAULT_PREFETCH_PAGES,
+        label: str = "",
+        logger: Optional[logging.Logger] = None,
+    ):
+        self._source = iter(pages)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=run_context_bound(self._produce), name="easm-prefetch", daemon=True)
+        self.label = label
+        self.logger = logger
+
+        self.stats: Dict[str, Any] = {
+            "pages": 0,
+            "avg_depth": 0.0,
+            "max_depth": 0,
+            "fetcher_blocked": 0.0,
+            "writer_waiting": 0.0,
+        }
+        self._depth_sum = 0
+        self._closed = False
+
+    def __enter__(self) -> "EASMPrefetcher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _put(self, item) -> bool:
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                self.stats["fetcher_blocked"] += time.perf_counter() - started
+                # Stopped while blocked: the consumer is gone, fetch nothing more
+                return not self._stop.is_set()
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            for page in self._source:
+                if not self._put(("page", page)):
+                    return
+            self._put(("done", None))
+        except BaseException as exc:
+            self._put(("error", exc))
+        finally:
+            # The source is only ever iterated on this thread, so it is closed here
+            close_iterator(self._source)
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self) -> None:
+        """
+        Stops the fetcher and drops the pages it read ahead. Waits up to
+        PREFETCH_CLOSE_SECONDS for a request in flight to finish so the
+        source is closed before this returns.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._thread.ident is None:
+            close_iterator(self._source)
+        else:
+            # Unblocks a fetcher waiting on a full queue
+            self._drain()
+            self._thread.join(PREFETCH_CLOSE_SECONDS)
+            self._drain()
+
+        if self.logger is not None and self.stats["pages"]:
+            self.logger.info(
+                f"{self.label}: pipeline pages={self.stats['pages']} "
+                f"avg_depth={self.stats['avg_depth']:.2f} max_depth={self.stats['max_depth']} "
+                f"fetcher_blocked={self.stats['fetcher_blocked']:.2f}s (writer-bound) "
+                f"writer_waiting={self.stats['writer_waiting']:.2f}s (API-bound)"
+            )
+
+    def __iter__(self):
+        self._thread.start()
+        try:
+            while True:
+                depth = self._queue.qsize()
+                self._depth_sum += depth
+                self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+
+                started = time.perf_counter()
+                kind, value = self._queue.get()
+                self.stats["writer_waiting"] += time.perf_counter() - started
+
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise value
+
+                self.stats["pages"] += 1
+                self.stats["avg_depth"] = self._depth_sum / self.stats["pages"]
+                yield value
+        finally:
+            self.close()
+
+
+# Bytes read off the socket per step while decoding a page
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_JSON_WS = " \t\n\r"
+_JSON_DECODER = json.JSONDecoder()  # stateless; building one per call costs more than the lookup
+
+
+def raw_fields(raw: str, names: Iterable[str]) -> Dict[str, Any]:
+    """
+    Decodes the named top-level members of a raw JSON object, stopping as
+    soon as all of them are found.
+
+    Used in passthrough mode where the few fields needed for checkpoints
+    and timestamps are read from the item text.
+    """
+    wanted = set(names)
+    found: Dict[str, Any] = {}
+    decoder = _JSON_DECODER
+
+    pos = raw.find("{") + 1
+    if pos <= 0:
+        return found
+
+    while wanted:
+        while pos < len(raw) and raw[pos] in _JSON_WS + ",":
+            pos += 1
+        if pos >= len(raw) or raw[pos] != '"':
+            break
+
+        key, pos = decoder.raw_decode(raw, pos)
+        while raw[pos] in _JSON_WS:
+            pos += 1
+        pos += 1  # ':'
+        while raw[pos] in _JSON_WS:
+            pos += 1
+
+        value, pos = decoder.raw_decode(raw, pos)
+        if key in wanted:
+            found[key] = value
+            wanted.discard(key)
+
+    return found
+
+
+class EASMPage:
+    """
+    A list page that is already decoded: iterate for the value[] items
+    (re-encoded compactly when raw is requested).
+    """
+
+    def __init__(self, payload: Dict[str, Any], raw: bool = False):
+        self.meta = payload
+        self.raw = raw
+        self.count = len(payload.get("value") or [])
+
+    def __iter__(self):
+        items = self.meta.get("value") or []
+        if self.raw:
+            return (json.dumps(item, separators=(",", ":"), ensure_ascii=False) for item in items)
+        return iter(items)
+
+    @property
+    def next_link(self) -> Optional[str]:
+        return self.meta.get("nextLink") or self.meta.get("@odata.nextLink")
+
+    def close(self) -> None:
+        pass
+
+
+class EASMPageCutError(EASMAPIError):
+    """
+    Raised when a streamed page body breaks off: the connection dropped
+    or the JSON ended before the page was complete.
+    """
+
+
+class EASMPageStream:
+    """
+    A list page decoded incrementally off the HTTP response.
+
+    Iterating yields value[] items one at a time as they arrive; every
+    other top-level member (nextLink, @odata.count, ...) is kept in meta.
+    Only the current item and one read chunk are held in memory, however
+    large the page. next_link is complete once the page has been
+    iterated or closed.
+
+    raw=True is passthrough mode: each item is yielded as its original
+    JSON text, sliced out of the response and never re-encoded. The C
+    decoder still finds where each item ends (a pure-Python bracket
+    scanner measured several times slower), but its result is dropped
+    at once. Use raw_fields() for the odd member a caller needs.
+
+    The body is read after the request has returned, so a reset or short
+    read mid-page happens outside the client's retry loop. reopen(attempt,
+    error) is called for a fresh response to the same page; the new body
+    is decoded from the start and the items already yielded are skipped.
+    Without reopen (or once it gives up) EASMPageCutError is raised.
+    """
+
+    def __init__(
+        self,
+        resp: requests.Response,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        raw: bool = False,
+        reopen: Optional[Callable[[int, EASMAPIError], requests.Response]] = None,
+    ):
+        self.raw = raw
+        self._chunk_size = chunk_size
+        self._reopen = reopen
+        self._json = json.JSONDecoder()
+        self._reset(resp)
+        self._items = self._resume()
+
+        self.nbytes = 0
+        self.retries = 0
+        self._metrics = current_run_metrics()
+
+    def _reset(self, resp: requests.Response) -> None:
+        self._resp = resp
+        self._chunks = resp.iter_content(self._chunk_size)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._base = 0  # stream offset of _buf[0]
+        self._eof = False
+        self.meta: Dict[str, Any] = {}
+        self.count = 0
+
+    def __iter__(self):
+        return self._items
+
+    @property
+    def next_link(self) -> Optional[str]:
+        return self.meta.get("nextLink") or self.meta.get("@odata.nextLink")
+
+    def close(self) -> None:
+        """
+        Reads (and discards) whatever is left, so meta is complete and the
+        connection goes back to the pool.
+        """
+        try:
+            for _ in self._items:
+                pass
+        finally:
+            self._resp.close()
+
+    # -------- decoding --------
+
+    def _resume(self) -> Iterator[Any]:
+        yielded = 0
+        while True:
+            try:
+                for index, item in enumerate(self._parse()):
+                    if index >= yielded:
+                        yielded += 1
+                        yield item
+                return
+            except EASMPageCutError as exc:
+                if self._reopen is None:
+                    raise
+                # Raises once the retry budget is spent
+                resp = self._reopen(self.retries, exc)
+                self.retries += 1
+                self._resp.close()
+                self._reset(resp)
+
+    def _invalid(self, reason: str, cut: bool = False) -> EASMAPIError:
+        # cut: the body ended where more JSON was due (a short read), as
+        # opposed to text that is not JSON at all
+        return (EASMPageCutError if cut else EASMAPIError)(
+            f"GET {self._resp.url} returned {'truncated' if cut else 'invalid'} JSON: {reason}",
+            self._resp.status_code,
+            self._resp.url,
+        )
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            self._base += self._pos
+            self._buf = self._buf[self._pos:] + self._text.decode(b"", final=True)
+            self._pos = 0
+            return False
+        except requests.RequestException as exc:
+            raise EASMPageCutError(f"GET {self._resp.url} failed mid-page: {exc}", url=self._resp.url) from exc
+
+        self.nbytes += len(chunk)
+        if self._metrics is not None:
+            self._metrics.add("bytes_received", len(chunk))
+
+        # Drop what has been consumed before appending
+        self._base += self._pos
+        self._buf = self._buf[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _JSON_WS:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise self._invalid(f"expected {char!r} at offset {self._pos}", cut=not found)
+        self._pos += 1
+
+    def _decode(self) -> Any:
+        """
+        Decodes one complete JSON value at the cursor, reading more as needed.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # A number at the very end of the buffer may still be growing
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as exc:
+                if self._eof:
+                    cut = exc.pos >= len(self._buf.rstrip(_JSON_WS)) or exc.msg.startswith("Unterminated")
+                    raise self._invalid(str(exc), cut=cut) from exc
+
+            self._grow()
+
+    def _decode_raw(self) -> str:
+        """
+        Returns the original text of the JSON value at the cursor.
+        """
+        self._peek()
+        start = self._base + self._pos
+        self._decode()
+        # _fill() may have trimmed the consumed head of the buffer meanwhile
+        return self._buf[start - self._base:self._pos]
+
+    def _grow(self) -> None:
+        # At least double the pending text before trying again, so a
+        # large item is not re-scanned once per chunk
+        pending = len(self._buf) - self._pos
+        while len(self._buf) - self._pos < 2 * pending and self._fill():
+            pass
+
+    def _parse(self) -> Iterator[Any]:
+        self._expect("{")
+        while True:
+            char = self._peek()
+            if char == "}":
+                self._pos += 1
+                return
+            if char == ",":
+                self._pos += 1
+                continue
+            if char != '"':
+                raise self._invalid(f"unexpected {char!r} at offset {self._pos}", cut=not char)
+
+            key = self._decode()
+            self._expect(":")
+
+            if key != "value" or self._peek() != "[":
+                self.meta[key] = self._decode()
+                continue
+
+            self._pos += 1
+            while True:
+                char = self._peek()
+                if char == "]":
+                    self._pos += 1
+                    break
+                if char == ",":
+                    self._pos += 1
+                    continue
+                if not char:
+                    raise self._invalid("value array not closed", cut=True)
+
+                item = self._decode_raw() if self.raw else self._decode()
+                self.count += 1
+                yield item
+
+
+# Streamed items handed from the fetcher thread to the writer per queue
+# slot; with prefetch_pages slots the read-ahead is about that many
+# default-sized pages
+PREFETCH_BATCH_ITEMS = 100
+
+
+def page_batches(pages: Iterable[Any], size: int = PREFETCH_BATCH_ITEMS) -> Iterator[Tuple[str, Any]]:
+    """
+    Flattens streamed pages into ("items", [...]) batches, each page
+    closed by ("end", page) once it has been read to the end.
+    """
+    try:
+        for page in pages:
+            batch = []
+            for item in page:
+                batch.append(item)
+                if len(batch) >= size:
+                    yield "items", batch
+                    batch = []
+            if batch:
+                yield "items", batch
+            yield "end", page
+    finally:
+        close_iterator(pages)
+
+
+class EASMPrefetchedPage:
+    """
+    A streamed page read ahead by an EASMPrefetcher: the fetcher thread
+    decodes the response into batches of PREFETCH_BATCH_ITEMS while the
+    caller writes the previous ones, and requests the next page as soon
+    as this one has been read. Iterate it, then read next_link.
+    """
+
+    def __init__(self, feed: Iterator[Tuple[str, Any]], first: Tuple[str, Any]):
+        self._feed = feed
+        self._first: Optional[Tuple[str, Any]] = first
+        self._page: Any = None
+        self._delivered = 0
+        self._items = self._read()
+
+    def _read(self) -> Iterator[Any]:
+        while self._page is None:
+            if self._first is not None:
+                (kind, value), self._first = self._first, None
+            else:
+                kind, value = next(self._feed)
+            if kind == "end":
+                self._page = value
+                return
+            for item in value:
+                self._delivered += 1
+                yield item
+
+    def __iter__(self):
+        return self._items
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self._page.meta if self._page is not None else {}
+
+    @property
+    def next_link(self) -> Optional[str]:
+        return self._page.next_link if self._page is not None else None
+
+    @property
+    def count(self) -> int:
+        return self._page.count if self._page is not None else self._delivered
+
+    @property
+    def nbytes(self) -> int:
+        return self._page.nbytes if self._page is not None else 0
+
+    def close(self) -> None:
+        for _ in self._items:
+            pass
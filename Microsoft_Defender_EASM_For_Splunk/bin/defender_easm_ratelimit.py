@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_ratelimit.py
+
+Microsoft Defender EASM for Splunk App
+Rate limiting and retries.
+
+Includes:
+- Cross-process token-bucket rate limiting + Retry-After aware retries (EASMRateLimiter)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from defender_easm_config import checkpoint_dir, get_app_config
+from defender_easm_state import EASMFileLock, run_local
+
+
+# ----------------------------
+# Rate limiting / retries (cross-process)
+# ----------------------------
+
+# Token bucket shared by every modular input process, per API host.
+# Overridable in the settings stanza: rate_limit_per_second, rate_limit_burst.
+DEFAULT_RATE_LIMIT_PER_SECOND = 20.0
+DEFAULT_RATE_LIMIT_BURST = 40.0
+
+# Retries per request, and per input run (settings key: retry_budget)
+MAX_RETRIES = 5
+DEFAULT_RETRY_BUDGET = 100
+
+# Full-jitter exponential backoff when the service gives no Retry-After
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 60.0
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# Below this many remaining requests (x-ms-ratelimit-remaining-*), the
+# shared burst is drained so every process paces at the refill rate.
+RATE_LIMIT_LOW_WATERMARK = 10
+
+# Longest single sleep before the shared state is looked at again
+_RATE_LIMIT_MAX_SLEEP = 5.0
+
+# Tokens a process takes from the shared bucket at once, in seconds of
+# the rate (at least one); leases lapse after the same time
+RATE_LIMIT_LEASE_SECONDS = 0.25
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """
+    Delay requested by the service, from Retry-After (seconds or HTTP
+    date) or the millisecond variants Azure sends.
+    """
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) / 1000.0)
+            except ValueError:
+                pass
+
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _ratelimit_remaining(headers: Any) -> Optional[int]:
+    """
+    Lowest x-ms-ratelimit-remaining-* counter on a response, if any.
+    """
+    remaining = None
+    for name, value in headers.items():
+        if not name.lower().startswith("x-ms-ratelimit-remaining-"):
+            continue
+        try:
+            count = int(value)
+        except (TypeError, ValueError):
+            continue
+        remaining = count if remaining is None else min(remaining, count)
+    return remaining
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for the given (0-based) attempt.
+    """
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * (2 ** attempt)))
+
+
+class EASMRateLimiter:
+    """
+    Request pacing and retry accounting shared by all inputs.
+
+    The token bucket for each API host lives in one JSON state file under
+    the checkpoint directory, guarded by an EASMFileLock, so concurrently
+    started inputs draw from the same budget instead of each assuming it
+    has the service to itself.
+
+    State per host:
+      tokens         requests that may start now (refills at rate/s up to burst)
+      updated        when tokens was last refilled
+      blocked_until  set from a 429 Retry-After; every process waits it out
+
+    A process takes tokens in leases of RATE_LIMIT_LEASE_SECONDS worth of
+    the rate and spends them without touching the file; what is left of
+    a lease when it lapses goes back to the bucket. A 429 seen by another
+    process therefore holds this one back from its next lease on.
+
+    The retry budget is per input run (the EASMRunGuard of the calling
+    thread), shared by every request and worker thread of that run; once
+    spent, failures are raised instead of retried.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE_LIMIT_PER_SECOND,
+        burst: float = DEFAULT_RATE_LIMIT_BURST,
+        retry_budget: int = DEFAULT_RETRY_BUDGET,
+    ):
+        self.configured = False
+        self.configure(rate, burst, retry_budget)
+        self._lock = threading.Lock()
+        # host -> [tokens, lapses at (monotonic)]
+        self._leases: Dict[str, list] = {}
+        self._blocked: Dict[str, float] = {}
+        self.retries = 0  # spent outside any run
+        self.stats: Dict[str, Any] = {"retries": 0, "throttled": 0, "waited": 0.0, "leases": 0}
+
+    def configure(self, rate: float, burst: float, retry_budget: int) -> None:
+        # rate <= 0 disables pacing; 429 handling and retries still apply
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.retry_budget = int(retry_budget)
+
+    def _state_path(self) -> str:
+        return os.path.join(checkpoint_dir(), "ratelimit.json")
+
+    def _update(self, host: str, fn) -> Any:
+        """
+        Runs fn(bucket, now) on the host's bucket under the cross-process
+        lock and persists the result. Returns whatever fn returns.
+        """
+        path = self._state_path()
+        with EASMFileLock(path + ".lock"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if not isinstance(state, dict):
+                    state = {}
+            except (OSError, ValueError):
+                state = {}
+
+            now = time.time()
+            bucket = state.get(host) or {"tokens": self.burst, "updated": now, "blocked_until": 0.0}
+
+            # Refill
+            elapsed = max(0.0, now - bucket.get("updated", now))
+            bucket["tokens"] = min(self.burst, bucket.get("tokens", self.burst) + elapsed * max(self.rate, 0.0))
+            bucket["updated"] = now
+
+            result = fn(bucket, now)
+
+            state[host] = bucket
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+            return result
+
+    def acquire(self, host: str) -> None:
+        """
+        Blocks until a request to host may start.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._blocked.get(host, 0.0) - now
+                lease = self._leases.get(host)
+                if wait <= 0 and lease is not None and now < lease[1] and lease[0] >= 1.0:
+                    lease[0] -= 1.0
+                    return
+                # Lapsed or used up: hand back what is left with the next lease
+                leftover = 0.0
+                if lease is not None and now >= lease[1]:
+                    leftover = lease[0] if self.rate > 0 else 0.0
+                    del self._leases[host]
+
+            if wait <= 0:
+                wait, granted = self._update(host, lambda bucket, now: self._lease(bucket, now, leftover))
+                if granted:
+                    with self._lock:
+                        self.stats["leases"] += 1
+                        lease = self._leases.setdefault(host, [0.0, 0.0])
+                        lease[0] += granted - 1.0
+                        lease[1] = time.monotonic() + RATE_LIMIT_LEASE_SECONDS
+                    return
+
+            wait = min(wait, _RATE_LIMIT_MAX_SLEEP)
+            with self._lock:
+                self.stats["waited"] += wait
+            time.sleep(wait)
+
+    def _lease(self, bucket: Dict[str, Any], now: float, leftover: float) -> Tuple[float, float]:
+        """
+        Returns (seconds to wait, tokens granted) for one lease on bucket.
+        """
+        bucket["tokens"] = min(self.burst, bucket["tokens"] + leftover)
+        blocked = bucket.get("blocked_until", 0.0) - now
+        if blocked > 0:
+            return blocked, 0.0
+        if self.rate <= 0:
+            # Unpaced: the lease only spaces out the blocked_until checks
+            return 0.0, float("inf")
+        if bucket["tokens"] >= 1.0:
+            granted = float(min(int(bucket["tokens"]), max(1, int(self.rate * RATE_LIMIT_LEASE_SECONDS))))
+            bucket["tokens"] -= granted
+            return 0.0, granted
+        return (1.0 - bucket["tokens"]) / self.rate, 0.0
+
+    def block(self, host: str, seconds: float) -> None:
+        """
+        Pauses every process's requests to host for seconds (429 Retry-After).
+        """
+        def extend(bucket, now):
+            bucket["blocked_until"] = max(bucket.get("blocked_until", 0.0), now + seconds)
+            bucket["tokens"] = 0.0
+
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._leases.pop(host, None)
+            self._blocked[host] = max(self._blocked.get(host, 0.0), time.monotonic() + seconds)
+        self._update(host, extend)
+
+    def observe(self, host: str, headers: Any) -> None:
+        """
+        Drains the shared burst when the service reports it is nearly out
+        of quota, so all processes fall back to the steady rate.
+        """
+        remaining = _ratelimit_remaining(headers)
+        if remaining is None or remaining > RATE_LIMIT_LOW_WATERMARK:
+            return
+
+        def drain(bucket, now):
+            bucket["tokens"] = min(bucket["tokens"], 0.0)
+
+        with self._lock:
+            self._leases.pop(host, None)
+        self._update(host, drain)
+
+    def take_retry(self) -> bool:
+        """
+        Spends one retry from the current run's budget; False once it is exhausted.
+        """
+        run = getattr(run_local, "guard", None)
+        owner = run if run is not None else self
+        with self._lock:
+            if owner.retries >= self.retry_budget:
+                return False
+            owner.retries += 1
+            self.stats["retries"] += 1
+            return True
+
+
+_rate_limiter: Optional[EASMRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(session_key: Optional[str] = None) -> EASMRateLimiter:
+    """
+    Returns the per-process rate limiter. The first call with a session
+    key applies the settings stanza overrides.
+    """
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = EASMRateLimiter()
+
+        if session_key and not _rate_limiter.configured:
+            cfg = get_app_config(session_key)
+            _rate_limiter.configure(
+                rate=float(cfg.get("rate_limit_per_second") or DEFAULT_RATE_LIMIT_PER_SECOND),
+                burst=float(cfg.get("rate_limit_burst") or DEFAULT_RATE_LIMIT_BURST),
+                retry_budget=int(cfg.get("retry_budget") or DEFAULT_RETRY_BUDGET),
+            )
+            _rate_limiter.configured = True
+
+        return _rate_limiter
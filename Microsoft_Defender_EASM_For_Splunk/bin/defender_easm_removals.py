@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_removals.py
+
+Microsoft Defender EASM for Splunk App
+Removed-asset detection.
+
+Includes:
+- Removed-asset tombstones from memory-mapped sorted id snapshots (EASMRemovalTracker)
+"""
+
+import os
+import sys
+import json
+import time
+import array
+import hashlib
+import struct
+import logging
+import mmap
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from defender_easm_config import checkpoint_dir, get_logger
+from defender_easm_state import (
+    active_batch_writers_lock,
+    commit_after_events,
+    commit_spools,
+    get_state_store,
+)
+from defender_easm_runs import ms_iso_utc
+from defender_easm_paging import raw_fields
+from defender_easm_delta import hash64
+
+
+# ----------------------------
+# Removed-asset detection (id snapshots)
+# ----------------------------
+
+try:
+    import numpy as np
+except ImportError:  # Splunk's bundled Python has no numpy: pure-Python merge
+    np = None
+
+REMOVED_SOURCETYPE = "defender:easm:asset_removed"
+
+_IDS_MAGIC = b"EASMIDS1"
+_IDS_HEADER = struct.Struct("<8sQQd")  # magic, ids, id blob bytes, snapshot time
+_SPOOL_LEN = struct.Struct("<I")
+
+
+class EASMIdSnapshot:
+    """
+    Memory-mapped id snapshot of one complete pull.
+
+    Layout: header, sorted uint64 id hashes, uint64 offsets (n + 1) into
+    the id blob, then the ids as UTF-8 in hash order. Only the hash array
+    is scanned when diffing; ids are read back just for removed entries.
+    """
+
+    def __init__(self, path: str):
+        self.n = 0
+        self.taken = 0.0
+        self.hashes: Any = ()
+        self._mm = None
+        self._views: list = []
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < _IDS_HEADER.size:
+                return
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n, blob_len, taken = _IDS_HEADER.unpack_from(self._mm)
+        if magic != _IDS_MAGIC:
+            return
+        self.n, self.taken = n, taken
+        base = _IDS_HEADER.size
+        self._offsets_at = base + 8 * n
+        self._blob_at = self._offsets_at + 8 * (n + 1)
+
+        if np is not None:
+            self.hashes = np.frombuffer(self._mm, dtype="<u8", count=n, offset=base)
+        elif sys.byteorder == "little":
+            view = memoryview(self._mm)
+            self._views.append(view)
+            self.hashes = view[base:self._offsets_at].cast("Q")
+            self._views.append(self.hashes)
+        else:
+            self.hashes = array.array("Q", self._mm[base:self._offsets_at])
+            self.hashes.byteswap()
+
+    def id_at(self, i: int) -> str:
+        start, end = struct.unpack_from("<QQ", self._mm, self._offsets_at + 8 * i)
+        return self._mm[self._blob_at + start:self._blob_at + end].decode("utf-8")
+
+    def close(self) -> None:
+        self.hashes = ()
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+# Without numpy, hashes are bucketed on their top bits (they are uniform)
+# into buckets of about this many, each sorted on its own as Python ints,
+# so the sort never holds every id as objects at once
+_SORT_RUN = 1 << 17
+
+
+def _sorted_unique(hashes: "array.array") -> Tuple[Any, Any]:
+    """
+    Returns (sorted unique hashes, index of each in the input).
+    """
+    if np is not None:
+        values = np.frombuffer(hashes, dtype=np.uint64) if len(hashes) else np.zeros(0, dtype=np.uint64)
+        order = np.argsort(values, kind="stable")
+        ordered = values[order]
+        keep = np.ones(len(ordered), dtype=bool)
+        keep[1:] = ordered[1:] != ordered[:-1]
+        return ordered[keep], order[keep]
+
+    bits = (len(hashes) // _SORT_RUN).bit_length()
+    shift = 64 - bits
+    buckets = [array.array("Q") for _ in range(1 << bits)]
+    for i, value in enumerate(hashes):
+        buckets[value >> shift].append(i)
+
+    unique, index = array.array("Q"), array.array("Q")
+    last = None
+    for b, bucket in enumerate(buckets):
+        buckets[b] = None
+        # Stable: the first of equal hashes is the one kept
+        for i in sorted(bucket, key=hashes.__getitem__):
+            value = hashes[i]
+            if value != last:
+                unique.append(value)
+                index.append(i)
+                last = value
+    return unique, index
+
+
+def _missing(previous: Any, current: Any) -> Iterable[int]:
+    """
+    Positions in sorted previous whose hash is not in sorted current.
+    """
+    if np is not None:
+        if not len(current):
+            return range(len(previous))
+        pos = np.searchsorted(current, previous)
+        np.minimum(pos, len(current) - 1, out=pos)
+        return np.flatnonzero(current[pos] != previous).tolist()
+
+    missing = []
+    j, m = 0, len(current)
+    for i, value in enumerate(previous):
+        while j < m and current[j] < value:
+            j += 1
+        if j >= m or current[j] != value:
+            missing.append(i)
+    return missing
+
+
+class EASMRemovalTracker:
+    """
+    Detects assets that disappeared between two complete pulls.
+
+    track() records the id of every item going past (before delta mode
+    drops unchanged ones) as a uint64 hash, spooling the id text to disk.
+    When a pull completes, the hashes are sorted into a new snapshot,
+    diffed against the previous one (numpy searchsorted when available,
+    otherwise a merge walk) and each id that is gone is handed to
+    write_removed as a defender:easm:asset_removed tombstone.
+
+    Memory is 16 bytes per asset (hash and spool offset) plus about as
+    much again while the snapshot is written; ids are copied from the
+    spool to the snapshot one at a time, and snapshots are memory-mapped.
+    An interrupted pull keeps its spool, so the resumed pull adds to it
+    instead of mistaking the unvisited part for removals. An empty pull
+    leaves the previous snapshot in place and produces no tombstones. The
+    new snapshot replaces the old one through commit_after_events(), after
+    the tombstones are safe.
+
+    Disabled instances pass items straight through.
+    """
+
+    def __init__(
+        self,
+        key: Optional[str],
+        asset_type: str,
+        write_removed=None,
+        enabled: bool = True,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.enabled = enabled and bool(key) and write_removed is not None
+        self.key = key
+        self.asset_type = asset_type
+        self.write_removed = write_removed
+        self.logger = logger or get_logger("removals")
+        self.stats: Dict[str, Any] = {"ids": 0, "removed": 0}
+
+        self._lock = threading.Lock()
+        self._hashes = array.array("Q")
+        self._offsets = array.array("Q")
+        self._spool = None
+        self._spool_size = 0
+        if self.enabled:
+            self._open_spool()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(checkpoint_dir(), hashlib.sha256(self.key.encode("utf-8")).hexdigest() + ".ids")
+
+    def disable(self) -> None:
+        """
+        Turns tracking off before any item went past, for a pull that does
+        not list every asset (an incremental one). The snapshot, and the
+        spool of an interrupted complete pull, are left as they are.
+        """
+        if not self.enabled:
+            return
+        with active_batch_writers_lock:
+            commit_spools.discard(self)
+        with self._lock:
+            self._spool.close()
+            if not self._spool_size:
+                os.remove(self.path + ".spool")
+        self.enabled = False
+
+    def _open_spool(self) -> None:
+        spool_path = self.path + ".spool"
+        # Ids already spooled by an interrupted pull count towards this one
+        try:
+            with open(spool_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        pos = 0
+        while pos + _SPOOL_LEN.size <= len(data):
+            (size,) = _SPOOL_LEN.unpack_from(data, pos)
+            end = pos + _SPOOL_LEN.size + size
+            if end > len(data):
+                break
+            self._offsets.append(pos)
+            self._hashes.append(hash64(data[pos + _SPOOL_LEN.size:end]))
+            pos = end
+        if self._hashes:
+            self.logger.info(f"Resuming id snapshot for {self.asset_type}: {len(self._hashes)} ids from the last run")
+
+        self._spool = open(spool_path, "r+b" if data else "wb")
+        self._spool.truncate(pos)
+        self._spool.seek(pos)
+        self._spool_size = pos
+        with active_batch_writers_lock:
+            commit_spools.add(self)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._spool.closed:
+                self._spool.flush()
+
+    def track(self, items: Iterable[str]) -> Iterable[str]:
+        if not self.enabled:
+            yield from items
+            return
+
+        for raw in items:
+            item_id = raw_fields(raw, ("id",)).get("id")
+            if item_id is not None:
+                data = str(item_id).encode("utf-8")
+                with self._lock:
+                    self._offsets.append(self._spool_size)
+                    self._hashes.append(hash64(data))
+                    self._spool.write(_SPOOL_LEN.pack(len(data)) + data)
+                    self._spool_size += _SPOOL_LEN.size + len(data)
+            yield raw
+
+    def finish(self, complete: bool) -> None:
+        if not self.enabled:
+            return
+        with active_batch_writers_lock:
+            commit_spools.discard(self)
+        with self._lock:
+            self._spool.close()
+        if not complete:
+            self.logger.info(f"{self.asset_type} pull interrupted: {len(self._hashes)} ids kept for the next run")
+            return
+
+        started = time.monotonic()
+        path, spool_path = self.path, self.path + ".spool"
+        if not self._hashes and os.path.exists(path):
+            # An empty listing is far likelier an API or scope problem than
+            # every asset vanishing: keep the last snapshot to diff against
+            self.logger.warning(
+                f"{self.asset_type} pull returned no ids; keeping the previous snapshot, no assets treated as removed"
+            )
+            commit_after_events(lambda: os.path.exists(spool_path) and os.remove(spool_path))
+            return
+
+        unique, index = _sorted_unique(self._hashes)
+        self.stats["ids"] = len(unique)
+        now = time.time()
+
+        # New snapshot next to the old one; ids copied from the spool in
+        # hash order, one at a time: a first pass over the spool sizes
+        # them for the offsets table, the second copies them across
+        tmp = path + ".new"
+        with open(spool_path, "rb") as spool, open(tmp, "wb") as out:
+            spool_map = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) if self._spool_size else b""
+            # Spool records are back to back: record i ends where i + 1 starts
+            bounds = array.array("Q", self._offsets)
+            bounds.append(self._spool_size)
+            try:
+                offsets = array.array("Q", [0])
+                blob_len = 0
+                for i in index:
+                    blob_len += bounds[i + 1] - bounds[i] - _SPOOL_LEN.size
+                    offsets.append(blob_len)
+
+                hashes = array.array("Q", unique.tobytes()) if np is not None else unique
+                if sys.byteorder != "little":
+                    hashes = array.array("Q", hashes)
+                    hashes.byteswap()
+                    offsets.byteswap()
+                out.write(_IDS_HEADER.pack(_IDS_MAGIC, len(unique), blob_len, now))
+                out.write(hashes.tobytes())
+                out.write(offsets.tobytes())
+                del hashes, offsets
+
+                write, skip = out.write, _SPOOL_LEN.size
+                for i in index:
+                    write(spool_map[bounds[i] + skip:bounds[i + 1]])
+            finally:
+                if self._spool_size:
+                    spool_map.close()
+        del index, bounds
+
+        previous = EASMIdSnapshot(path)
+        try:
+            removed = _missing(previous.hashes, unique) if previous.n else []
+
+            removed_date = ms_iso_utc(now)
+            last_snapshot = ms_iso_utc(previous.taken) if previous.n else None
+            for i in removed:
+                self.write_removed(json.dumps({
+                    "id": previous.id_at(i),
+                    "assetType": self.asset_type,
+                    "state": "removed",
+                    "removedDate": removed_date,
+                    "lastSnapshotDate": last_snapshot,
+                }, separators=(",", ":")))
+            self.stats["removed"] = len(removed)
+        finally:
+            previous.close()
+
+        def commit():
+            get_state_store().flush()
+            os.replace(tmp, path)
+            try:
+                os.remove(spool_path)
+            except FileNotFoundError:
+                pass
+
+        commit_after_events(commit)
+        self.logger.info(
+            f"{self.asset_type} id snapshot: {len(unique)} ids, {self.stats['removed']} removed "
+            f"since {last_snapshot or 'first run'} ({time.monotonic() - started:.2f}s)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(complete=exc_type is None)
+
+
+def open_removal_tracker(
+    stanza: Dict[str, Any],
+    key: Optional[str],
+    asset_type: str,
+    write_removed=None,
+    logger: Optional[logging.Logger] = None,
+) -> EASMRemovalTracker:
+    """
+    Returns the stanza's removal tracker (track_removals, default false),
+    or a pass-through one when it is off or there is nowhere to write.
+    """
+    enabled = str(stanza.get("track_removals") or "false").strip().lower() in ("1", "true", "yes", "on")
+    return EASMRemovalTracker(key, asset_type, write_removed, enabled=enabled, logger=logger)
@@ -0,0 +1,811 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_runs.py
+
+Microsoft Defender EASM for Splunk App
+Run lifecycle.
+
+Includes:
+- Graceful SIGTERM / SIGINT shutdown that flushes events before checkpoints (EASMShutdown)
+- Per-stanza run-overlap lock and max_runtime budget (EASMRunGuard)
+- Per-run ingestion metrics with pre-aggregated latency histograms (EASMRunMetrics)
+- Opt-in per-run cProfile / tracemalloc profiles, rotated on disk (EASMRunProfiler)
+"""
+
+import os
+import json
+import time
+import cProfile
+import bisect
+import hashlib
+import io
+import logging
+import pstats
+import signal
+import sqlite3
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from defender_easm_config import checkpoint_dir, get_app_config, get_logger
+from defender_easm_state import EASMFileLock, current_run_metrics, get_state_store, run_local
+
+
+# ----------------------------
+# Graceful shutdown (SIGTERM / SIGINT)
+# ----------------------------
+
+# Worker threads still running a pull are given this long to save where
+# they are once the main thread has been told to stop
+SHUTDOWN_JOIN_SECONDS = 10.0
+
+_shutdown = threading.Event()
+
+
+class EASMShutdown(SystemExit):
+    """
+    Raised when splunkd stops the input (SIGTERM) or on Ctrl-C (SIGINT),
+    by check_shutdown() at the next item or page in whichever thread gets
+    there. with-blocks unwind as for any error, so resume points, delta
+    indexes and staged checkpoints are saved on the way out.
+    """
+
+
+class EASMBudgetExceeded(EASMShutdown):
+    """
+    Raised at the next item once a run's max_runtime is spent (see
+    EASMRunGuard). Unwinds like EASMShutdown; the guard then ends the run
+    cleanly and the next one carries on from the saved position.
+    """
+
+
+# time.monotonic() deadline of the run in progress (EASMRunGuard)
+_deadline: Optional[float] = None
+
+
+def _budget_spent() -> bool:
+    deadline = _deadline
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def shutdown_requested() -> bool:
+    return _shutdown.is_set() or _budget_spent()
+
+
+def check_shutdown() -> None:
+    """
+    Raises EASMShutdown once a stop was requested, or EASMBudgetExceeded
+    once the run's max_runtime is spent. Called at item and page
+    boundaries, in the main thread as in workers.
+    """
+    if _shutdown.is_set():
+        get_logger("shutdown").warning("Stop requested; saving progress and stopping")
+        raise EASMShutdown(0)
+    if _budget_spent():
+        raise EASMBudgetExceeded(0)
+
+
+def install_shutdown_handlers() -> None:
+    """
+    Turns SIGTERM / SIGINT into a stop request, acted on at the next
+    check_shutdown() (a second signal kills the process as usual). The
+    handler only sets a flag, so it never raises from inside whatever the
+    main thread was doing. No-op outside the main thread.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    def handle(signum, frame):
+        _shutdown.set()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, handle)
+
+
+# ----------------------------
+# Run guard (overlap lock, max_runtime)
+# ----------------------------
+
+class EASMRunGuard:
+    """
+    One run of one input stanza (namespace as in the run history).
+
+    Holds a non-blocking lock file in the checkpoint dir for the run, so
+    when splunkd launches a stanza again while its last run is still
+    going, the new launch does nothing: acquired is False, a "skipped"
+    run is recorded in the run history and, given metrics (see
+    open_run_guard()), written as a status=skipped defender:easm:metrics
+    run record, so overlaps are searchable. The lock goes away with the
+    process, so a crashed run never leaves it behind.
+
+    max_runtime (seconds, 0 = no limit) bounds the run: once spent,
+    resumable listings stop at their next item (EASMBudgetExceeded),
+    saving where they are on the way out, and the guard ends the run
+    cleanly. The next run continues from there, so a giant pull is
+    spread over several intervals instead of piling up.
+
+    While acquired, the guard is the calling thread's run: retries counts
+    what it has spent of the retry budget (EASMRateLimiter.take_retry),
+    across every thread of the run.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_runtime: float = 0,
+        logger: Optional[logging.Logger] = None,
+        metrics: Optional["EASMRunMetrics"] = None,
+    ):
+        self.namespace = namespace
+        self.max_runtime = max(0.0, float(max_runtime))
+        self.logger = logger or get_logger("runs")
+        self.metrics = metrics
+        self.acquired = False
+        self.budget_spent = False
+        self.retries = 0
+        self._outer: Optional["EASMRunGuard"] = None
+
+        name = hashlib.sha256(namespace.encode("utf-8")).hexdigest()
+        self._lock = EASMFileLock(os.path.join(checkpoint_dir(), name + ".run.lock"), blocking=False)
+        self._started = 0.0
+
+    def __enter__(self):
+        global _deadline
+        self._started = time.time()
+        self.acquired = self._lock.acquire()
+        if not self.acquired:
+            reason = "previous run still in progress"
+            self.logger.warning(f"{self.namespace}: {reason}; skipping this one")
+            try:
+                get_state_store().record_run(self.namespace, self._started, time.time(), "skipped", 0, reason)
+            except sqlite3.Error as exc:
+                self.logger.warning(f"Could not record run history: {exc}")
+            if self.metrics is not None:
+                self.metrics.emit("skipped", reason=reason)
+            return self
+
+        if self.max_runtime:
+            _deadline = time.monotonic() + self.max_runtime
+        self._outer = getattr(run_local, "guard", None)
+        run_local.guard = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _deadline
+        if not self.acquired:
+            return False
+        # Worker threads stop on the budget without it reaching this block
+        stopped = exc_type is not None and issubclass(exc_type, EASMBudgetExceeded)
+        self.budget_spent = stopped or (exc_type is None and _budget_spent())
+        _deadline = None
+        run_local.guard = self._outer
+        self._lock.release()
+        if self.budget_spent:
+            self.logger.info(
+                f"{self.namespace}: max_runtime ({self.max_runtime:.0f}s) reached after "
+                f"{time.time() - self._started:.0f}s; progress saved, the next run continues"
+            )
+        return stopped
+
+
+def open_run_guard(
+    stanza: Dict[str, Any],
+    namespace: str,
+    logger: Optional[logging.Logger] = None,
+    ew: Any = None,
+    stanza_name: Optional[str] = None,
+) -> EASMRunGuard:
+    """
+    EASMRunGuard with the stanza's max_runtime (seconds, default 0 = no
+    limit). With ew, a skipped launch is also written to ew as a run
+    metrics record (unless the stanza sets metrics = false).
+    """
+    max_runtime = stanza.get("max_runtime")
+    metrics = open_run_metrics(stanza, namespace, ew, stanza_name, logger) if ew is not None else None
+    return EASMRunGuard(
+        namespace,
+        max_runtime=float(max_runtime) if max_runtime not in (None, "") else 0,
+        logger=logger,
+        metrics=metrics if isinstance(metrics, EASMRunMetrics) else None,
+    )
+
+
+# ----------------------------
+# Run metrics (defender:easm:metrics)
+# ----------------------------
+
+METRICS_SOURCETYPE = "defender:easm:metrics"
+
+# Histogram bucket upper bounds in milliseconds (1-2-5 series); one more
+# bucket holds anything slower
+_HISTOGRAM_BOUNDS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 20000, 60000, 120000, 300000,
+)
+
+# Per-page records (metrics_pages = true) kept for one run at most
+MAX_PAGE_RECORDS = 10000
+
+
+def ms_iso_utc(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class EASMHistogram:
+    """
+    Fixed-bucket latency histogram. record() is one bisect and a few
+    adds, cheap enough to leave on; percentiles are read off the buckets
+    (the bucket's upper bound, capped at the slowest value seen).
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(_HISTOGRAM_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                bound = _HISTOGRAM_BOUNDS_MS[i] if i < len(_HISTOGRAM_BOUNDS_MS) else self.max
+                return min(float(bound), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        bounds = _HISTOGRAM_BOUNDS_MS
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 1),
+            "p90_ms": round(self.percentile(0.90), 1),
+            "p99_ms": round(self.percentile(0.99), 1),
+            "max_ms": round(self.max, 1),
+            # Non-empty buckets only, keyed by upper bound
+            "buckets": {
+                (str(bounds[i]) if i < len(bounds) else "+Inf"): n
+                for i, n in enumerate(self.counts) if n
+            },
+        }
+
+
+class EASMRunMetrics:
+    """
+    Counters and histograms for one run of one collector, written as a
+    defender:easm:metrics summary event (record=run) when the run ends,
+    plus one record=page event per page with pages=True.
+
+    Entering binds the metrics to the current thread. The HTTP client,
+    page decoders, token provider, event writers and checkpoint commits
+    report to whatever is bound there (current_run_metrics()); threads
+    started for the run (prefetcher, partition slices) inherit it through
+    run_context_bound().
+
+    Counters:
+      pages / items              pages listed, events written
+      bytes_received / _written  response bytes read, event bytes written
+      requests / retries         HTTP exchanges, and how many were retries
+      throttled                  429 responses
+      http_errors                transport failures and HTTP >= 400
+      checkpoints                checkpoint commits
+    Timings: request latency and checkpoint lag (time from the oldest
+    uncommitted event to its checkpoint commit) as histograms; seconds
+    spent fetching tokens, paced by the rate limiter, and blocked on the
+    event output (stdout or HEC backpressure).
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ew: Any = None,
+        stanza_name: Optional[str] = None,
+        index: Optional[str] = None,
+        pages: bool = False,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.namespace = namespace
+        self.stanza_name = stanza_name
+        self.index = index
+        self.logger = logger or get_logger("metrics")
+        self._ew = ew
+
+        self.started = time.time()
+        self.counters: Dict[str, int] = dict.fromkeys((
+            "pages", "items", "bytes_received", "bytes_written",
+            "requests", "retries", "throttled", "http_errors",
+            "checkpoints", "token_fetches",
+        ), 0)
+        self.seconds: Dict[str, float] = dict.fromkeys(("token_fetch", "rate_limited", "output_blocked"), 0.0)
+        self.latency = EASMHistogram()
+        self.checkpoint_lag = EASMHistogram()
+        self.page_records: Optional[list] = [] if pages else None
+        self.page_records_dropped = 0
+
+        self._pending_since: Optional[float] = None
+        self._previous = None
+        self._lock = threading.Lock()
+
+    # -------- reporting (any thread) --------
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def add_seconds(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] += seconds
+
+    def request(self, seconds: float, status: Optional[int]) -> None:
+        """
+        One HTTP exchange (status None: transport failure).
+        """
+        with self._lock:
+            self.counters["requests"] += 1
+            self.latency.record(seconds)
+            if status is None or status >= 400:
+                self.counters["http_errors"] += 1
+            if status == 429:
+                self.counters["throttled"] += 1
+
+    def wrote(self, nbytes: int) -> None:
+        """
+        One event written. Called under the event writer's own lock (one
+        writer per run), so it takes no lock of its own on the hot path.
+        """
+        counters = self.counters
+        counters["items"] += 1
+        counters["bytes_written"] += nbytes
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+
+    def page(self, path: str, items: int, nbytes: int, seconds: float, page_size: Optional[int]) -> None:
+        with self._lock:
+            self.counters["pages"] += 1
+            if self.page_records is None:
+                return
+            if len(self.page_records) >= MAX_PAGE_RECORDS:
+                self.page_records_dropped += 1
+                return
+            self.page_records.append((time.time(), path, items, nbytes, seconds, page_size))
+
+    def timed_commit(self, fn):
+        """
+        Wraps a checkpoint write so its commit records the lag behind the
+        oldest event it covers. Events written after this call count
+        towards the next checkpoint.
+        """
+        with self._lock:
+            since, self._pending_since = self._pending_since, None
+
+        def commit():
+            fn()
+            with self._lock:
+                self.counters["checkpoints"] += 1
+                if since is not None:
+                    self.checkpoint_lag.record(time.monotonic() - since)
+
+        return commit
+
+    # -------- run --------
+
+    def __enter__(self):
+        self._previous = getattr(run_local, "metrics", None)
+        run_local.metrics = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        run_local.metrics = self._previous
+        if self._ew is not None:
+            self.emit(run_status(exc_type))
+        return False
+
+    def summary(self, status: str, finished: Optional[float] = None, reason: Optional[str] = None) -> Dict[str, Any]:
+        finished = time.time() if finished is None else finished
+        duration = max(finished - self.started, 1e-6)
+        with self._lock:
+            counters = dict(self.counters)
+            record: Dict[str, Any] = {
+                "timestamp": ms_iso_utc(finished),
+                "record": "run",
+                "input": _namespace_input(self.namespace),
+                "stanza": self.stanza_name,
+                "status": status,
+                "started": ms_iso_utc(self.started),
+                "duration_s": round(duration, 3),
+                **counters,
+                "items_per_s": round(counters["items"] / duration, 1),
+                "bytes_received_per_s": round(counters["bytes_received"] / duration),
+                "request_latency": self.latency.summary(),
+                "checkpoint_lag": self.checkpoint_lag.summary(),
+                "token_fetch_s": round(self.seconds["token_fetch"], 3),
+                "rate_limited_s": round(self.seconds["rate_limited"], 3),
+                "output_blocked_s": round(self.seconds["output_blocked"], 3),
+                "pid": os.getpid(),
+            }
+            if self.page_records_dropped:
+                record["page_records_dropped"] = self.page_records_dropped
+            if reason:
+                record["reason"] = reason
+        return record
+
+    def emit(self, status: str, reason: Optional[str] = None) -> None:
+        """
+        Writes the run summary (and page records) to the run's event
+        writer. A failure here is logged, never raised over the run's own
+        outcome.
+        """
+        summary = self.summary(status, reason=reason)
+        meta = {"stanza": self.stanza_name, "sourcetype": METRICS_SOURCETYPE, "index": self.index}
+        try:
+            for ts, path, items, nbytes, seconds, page_size in self.page_records or ():
+                self._ew.write(json.dumps({
+                    "timestamp": ms_iso_utc(ts),
+                    "record": "page",
+                    "input": summary["input"],
+                    "stanza": self.stanza_name,
+                    "path": path,
+                    "items": items,
+                    "bytes": nbytes,
+                    "seconds": round(seconds, 4),
+                    "page_size": page_size,
+                }, separators=(",", ":")), **meta)
+            self._ew.write(json.dumps(summary, separators=(",", ":")), **meta)
+        except Exception as exc:
+            self.logger.warning(f"{self.namespace}: could not write run metrics: {exc}")
+
+
+def _namespace_input(namespace: str) -> str:
+    """
+    The input (asset type) part of a run namespace, APP::<input>::<stanza>.
+    """
+    parts = namespace.split("::")
+    return parts[1] if len(parts) > 2 else namespace
+
+
+def run_status(exc_type) -> str:
+    """
+    Run-history status for a run that ended with exc_type (None: ok).
+    """
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, EASMBudgetExceeded):
+        return "budget"
+    if issubclass(exc_type, EASMShutdown):
+        return "stopped"
+    return "error"
+
+
+def run_context_bound(fn):
+    """
+    Wraps fn, to run on another thread, so it reports to the calling
+    thread's run metrics, is covered by its run profiler and spends its
+    run's retry budget.
+    """
+    metrics = current_run_metrics()
+    profiler = getattr(run_local, "profiler", None)
+    guard = getattr(run_local, "guard", None)
+    if metrics is None and profiler is None and guard is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        previous = (
+            getattr(run_local, "metrics", None),
+            getattr(run_local, "profiler", None),
+            getattr(run_local, "guard", None),
+        )
+        run_local.metrics, run_local.profiler, run_local.guard = metrics, profiler, guard
+        try:
+            if profiler is None:
+                return fn(*args, **kwargs)
+            return profiler.call(fn, *args, **kwargs)
+        finally:
+            run_local.metrics, run_local.profiler, run_local.guard = previous
+
+    return bound
+
+
+def open_run_metrics(
+    stanza: Dict[str, Any],
+    namespace: str,
+    ew: Any,
+    stanza_name: Optional[str] = None,
+    logger: Optional[logging.Logger] = None,
+):
+    """
+    EASMRunMetrics for one run, written to ew when it ends, configured
+    from the stanza: metrics = false turns them off (a context that
+    yields None), metrics_pages = true adds per-page records.
+    """
+    if str(stanza.get("metrics") or "true").strip().lower() not in ("1", "true", "yes", "on"):
+        return nullcontext()
+    return EASMRunMetrics(
+        namespace,
+        ew=ew,
+        stanza_name=stanza_name,
+        index=stanza.get("index"),
+        pages=str(stanza.get("metrics_pages") or "false").strip().lower() in ("1", "true", "yes", "on"),
+        logger=logger,
+    )
+
+
+# ----------------------------
+# Run profiling (opt-in cProfile / tracemalloc)
+# ----------------------------
+
+# Profile files are kept in <checkpoint dir>/profiles: the newest
+# PROFILE_KEEP_FILES, within profile_max_mb (settings key) in total
+PROFILE_KEEP_FILES = 40
+DEFAULT_PROFILE_MAX_MB = 50
+
+# Functions / allocation sites named in the report and the summary event
+PROFILE_TOP = 15
+PROFILE_SUMMARY_TOP = 5
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _profiles_dir() -> str:
+    path = os.path.join(checkpoint_dir(), "profiles")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _function_label(key: Tuple[str, int, str]) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+class EASMRunProfiler:
+    """
+    Opt-in profile of one run: cProfile on the run's thread and on the
+    threads started for it (run_context_bound()), and tracemalloc.
+
+    When the run ends it writes, under <checkpoint dir>/profiles:
+      <input>_<stanza>_<time>_<pid>.pstats  merged cProfile data (pstats.Stats)
+      <input>_<stanza>_<time>_<pid>.txt     top functions by self and
+                                            cumulative time, top allocation sites
+    trims the directory to PROFILE_KEEP_FILES / max_bytes (oldest first),
+    and writes a record=profile event to defender:easm:metrics naming the
+    hottest functions.
+
+    tracemalloc is process-wide: when several runs share a process
+    (all_assets) the allocation sites cover all of them. Where only one
+    cProfile profiler may be active per process (Python 3.12+), runs
+    started while another is profiling go without call timings.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ew: Any = None,
+        stanza_name: Optional[str] = None,
+        index: Optional[str] = None,
+        max_bytes: int = DEFAULT_PROFILE_MAX_MB * 1024 * 1024,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.namespace = namespace
+        self.stanza_name = stanza_name
+        self.index = index
+        self.max_bytes = max_bytes
+        self.logger = logger or get_logger("profile")
+        self._ew = ew
+
+        self.started = 0.0
+        self._main: Optional[cProfile.Profile] = None
+        self._profiles: list = []
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def _enable(self, profile: "cProfile.Profile") -> bool:
+        try:
+            profile.enable()
+            return True
+        except ValueError as exc:
+            # Another profiler already owns the interpreter's hook
+            self.logger.debug(f"{self.namespace}: thread not profiled: {exc}")
+            return False
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs fn on the current (worker) thread under its own cProfile,
+        merged into the run's profile when the thread is done.
+        """
+        profile = cProfile.Profile()
+        if not self._enable(profile):
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def __enter__(self):
+        global _tracemalloc_users
+        self.started = time.time()
+        with _tracemalloc_lock:
+            if not _tracemalloc_users and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _tracemalloc_users += 1
+
+        self._previous = getattr(run_local, "profiler", None)
+        run_local.profiler = self
+        profile = cProfile.Profile()
+        if self._enable(profile):
+            self._main = profile
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _tracemalloc_users
+        if self._main is not None:
+            self._main.disable()
+        run_local.profiler = self._previous
+
+        with _tracemalloc_lock:
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            peak = tracemalloc.get_traced_memory()[1] if snapshot is not None else 0
+            _tracemalloc_users -= 1
+            if not _tracemalloc_users and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+        try:
+            self._report(run_status(exc_type), snapshot, peak)
+        except Exception as exc:
+            # A profile is a diagnostic; it never fails the run
+            self.logger.warning(f"{self.namespace}: could not write profile: {exc}")
+        return False
+
+    def _stats(self) -> Optional[pstats.Stats]:
+        stats = None
+        with self._lock:
+            profiles = ([self._main] if self._main is not None else []) + self._profiles
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                stats.add(profile)
+        return stats
+
+    def _report(self, status: str, snapshot, peak: int) -> None:
+        finished = time.time()
+        input_name = _namespace_input(self.namespace)
+        stanza = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in (self.stanza_name or ""))
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(self.started))
+        base = os.path.join(_profiles_dir(), f"{input_name}_{stanza}_{stamp}_{os.getpid()}")
+
+        stats = self._stats()
+        allocations = snapshot.statistics("lineno")[:PROFILE_TOP] if snapshot is not None else []
+
+        report = io.StringIO()
+        report.write(f"{self.namespace}: {status}, {finished - self.started:.3f}s, "
+                     f"traced peak {peak / 1024:.0f} KiB\n\n")
+        hot = []
+        if stats is not None:
+            stats.dump_stats(base + ".pstats")
+            stats.stream = report
+            report.write("Top functions by self time\n")
+            stats.sort_stats("tottime").print_stats(PROFILE_TOP)
+            report.write("Top functions by cumulative time\n")
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            by_self = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)
+            hot = [
+                {
+                    "function": _function_label(key),
+                    "calls": calls,
+                    "self_s": round(tottime, 4),
+                    "cumulative_s": round(cumtime, 4),
+                }
+                for key, (_, calls, tottime, cumtime, _) in by_self[:PROFILE_SUMMARY_TOP]
+            ]
+        report.write("Top allocation sites (live at end of run)\n")
+        for stat in allocations:
+            report.write(f"  {stat}\n")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+
+        self._rotate()
+
+        if self._ew is None:
+            return
+        event = {
+            "timestamp": ms_iso_utc(finished),
+            "record": "profile",
+            "input": input_name,
+            "stanza": self.stanza_name,
+            "status": status,
+            "duration_s": round(finished - self.started, 3),
+            "top_functions": hot,
+            "top_allocations": [
+                {
+                    "site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "kib": round(stat.size / 1024, 1),
+                    "blocks": stat.count,
+                }
+                for stat in allocations[:PROFILE_SUMMARY_TOP]
+            ],
+            "traced_peak_kib": round(peak / 1024),
+            "pstats_file": base + ".pstats" if stats is not None else None,
+            "report_file": base + ".txt",
+        }
+        self._ew.write(
+            json.dumps(event, separators=(",", ":")),
+            stanza=self.stanza_name,
+            sourcetype=METRICS_SOURCETYPE,
+            index=self.index,
+        )
+
+    def _rotate(self) -> None:
+        directory = _profiles_dir()
+        entries = []
+        for name in os.listdir(directory):
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        kept_bytes = 0
+        for i, (_, size, name) in enumerate(sorted(entries, reverse=True)):
+            kept_bytes += size
+            if i < PROFILE_KEEP_FILES and kept_bytes <= self.max_bytes:
+                continue
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def open_run_profiler(
+    stanza: Dict[str, Any],
+    namespace: str,
+    ew: Any,
+    stanza_name: Optional[str] = None,
+    session_key: Optional[str] = None,
+    logger: Optional[logging.Logger] = None,
+):
+    """
+    EASMRunProfiler when profiling is on for this run, else a context
+    that yields None. It is on when the stanza sets profile = true, or
+    the settings key profile_inputs lists the input (asset type, e.g.
+    "hosts,domains") or "all". profile_max_mb (settings) caps the disk
+    used by kept profiles.
+    """
+    cfg = get_app_config(session_key) if session_key else {}
+    enabled = str(stanza.get("profile") or "false").strip().lower() in ("1", "true", "yes", "on")
+    if not enabled:
+        listed = {name.strip().lower() for name in (cfg.get("profile_inputs") or "").split(",")}
+        enabled = "all" in listed or _namespace_input(namespace).lower() in listed
+    if not enabled:
+        return nullcontext()
+    return EASMRunProfiler(
+        namespace,
+        ew=ew,
+        stanza_name=stanza_name,
+        index=stanza.get("index"),
+        max_bytes=int(float(cfg.get("profile_max_mb") or DEFAULT_PROFILE_MAX_MB) * 1024 * 1024),
+        logger=logger,
+    )
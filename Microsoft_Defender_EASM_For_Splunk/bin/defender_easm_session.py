@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_session.py
+
+Microsoft Defender EASM for Splunk App
+Pooled HTTP session.
+
+Includes:
+- Per-process keep-alive session shared by every request (get_http_session)
+- nextLink resolution against the workspace base URL
+"""
+
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ----------------------------
+# HTTP engine (pooled keep-alive session)
+# ----------------------------
+
+DEFAULT_API_VERSION = "2024-10-01-preview"
+
+# Connections kept alive per host; sized for the concurrent collectors
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 60
+
+_http_session: Optional[requests.Session] = None
+_http_pool_size = 0
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Returns the per-process keep-alive session.
+
+    Every request in the process shares one connection pool, so paging
+    reuses the TCP+TLS connection instead of handshaking per page.
+    Asking for a larger pool than the current one re-mounts the adapter.
+    """
+    global _http_session, _http_pool_size
+
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+
+        if pool_size > _http_pool_size:
+            # pool_block: wait for a free connection rather than opening
+            # (and then discarding) throwaway ones above the pool size
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=pool_size,
+                pool_block=True,
+                max_retries=0,
+            )
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+            _http_pool_size = pool_size
+
+        return _http_session
+
+
+def resolve_next_link(base_url: str, link: Optional[str]) -> Optional[str]:
+    """
+    Resolves a path or nextLink against the workspace base URL.
+
+    - absolute links (https://...) are used as-is
+    - host-relative links that already carry the base path are re-rooted on the host
+    - anything else is treated as relative to the base URL
+    """
+    if not link:
+        return None
+
+    if link.startswith(("https://", "http://")):
+        return link
+
+    parts = urlsplit(base_url)
+    base_path = parts.path.rstrip("/")
+    if base_path and link.startswith(base_path + "/"):
+        return f"{parts.scheme}://{parts.netloc}{link}"
+
+    return f"{base_url.rstrip('/')}/{link.lstrip('/')}"
@@ -10,6 +10,8 @@
 import splunk.admin as admin
 import splunk.entity as entity
 
+from defender_easm_common import invalidate_config_cache
+
 APP_NAME = "Microsoft_Defender_EASM_For_Splunk"
 CONF_FILE = "defender_easm"
 
@@ -32,9 +34,16 @@ class DefenderEASMSetupHandler(admin.MConfigHandler):
                 "use_proxy",
                 "proxy_url",
                 "proxy_username",
+                "output_mode",
+                "hec_url",
+                "hec_verify_ssl",
+                "hec_ack",
+                "profile_inputs",
+                "profile_max_mb",
                 # secrets handled separately
                 "client_secret",
                 "proxy_password",
+                "hec_token",
             ]:
                 self.supportedArgs.addOptArg(arg)
 
@@ -47,6 +56,16 @@ class DefenderEASMSetupHandler(admin.MConfigHandler):
     def handleEdit(self, confInfo):
         self._save()
 
+    ############################################
+    # RELOAD (drop memoized config in inputs)
+    ############################################
+    def handleReload(self, confInfo):
+        """
+        POST /defender_easm/setup/reload
+        """
+        invalidate_config_cache()
+        confInfo["result"].append("status", "reloaded")
+
     ############################################
     # LIST (populate setup UI)
     ############################################
@@ -64,6 +83,7 @@ class DefenderEASMSetupHandler(admin.MConfigHandler):
         # Do NOT expose secrets
         confInfo["setup"]["client_secret"] = "********"
         confInfo["setup"]["proxy_password"] = "********"
+        confInfo["setup"]["hec_token"] = "********"
 
     ############################################
     # INTERNAL SAVE LOGIC
@@ -83,7 +103,7 @@ class DefenderEASMSetupHandler(admin.MConfigHandler):
 
         # Save non-secret fields
         for key, value in self.callerArgs.items():
-            if key in ("client_secret", "proxy_password"):
+            if key in ("client_secret", "proxy_password", "hec_token"):
                 continue
             conf[key] = value[0]
 
@@ -92,6 +112,10 @@ class DefenderEASMSetupHandler(admin.MConfigHandler):
         # Save secrets securely
         self._store_secret("client_secret", sessionKey)
         self._store_secret("proxy_password", sessionKey)
+        self._store_secret("hec_token", sessionKey)
+
+        # Running inputs pick up the new values on their next config read
+        invalidate_config_cache()
 
     ############################################
     # SECURE CREDENTIAL STORAGE
@@ -9,34 +9,85 @@ Modular Input: SSL Certificates
 
 - Uses Defender EASM data-plane API
 - OAuth2 client-credentials (via defender_easm_common.py)
-- Paginates using nextLink (checkpointed)
+- Paginates using nextLink (items streamed off each page; checkpointed
+  down to the item, so an interrupted run resumes where it stopped)
 - Writes raw JSON events (one per object) to Splunk
 
 Sourcetype (recommended): defender:easm:ssl_certificate
 Input stanza name in inputs.conf: [defender_easm_ssl_certificates]
+
+DefenderEASMSslCertificatesCollector runs the same pull as an asset type
+of the all_assets input, on the same checkpoint key scheme and index.
 """
 
-import json
-import time
+import sys
 from typing import Any, Dict, Iterable, Optional, Tuple
 
-import requests
-
-from splunklib.modularinput import Script, EventWriter, Event
+from splunklib.modularinput import Script, EventWriter
 
 from defender_easm_common import (
     APP_NAME,
-    get_access_token,
-    get_headers,
+    EASMAPIClient,
+    EASMModularInput,
+    EASMResumableListing,
+    EASMTokenProvider,
     get_easm_base_url,
     get_proxy_config,
-    get_checkpoint,
-    save_checkpoint,
+    get_rate_limiter,
+    install_shutdown_handlers,
+    open_event_writer,
+    open_resumable_listing,
+    open_run_guard,
+    open_run_metrics,
+    open_run_profiler,
 )
 
 # API version: keep configurable if needed later
 DEFAULT_API_VERSION = "2024-10-01-preview"
 
+# Data-plane list for SSL certificates
+# Convention matches other assets collections: /sslCertificates
+API_PATH = f"/sslCertificates?api-version={DEFAULT_API_VERSION}"
+
+SOURCETYPE = "defender:easm:ssl_certificate"
+DEFAULT_INDEX = "security_defender_easm"
+
+
+def checkpoint_key(stanza_name: str) -> str:
+    """
+    Resume point of the listing for one input stanza; kept apart from
+    the stanza's run namespace, which the run guard and metrics use.
+    """
+    return f"{APP_NAME}::ssl_certificates::{stanza_name}::nextlink"
+
+
+def extract_items(page: Iterable[str]) -> Iterable[str]:
+    """
+    Defender EASM list payloads are typically { "value": [ ... ], "nextLink": "..." }.
+    Items arrive as raw JSON text; only objects are kept.
+    """
+    for raw in page:
+        if raw.startswith("{"):
+            yield raw
+
+
+class DefenderEASMSslCertificatesCollector(EASMModularInput):
+    """
+    SSL certificates as an asset type of the all_assets input.
+    """
+
+    def event_index(self):
+        return self.stanza.get("index", DEFAULT_INDEX)
+
+    def collect(self):
+        sourcetype = self.stanza.get("sourcetype", self.sourcetype)
+        with open_resumable_listing(
+            self.api, self.stanza, checkpoint_key(self.stanza_name), f"{self.api.base_url}{API_PATH}", raw=True
+        ) as listing:
+            for page in listing.pages():
+                for raw in extract_items(page):
+                    self.write_event(data=raw, sourcetype=sourcetype)
+
 
 class DefenderEASMSslCertificates(Script):
     def get_scheme(self):
@@ -47,86 +98,69 @@ class DefenderEASMSslCertificates(Script):
         return scheme
 
     def _build_first_url(self, session_key: str) -> str:
-        base = get_easm_base_url(session_key)
-        # Data-plane list for SSL certificates
-        # Convention matches other assets collections: /sslCertificates
-        return f"{base}/sslCertificates?api-version={DEFAULT_API_VERSION}"
+        return f"{get_easm_base_url(session_key)}{API_PATH}"
 
-    def _iter_pages(
+    def _open_listing(
         self,
         session_key: str,
         start_url: str,
-        checkpoint_key: str,
+        stanza: Dict[str, Any],
+        key: str,
         timeout: int = 120,
-    ) -> Iterable[Tuple[str, Dict[str, Any]]]:
-        """
-        Yields (url, json_payload) for each page.
-        Uses nextLink when present.
+    ) -> EASMResumableListing:
         """
-        proxies = get_proxy_config(session_key)
-        token = get_access_token(session_key)
-        headers = get_headers(token)
-
-        # Resume from checkpoint if present
-        resume_url = get_checkpoint(checkpoint_key)
-        url = resume_url if resume_url else start_url
-
-        while url:
-            resp = requests.get(url, headers=headers, proxies=proxies, timeout=timeout)
-            resp.raise_for_status()
-            payload = resp.json()
-
-            yield url, payload
-
-            # Prefer common patterns
-            next_link = payload.get("nextLink") or payload.get("@odata.nextLink")
-            if next_link:
-                save_checkpoint(checkpoint_key, next_link)
-                url = next_link
-            else:
-                save_checkpoint(checkpoint_key, None)
-                url = None
-
-    def _extract_items(self, payload: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        Returns the listing from start_url, or from where the last run
+        stopped; listing.pages() yields one page per nextLink and
+        iterating a page streams its items.
         """
-        Defender EASM list payloads are typically { "value": [ ... ], "nextLink": "..." }.
-        """
-        items = payload.get("value")
-        if isinstance(items, list):
-            for obj in items:
-                if isinstance(obj, dict):
-                    yield obj
-
-    def stream_events(self, inputs, ew: EventWriter):
-        # Splunk passes session key in inputs.metadata
-        session_key = inputs.metadata.get("session_key")
-        if not session_key:
-            raise RuntimeError("Missing Splunk session_key in modular input metadata.")
-
-        # Only run enabled stanzas
-        for stanza_name, stanza in inputs.inputs.items():
-            if stanza_name != "defender_easm_ssl_certificates":
-                continue
-
-            index = stanza.get("index", "security_defender_easm")
-            sourcetype = stanza.get("sourcetype", "defender:easm:ssl_certificate")
+        # Token is refreshed transparently on 401 mid-pagination
+        api = EASMAPIClient(
+            base_url=get_easm_base_url(session_key),
+            token_provider=EASMTokenProvider(session_key),
+            proxies=get_proxy_config(session_key),
+            rate_limiter=get_rate_limiter(session_key),
+            timeout=timeout,
+        )
 
-            checkpoint_key = f"{APP_NAME}::ssl_certificates::{stanza_name}"
-            first_url = self._build_first_url(session_key)
+        return open_resumable_listing(api, stanza, key, start_url, raw=True)
 
-            for _, page in self._iter_pages(session_key, first_url, checkpoint_key):
-                for obj in self._extract_items(page):
-                    # Preserve raw payload; add light metadata fields only if absent
-                    raw = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
-
-                    ew.write_event(
-                        Event(
-                            data=raw,
-                            sourcetype=sourcetype,
-                            index=index,
-                        )
-                    )
+    def stream_events(self, inputs, ew: EventWriter):
+        # A stop from splunkd saves progress instead of killing the run
+        install_shutdown_handlers()
+        # Batched <stream> output on stdout, or HEC when output_mode = hec
+        with open_event_writer(ew, inputs.metadata["session_key"]) as ew:
+            # Splunk passes session key in inputs.metadata
+            session_key = inputs.metadata.get("session_key")
+            if not session_key:
+                raise RuntimeError("Missing Splunk session_key in modular input metadata.")
+
+            # Only run enabled stanzas
+            for stanza_name, stanza in inputs.inputs.items():
+                if stanza_name != "defender_easm_ssl_certificates":
+                    continue
+
+                index = stanza.get("index", DEFAULT_INDEX)
+                sourcetype = stanza.get("sourcetype", SOURCETYPE)
+
+                namespace = f"{APP_NAME}::ssl_certificates::{stanza_name}"
+                key = checkpoint_key(stanza_name)
+                first_url = self._build_first_url(session_key)
+
+                # Skips while the last run of this stanza is still going
+                with open_run_guard(stanza or {}, namespace, ew=ew, stanza_name=stanza_name) as guard:
+                    if not guard.acquired:
+                        continue
+
+                    # Run summary goes to defender:easm:metrics;
+                    # profile = true also profiles the run
+                    with open_run_profiler(stanza or {}, namespace, ew, stanza_name, session_key), \
+                            open_run_metrics(stanza or {}, namespace, ew, stanza_name), \
+                            self._open_listing(session_key, first_url, stanza or {}, key) as listing:
+                        for page in listing.pages():
+                            for raw in extract_items(page):
+                                # Raw payload exactly as returned by the API
+                                ew.write(raw, sourcetype=sourcetype, index=index)
 
 
 if __name__ == "__main__":
-    DefenderEASMSslCertificates().run()
+    sys.exit(DefenderEASMSslCertificates().run(sys.argv))
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bin/defender_easm_state.py
+
+Microsoft Defender EASM for Splunk App
+Checkpoints and run history.
+
+Includes:
+- Cross-process file lock (EASMFileLock)
+- Transactional checkpoint / tuning / run-history store in SQLite WAL mode (EASMStateStore)
+- Checkpoint commits deferred until the events they cover are written (commit_after_events)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import atexit
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from defender_easm_config import checkpoint_dir, get_logger
+
+if TYPE_CHECKING:
+    from defender_easm_runs import EASMRunMetrics
+
+
+# ----------------------------
+# Cross-process file lock
+# ----------------------------
+
+class EASMFileLock:
+    """
+    Exclusive advisory lock on a file, shared by all modular input processes.
+    fcntl on POSIX, msvcrt on Windows forwarders.
+    """
+
+    def __init__(self, path: str, blocking: bool = True):
+        self.path = path
+        self.blocking = blocking
+        self._fh = None
+
+    def acquire(self) -> bool:
+        self._fh = open(self.path, "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._fh.seek(0)
+                mode = msvcrt.LK_LOCK if self.blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(self._fh.fileno(), mode, 1)
+            else:
+                import fcntl
+                flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(self._fh.fileno(), flags)
+            return True
+        except OSError:
+            self._fh.close()
+            self._fh = None
+            if self.blocking:
+                raise
+            return False
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# ----------------------------
+# Checkpointing (SQLite state store)
+# ----------------------------
+
+STATE_DB_NAME = "state.db"
+STATE_SCHEMA_VERSION = 1
+
+# Checkpoint writes are grouped into one transaction once this many are
+# pending or the oldest has waited this long (and on flush() / exit)
+STATE_COMMIT_WRITES = 256
+STATE_COMMIT_SECONDS = 0.5
+
+# Other processes hold the write lock for microseconds; wait rather than fail
+STATE_BUSY_TIMEOUT = 30.0
+
+# Run history rows kept per stanza
+STATE_RUN_HISTORY = 200
+
+_STATE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        namespace TEXT NOT NULL,
+        name      TEXT NOT NULL,
+        value     TEXT NOT NULL,
+        updated   REAL NOT NULL,
+        PRIMARY KEY (namespace, name)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS tuning (
+        endpoint TEXT PRIMARY KEY,
+        value    TEXT NOT NULL,
+        updated  REAL NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS runs (
+        id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        namespace TEXT NOT NULL,
+        started   REAL NOT NULL,
+        finished  REAL NOT NULL,
+        status    TEXT NOT NULL,
+        events    INTEGER NOT NULL,
+        detail    TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS runs_by_namespace ON runs (namespace, id)",
+)
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    # "<APP>::<asset>::<stanza>::<name>" -> ("<APP>::<asset>::<stanza>", "<name>")
+    namespace, sep, name = key.rpartition("::")
+    return (namespace, name) if sep else ("", key)
+
+
+def legacy_checkpoint_path(key: str) -> str:
+    # Before the state store: one {"value": ..., "updated": ...} file per key
+    h = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(checkpoint_dir(), f"{h}.json")
+
+
+def read_legacy_checkpoint(key: str) -> Optional[str]:
+    path = legacy_checkpoint_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("value") or None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class EASMStateStore:
+    """
+    The app's persistent state: one SQLite database (state.db) in the
+    checkpoint directory, shared by every modular input process.
+
+    Responsibilities:
+    - Cursor / watermark / plan checkpoints, namespaced per stanza
+      ("<APP>::<asset>::<stanza>" + name)
+    - Learned tuning per endpoint (adaptive page size and in-flight limit)
+    - Run history per stanza (start, finish, status, events)
+    - Import of pre-store JSON checkpoint files on first read
+
+    Design constraints:
+    - WAL journal, synchronous = NORMAL: a commit appends to the log
+      without an fsync and readers never block the writer; a crash loses
+      at most the last group of writes, never half a value
+    - Checkpoint writes are grouped (STATE_COMMIT_WRITES /
+      STATE_COMMIT_SECONDS); values passed to one set_many() always land
+      in the same transaction. A timer commits a group that no later
+      write comes to close, so an idle checkpoint is on disk within
+      STATE_COMMIT_SECONDS
+    - One connection per process behind a lock, shared by collector and
+      HEC delivery threads; other processes wait on the busy timeout
+    """
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.logger = logger or get_logger("state")
+        self.stats: Dict[str, int] = {"writes": 0, "commits": 0, "migrated": 0}
+
+        self._lock = threading.RLock()
+        # key -> (value, updated), or None to delete
+        self._pending: Dict[str, Optional[Tuple[str, float]]] = {}
+        self._pending_since = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._conn = self._connect()
+
+    def _connect(self) -> "sqlite3.Connection":
+        conn = sqlite3.connect(
+            self.path, timeout=STATE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < STATE_SCHEMA_VERSION:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in _STATE_SCHEMA:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {STATE_SCHEMA_VERSION}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                conn.close()
+                raise
+            conn.execute("COMMIT")
+        return conn
+
+    def _transaction(self, fn) -> Any:
+        """
+        Runs fn(conn) in one write transaction (BEGIN IMMEDIATE takes the
+        database write lock up front, so it cannot fail half way on a
+        lock upgrade).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self.stats["commits"] += 1
+            return result
+
+    # -------- checkpoints --------
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._pending:
+                entry = self._pending[key]
+                return entry[0] if entry else None
+            row = self._conn.execute(
+                "SELECT value FROM checkpoints WHERE namespace = ? AND name = ?", _split_key(key)
+            ).fetchone()
+        if row:
+            return row[0]
+
+        legacy = read_legacy_checkpoint(key)
+        if legacy:
+            self.set_many({key: legacy})
+            self.flush()
+            os.remove(legacy_checkpoint_path(key))
+            self.stats["migrated"] += 1
+            self.logger.info(f"Moved checkpoint {key} into {STATE_DB_NAME}")
+        return legacy
+
+    def set(self, key: str, value: Optional[str]) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[str, Optional[str]]) -> None:
+        """
+        Stages checkpoint values (None / empty clears one); they commit
+        together with the rest of the current group.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+                self._schedule_flush()
+            for key, value in values.items():
+                self._pending[key] = (value, now) if value else None
+            self.stats["writes"] += len(values)
+            if len(self._pending) >= STATE_COMMIT_WRITES or time.monotonic() - self._pending_since >= STATE_COMMIT_SECONDS:
+                self.flush()
+
+    def _schedule_flush(self) -> None:
+        # Caller holds self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(STATE_COMMIT_SECONDS, self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_due(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            except Exception as exc:
+                # Still staged: tried again by the next write or timer
+                self.logger.warning(f"Could not commit staged checkpoints: {exc}")
+                self._schedule_flush()
+
+    def flush(self) -> None:
+        """
+        Commits the staged checkpoint values in one transaction.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            upserts = [(*_split_key(k), v[0], v[1]) for k, v in pending.items() if v]
+            deletes = [_split_key(k) for k, v in pending.items() if not v]
+
+            def apply(conn):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints (namespace, name, value, updated) VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+                conn.executemany("DELETE FROM checkpoints WHERE namespace = ? AND name = ?", deletes)
+
+            # On failure the values stay staged for the next flush
+            self._transaction(apply)
+            self._pending = {}
+
+        # A cleared key must not come back from a file left by an older version
+        for key, entry in pending.items():
+            if entry is None:
+                try:
+                    os.remove(legacy_checkpoint_path(key))
+                except FileNotFoundError:
+                    pass
+
+    # -------- tuning --------
+
+    def get_tuning(self, endpoint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM tuning WHERE endpoint = ?", (endpoint,)).fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def set_tuning(self, endpoint: str, value: Dict[str, Any]) -> None:
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO tuning (endpoint, value, updated) VALUES (?, ?, ?)",
+            (endpoint, json.dumps(value, separators=(",", ":")), time.time()),
+        ))
+
+    # -------- run history --------
+
+    def record_run(
+        self,
+        namespace: str,
+        started: float,
+        finished: float,
+        status: str,
+        events: int,
+        detail: Optional[str] = None,
+    ) -> None:
+        def insert(conn):
+            conn.execute(
+                "INSERT INTO runs (namespace, started, finished, status, events, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, started, finished, status, events, detail),
+            )
+            conn.execute(
+                "DELETE FROM runs WHERE namespace = ? AND id <= "
+                "(SELECT id FROM runs WHERE namespace = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (namespace, namespace, STATE_RUN_HISTORY),
+            )
+
+        self._transaction(insert)
+
+    def runs(self, namespace: str, limit: int = 20) -> list:
+        """
+        Most recent runs of a stanza, newest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT started, finished, status, events, detail FROM runs "
+                "WHERE namespace = ? ORDER BY id DESC LIMIT ?",
+                (namespace, limit),
+            ).fetchall()
+        return [
+            {"started": r[0], "finished": r[1], "status": r[2], "events": r[3], "detail": r[4]}
+            for r in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+
+_state_store: Optional[EASMStateStore] = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store() -> EASMStateStore:
+    """
+    Returns this process's handle on state.db, opening it on first use.
+    Staged checkpoints are committed at interpreter exit.
+    """
+    global _state_store
+
+    path = os.path.join(checkpoint_dir(), STATE_DB_NAME)
+    with _state_store_lock:
+        if _state_store is None or _state_store.path != path:
+            if _state_store is not None:
+                _state_store.close()
+            else:
+                atexit.register(close_state_store)
+            _state_store = EASMStateStore(path)
+        return _state_store
+
+
+def close_state_store() -> None:
+    """
+    Commits staged checkpoints and closes the store (safe to call twice).
+    """
+    global _state_store
+
+    with _state_store_lock:
+        store, _state_store = _state_store, None
+    if store is not None:
+        store.close()
+
+
+def get_checkpoint(key: str) -> Optional[str]:
+    """
+    Returns stored checkpoint string (e.g., nextLink) or None.
+    """
+    return get_state_store().get(key)
+
+
+def save_checkpoint(key: str, value: Optional[str]) -> None:
+    """
+    Saves checkpoint string. If value is None/empty, clears checkpoint.
+    Written through commit_after_events(), so it never runs ahead of the
+    events written before it.
+    """
+    commit_after_events(lambda: get_state_store().set(key, value))
+
+
+def save_checkpoints(values: Dict[str, Optional[str]]) -> None:
+    """
+    save_checkpoint() for several keys at once (e.g. a watermark and the
+    cursor that goes with it): they are committed in one transaction.
+    """
+    values = dict(values)
+    commit_after_events(lambda: get_state_store().set_many(values))
+
+
+# Batch writers with unflushed events; save_checkpoint() flushes them
+# (or defers to their commit_after()) so a checkpoint never runs ahead
+# of the events it covers.
+active_batch_writers: "set" = set()
+active_batch_writers_lock = threading.Lock()
+
+# Open files (removal-tracker id spools) flushed before any checkpoint
+# commit, so a resume point never covers ids still in a Python buffer
+commit_spools: "set" = set()
+
+# Run metrics / profiler of the run a thread is working for
+run_local = threading.local()
+
+
+def current_run_metrics() -> Optional["EASMRunMetrics"]:
+    return getattr(run_local, "metrics", None)
+
+
+def commit_after_events(fn) -> None:
+    """
+    Runs fn() (a checkpoint-style write) once the events written so far
+    are safe: stdout batches are flushed first, and HEC writers run it
+    only once those events are delivered (indexer-acknowledged with
+    hec_ack), without blocking here.
+    """
+    metrics = current_run_metrics()
+    if metrics is not None:
+        fn = metrics.timed_commit(fn)
+
+    with active_batch_writers_lock:
+        writers = list(active_batch_writers)
+        spools = list(commit_spools)
+
+    # Side files the checkpoint vouches for reach the OS first
+    for spool in spools:
+        spool.flush()
+
+    deferring = []
+    for writer in writers:
+        if hasattr(writer, "commit_after"):
+            deferring.append(writer)
+        else:
+            writer.flush()
+
+    if not deferring:
+        fn()
+        return
+
+    # Normally one writer per process; with several, the last one to
+    # confirm delivery runs fn
+    remaining = [len(deferring)]
+    remaining_lock = threading.Lock()
+
+    def commit():
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        fn()
+
+    for writer in deferring:
+        writer.commit_after(commit)
@@ -31,15 +31,11 @@ class DefenderEASMTasks(EASMModularInput):
         if last_checkpoint:
             params["$filter"] = f"properties.lastUpdatedDateTime gt {last_checkpoint}"
 
-        next_url = API_PATH
         newest_timestamp = last_checkpoint
         total = 0
 
-        while next_url:
-            response = self.api.get(next_url, params=params)
+        for response in self.api.iter_pages(API_PATH, params=params):
             records = response.get("value", [])
-            next_url = response.get("nextLink")
-            params = None
 
             for record in records:
                 self.write_event(json.dumps(record), sourcetype=SOURCETYPE)
@@ -15,7 +15,8 @@ Responsibilities:
 - Handle pagination via nextLink
 - Respect proxy configuration
 - Write raw JSON events to Splunk
-- Maintain checkpoint state
+- Maintain checkpoint state (watermark, plus an item-level resume point
+  while a pull is in progress)
 
 Design constraints:
 - No enrichment
@@ -33,6 +34,7 @@ from defender_easm_common import (
     EASMModularInput,
     EASMCheckpoint,
     EASMAPIError,
+    open_resumable_listing,
 )
 
 
@@ -65,41 +67,49 @@ class DefenderEASMWhoisContacts(EASMModularInput):
         if last_checkpoint:
             params["$filter"] = f"properties.lastSeenDateTime gt {last_checkpoint}"
 
-        next_url = "/assets"
-
         event_count = 0
-        newest_timestamp = last_checkpoint
-
-        while next_url:
-            response = self.api.get(next_url, params=params)
 
-            assets = response.get("value", [])
-            next_url = response.get("nextLink")
-            params = None  # nextLink already contains params
-
-            for asset in assets:
-                self.write_event(
-                    data=json.dumps(asset),
-                    sourcetype=SOURCETYPE
+        # Resumes at the next unwritten item (with the newest timestamp
+        # seen so far) if the last run was stopped part way. Items come
+        # as raw JSON text and are written as they are, never re-encoded;
+        # they are still decoded for the timestamp, which sits too deep in
+        # the item for raw_fields() to beat a full decode
+        resume_key = EASMCheckpoint(self, "resume").key
+        with open_resumable_listing(
+            self.api, self.stanza, resume_key, "/assets", params, raw=True, logger=self.logger
+        ) as listing:
+            newest_timestamp = listing.state or last_checkpoint
+
+            for page in listing.pages():
+                page_count = 0
+
+                for raw in page:
+                    self.write_event(
+                        data=raw,
+                        sourcetype=SOURCETYPE
+                    )
+                    event_count += 1
+                    page_count += 1
+
+                    observed = (
+                        json.loads(raw)
+                        .get("properties", {})
+                        .get("lastSeenDateTime")
+                    )
+
+                    if observed and (not newest_timestamp or observed > newest_timestamp):
+                        newest_timestamp = observed
+                        listing.state = newest_timestamp
+
+                self.logger.info(
+                    f"Fetched {page_count} WHOIS contacts "
+                    f"(total so far: {event_count})"
                 )
-                event_count += 1
-
-                observed = (
-                    asset.get("properties", {})
-                    .get("lastSeenDateTime")
-                )
-
-                if observed and (not newest_timestamp or observed > newest_timestamp):
-                    newest_timestamp = observed
-
-            self.logger.info(
-                f"Fetched {len(assets)} WHOIS contacts "
-                f"(total so far: {event_count})"
-            )
 
-        if newest_timestamp:
-            checkpoint.set(newest_timestamp)
-            self.logger.info(f"Checkpoint updated to {newest_timestamp}")
+            # Watermark and cleared resume point commit together
+            listing.finish({checkpoint.key: newest_timestamp})
+            if newest_timestamp:
+                self.logger.info(f"Checkpoint updated to {newest_timestamp}")
 
         self.logger.info(
             f"WHOIS contact collection complete — "
@@ -50,15 +50,11 @@ class DefenderEASMWorkspaces(EASMModularInput):
                 f"systemData.lastModifiedAt gt {last_checkpoint}"
             )
 
-        next_url = API_PATH
         newest_timestamp = last_checkpoint
         total = 0
 
-        while next_url:
-            response = self.api.get(next_url, params=params)
+        for response in self.api.iter_pages(API_PATH, params=params):
             records = response.get("value", [])
-            next_url = response.get("nextLink")
-            params = None  # nextLink already contains parameters
 
             for record in records:
                 self.write_event(
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/bench_collectors.py
+
+Microsoft Defender EASM for Splunk App
+End-to-end collector benchmark against a local EASM mock
+
+Runs each bin/defender_easm_*.py modular input the way splunkd does (a
+fresh process, the input definition on stdin, events read back from
+stdout) against easm_mock.py, which serves the token endpoint and both
+API planes, and reports per collector:
+
+- effective items/s (distinct items delivered), and whether every item
+  the mock holds arrived
+- items written more than once (re-emitted after a retry or resume)
+- API requests, and how many were wasted (faulted or repeated)
+- MB/s of API responses received
+- peak RSS and CPU time (user + sys) of the input process
+
+--faults runs the same collectors under each of the mock's fault
+profiles (429 windows, 5xx bursts, tail latency, mid-page connection
+resets, early token expiry, or all at once), so retry and resume
+behaviour can be compared with numbers.
+
+--synth serves the asset types from easm_synth.py instead (realistic,
+cross-referenced items at any scale), and --snapshots N pulls N
+snapshots of it in turn with each collector keeping its checkpoints, so
+incremental and delta_mode runs can be measured against a known share of
+changed (--churn) and replaced (--turnover) assets. Removed-asset
+records are counted apart from items.
+
+splunkd itself is stood in for inside each input process: the app
+settings and client secret are answered from the benchmark's values in
+place of splunkd's REST API (a splunk.rest module is provided when the
+interpreter has none), and SPLUNK_HOME points at a scratch directory, so
+every collector starts without checkpoints (and keeps them only across
+the snapshots of one --synth run).
+
+Results are written as JSON (--out) so runs can be compared for
+regressions:
+    python benchmarks/bench_collectors.py --assets 20000 --latency 0.02 --out collectors.json
+    python benchmarks/bench_collectors.py --collectors domains,dns_records --param partitions=4
+    python benchmarks/bench_collectors.py --faults all --assets 50000 --out faults.json
+    python benchmarks/bench_collectors.py --synth --snapshots 3 --assets 100000 --param incremental=true
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import runpy
+import shutil
+import types
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import unquote
+from xml.sax.saxutils import escape, quoteattr
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BIN = os.path.join(HERE, "..", "Microsoft_Defender_EASM_For_Splunk", "bin")
+sys.path.insert(0, HERE)
+
+from easm_mock import (  # noqa: E402
+    COLLECTIONS,
+    DEFAULT_ASSETS,
+    DEFAULT_CONTROL,
+    DEFAULT_ITEM_BYTES,
+    FAULT_PROFILES,
+    EASMMock,
+    parse_counts,
+)
+from easm_synth import DEFAULT_CHURN, DEFAULT_TURNOVER, KINDS as SYNTH_KINDS, EASMSynth  # noqa: E402
+
+APP_NAME = "Microsoft_Defender_EASM_For_Splunk"
+CONFIG_ENV = "EASM_BENCH_SPLUNKD"
+SESSION_KEY = "bench-session-key"
+CLIENT_SECRET = "bench-client-secret"
+METRICS_TAG = b"<sourcetype>defender:easm:metrics</sourcetype>"
+REMOVED_SOURCETYPE = b"defender:easm:asset_removed"
+# Mock items lead with their id, raw or re-serialized; the sourcetype
+# tells removed-asset records (which lead with the id too) from items
+ITEM_ID_RE = re.compile(
+    rb'<sourcetype>([^<]*)</sourcetype>(?:<index>[^<]*</index>)?(?:<host>[^<]*</host>)?<data>\{"id": ?"([^"]*)"'
+)
+
+# collector (bin/defender_easm_<name>.py) -> mock collections it lists
+COLLECTORS = {name: (name,) for name in COLLECTIONS}
+COLLECTORS["license"] = ()
+COLLECTORS["all_assets"] = tuple(COLLECTIONS)
+
+# The license endpoint returns one object
+SINGLE_OBJECT = ("license", "all_assets")
+
+# Collectors that only run their bare inputs.conf stanza
+BARE_STANZAS = ("ssl_certificates",)
+
+
+# ----------------------------
+# Input process (--child)
+# ----------------------------
+
+def install_splunkd_stub(settings, secrets) -> None:
+    """
+    Answers the splunkd REST reads the app makes (its settings stanza
+    and storage/passwords entries) from the given values.
+    """
+    try:
+        import splunk.rest as splunk_rest
+    except ImportError:
+        splunk = types.ModuleType("splunk")
+        splunk.__path__ = []
+        splunk_rest = types.ModuleType("splunk.rest")
+        splunk.rest = splunk_rest
+        sys.modules["splunk"] = splunk
+        sys.modules["splunk.rest"] = splunk_rest
+
+    settings_path = f"/servicesNS/nobody/{APP_NAME}/configs/conf-defender_easm/settings"
+    passwords_path = f"/servicesNS/nobody/{APP_NAME}/storage/passwords/"
+
+    def simpleRequest(path, sessionKey=None, method="GET", getargs=None, postargs=None,
+                      raiseAllErrors=False, **kwargs):
+        content = None
+        if path == settings_path:
+            content = settings
+        elif path.startswith(passwords_path):
+            # "<realm>:<username>:" with ':' escaped in older entity names
+            name = unquote(path[len(passwords_path):]).replace("\\:", ":").rstrip(":").split(":")[-1]
+            if name in secrets:
+                content = {"clear_password": secrets[name]}
+        if content is None:
+            raise RuntimeError(f"splunkd stand-in: no entity at {path}")
+        response = types.SimpleNamespace(status=200)
+        return response, json.dumps({"entry": [{"name": path.rsplit("/", 1)[-1], "content": content}]})
+
+    splunk_rest.simpleRequest = simpleRequest
+
+
+def run_child(script: str) -> None:
+    splunkd = json.loads(os.environ[CONFIG_ENV])
+    install_splunkd_stub(splunkd["settings"], splunkd["secrets"])
+    sys.path.insert(0, os.path.dirname(script))
+    sys.argv = [script]
+    runpy.run_path(script, run_name="__main__")
+
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+
+def input_definition(name: str, params) -> str:
+    stanza = f"defender_easm_{name}" if name in BARE_STANZAS else f"defender_easm_{name}://bench"
+    body = "".join(f"<param name={quoteattr(k)}>{escape(str(v))}</param>" for k, v in params.items())
+    return (
+        "<input>"
+        "<server_host>bench</server_host>"
+        "<server_uri>https://127.0.0.1:8089</server_uri>"
+        f"<session_key>{SESSION_KEY}</session_key>"
+        "<checkpoint_dir>/tmp</checkpoint_dir>"
+        f"<configuration><stanza name={quoteattr(stanza)}>{body}</stanza></configuration>"
+        "</input>"
+    )
+
+
+def count_output(stream, counts) -> None:
+    """
+    Counts events, run summaries, removed-asset records, bytes and
+    re-emitted items (the same id written twice) on an input's stdout.
+    """
+    seen = set()
+    carry = b""
+    while True:
+        chunk = stream.read(1 << 20)
+        if not chunk:
+            break
+        counts["bytes"] += len(chunk)
+        data = carry + chunk
+        # Whole events only; the rest waits for the next read
+        cut = data.rfind(b"</event>") + len(b"</event>")
+        if cut < len(b"</event>"):
+            carry = data
+            continue
+        data, carry = data[:cut], data[cut:]
+        counts["events"] += data.count(b"<event ") + data.count(b"<event>")
+        counts["metrics"] += data.count(METRICS_TAG)
+        for sourcetype, item_id in ITEM_ID_RE.findall(data):
+            if sourcetype == REMOVED_SOURCETYPE:
+                counts["removed"] += 1
+                continue
+            key = hash(item_id)
+            if key in seen:
+                counts["duplicates"] += 1
+            else:
+                seen.add(key)
+    counts["unique"] = len(seen)
+
+
+def run_collector(name: str, mock: EASMMock, params, splunkd, home: str, timeout: float):
+    """
+    One run of a collector with SPLUNK_HOME = home; runs that share a
+    home see each other's checkpoints.
+    """
+    script = os.path.join(BIN, f"defender_easm_{name}.py")
+    env = dict(os.environ, SPLUNK_HOME=home, **{CONFIG_ENV: json.dumps(splunkd)})
+    counts = {"events": 0, "metrics": 0, "removed": 0, "bytes": 0, "duplicates": 0, "unique": 0}
+
+    mock.reset_stats()
+    with open(os.path.join(home, "stderr.log"), "wb") as stderr:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--child", script],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, env=env,
+        )
+        # A collector that never gives up under faults is stopped, not waited on
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        reader = threading.Thread(target=count_output, args=(proc.stdout, counts), daemon=True)
+        reader.start()
+        proc.stdin.write(input_definition(name, params).encode("utf-8"))
+        proc.stdin.close()
+        # wait4 reports this process's own peak RSS and CPU time
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        timed_out = not timer.is_alive()
+        timer.cancel()
+        reader.join()
+        elapsed = time.perf_counter() - started
+
+    with open(os.path.join(home, "stderr.log"), "rb") as f:
+        stderr_tail = f.read()[-2000:].decode("utf-8", "replace")
+
+    stats = mock.summary()
+    expected = mock.expected(COLLECTORS[name]) + (1 if name in SINGLE_OBJECT else 0)
+    # After the first snapshot an incremental or delta pull may skip what
+    # did not change, but never what did
+    synth = mock.synth
+    least = expected
+    if synth is not None and synth.snapshot > 0:
+        least = sum(synth.changed_count(c) for c in COLLECTORS[name] if mock.synthetic(c))
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_mb = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+    result = {
+        "collector": name,
+        "exit_code": proc.returncode,
+        "timed_out": timed_out,
+        "seconds": round(elapsed, 3),
+        "items": counts["events"] - counts["metrics"] - counts["removed"],
+        "unique_items": counts["unique"],
+        "duplicates": counts["duplicates"],
+        "removed": counts["removed"],
+        "expected": expected,
+        "complete": proc.returncode == 0 and least <= counts["unique"] <= expected,
+        # Effective throughput: distinct items delivered per second
+        "items_per_sec": round(counts["unique"] / elapsed, 1),
+        "api_requests": stats["requests"],
+        "wasted_requests": stats["wasted_requests"],
+        "token_requests": stats["token_requests"],
+        "faults": {key: stats[key] for key in ("throttled", "errors", "resets", "expired", "stalls")},
+        "api_mb": round(stats["bytes"] / 1e6, 2),
+        "api_mb_per_sec": round(stats["bytes"] / 1e6 / elapsed, 2),
+        "output_mb": round(counts["bytes"] / 1e6, 2),
+        "peak_rss_mb": round(rss_mb, 1),
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+    }
+    if synth is not None:
+        result["snapshot"] = synth.snapshot
+        result["changed"] = least
+    if not result["complete"]:
+        result["stderr_tail"] = stderr_tail
+    return result
+
+
+def parse_pairs(values):
+    pairs = {}
+    for value in values or ():
+        key, _, val = value.partition("=")
+        pairs[key.strip()] = val.strip()
+    return pairs
+
+
+def parse_names(value: str, known, what: str):
+    if value.strip().lower() == "all":
+        return list(known)
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in known]
+    if unknown:
+        raise ValueError(f"unknown {what}: {', '.join(unknown)}")
+    return names
+
+
+def print_profile(profile: str, results) -> None:
+    print(f"\n[{profile}]")
+    print(f"{'collector':<28}{'unique':>8}{'dupes':>7}{'seconds':>9}{'items/s':>10}{'requests':>10}"
+          f"{'wasted':>8}{'API MB/s':>10}{'RSS MB':>8}{'CPU s':>8}  complete")
+    for r in results:
+        label = r["collector"] if "snapshot" not in r else f"{r['collector']} @{r['snapshot']}"
+        print(
+            f"{label:<28}{r['unique_items']:>8,}{r['duplicates']:>7,}{r['seconds']:>9}"
+            f"{r['items_per_sec']:>10,.0f}{r['api_requests']:>10,}{r['wasted_requests']:>8,}"
+            f"{r['api_mb_per_sec']:>10}{r['peak_rss_mb']:>8}{r['cpu_seconds']:>8}  {r['complete']}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collectors", default="all",
+                        help=f"comma-separated collectors, or 'all' ({', '.join(COLLECTORS)})")
+    parser.add_argument("--faults", default="clean",
+                        help=f"comma-separated fault profiles, or 'all' ({', '.join(FAULT_PROFILES)}; default clean)")
+    parser.add_argument("--assets", type=int, default=DEFAULT_ASSETS,
+                        help=f"mock items per inventory collection (default {DEFAULT_ASSETS})")
+    parser.add_argument("--control", type=int, default=DEFAULT_CONTROL,
+                        help=f"mock items per control-plane collection (default {DEFAULT_CONTROL})")
+    parser.add_argument("--count", action="append", metavar="NAME=N", help="mock items for one collection")
+    parser.add_argument("--item-bytes", type=int, default=DEFAULT_ITEM_BYTES,
+                        help=f"approximate JSON size of one mock item (default {DEFAULT_ITEM_BYTES})")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock seconds per API request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--param", action="append", metavar="KEY=VALUE",
+                        help="inputs.conf parameter for every collector's stanza, e.g. partitions=4")
+    parser.add_argument("--setting", action="append", metavar="KEY=VALUE",
+                        help="app setting, e.g. rate_limit_per_second=100")
+    parser.add_argument("--synth", action="store_true",
+                        help="serve the asset types from easm_synth (--assets items each) instead of stamped items")
+    parser.add_argument("--snapshots", type=int, default=1,
+                        help="synthetic snapshots to pull in turn, keeping each collector's checkpoints (default 1)")
+    parser.add_argument("--churn", type=float, default=DEFAULT_CHURN,
+                        help=f"synthetic items changed per snapshot (default {DEFAULT_CHURN})")
+    parser.add_argument("--turnover", type=float, default=DEFAULT_TURNOVER,
+                        help=f"synthetic items replaced per snapshot (default {DEFAULT_TURNOVER})")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="seconds before a collector's process is killed (default 600)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep-home", action="store_true", help="keep each run's SPLUNK_HOME (logs, state)")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--child", metavar="SCRIPT", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return run_child(args.child)
+
+    try:
+        names = parse_names(args.collectors, COLLECTORS, "collectors")
+        profiles = parse_names(args.faults, FAULT_PROFILES, "fault profiles")
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.snapshots > 1 and not args.synth:
+        parser.error("--snapshots needs --synth")
+    params = parse_pairs(args.param)
+
+    results = []
+    counts = {}
+    for profile in profiles:
+        # A fresh mock per profile, so throttle windows start with the run
+        synth = None
+        if args.synth:
+            synth = EASMSynth({n: c for n, c in parse_counts(args.count).items() if n in SYNTH_KINDS},
+                              args.assets, args.seed, args.churn, args.turnover)
+        mock = EASMMock(assets=args.assets, control=args.control, counts=parse_counts(args.count),
+                        item_bytes=args.item_bytes, latency=args.latency, jitter=args.jitter, seed=args.seed,
+                        faults=FAULT_PROFILES[profile], synth=synth)
+        url = mock.start()
+        counts = mock.counts
+        settings = {
+            "tenant_id": "00000000-0000-0000-0000-000000000001",
+            "client_id": "00000000-0000-0000-0000-000000000002",
+            "subscription_id": "00000000-0000-0000-0000-000000000003",
+            "resource_group": "bench-rg",
+            "workspace_name": "bench-ws",
+            "authority_url": url,
+            "data_plane_endpoint": url,
+            "management_endpoint": url,
+        }
+        settings.update(parse_pairs(args.setting))
+        splunkd = {"settings": settings, "secrets": {"client_secret": CLIENT_SECRET}}
+
+        try:
+            for name in names:
+                home = tempfile.mkdtemp(prefix=f"easm-bench-{name}-")
+                try:
+                    for snapshot in range(args.snapshots):
+                        if synth is not None:
+                            synth.snapshot = snapshot
+                        result = run_collector(name, mock, params, splunkd, home, args.timeout)
+                        if args.keep_home:
+                            result["splunk_home"] = home
+                        results.append(dict(result, profile=profile))
+                        if not args.json:
+                            at = f" @{snapshot}" if synth is not None else ""
+                            print(f"  {profile} / {name}{at}: {result['unique_items']:,}/{result['expected']:,} "
+                                  f"items in {result['seconds']}s", file=sys.stderr)
+                finally:
+                    if not args.keep_home:
+                        shutil.rmtree(home, ignore_errors=True)
+        finally:
+            mock.stop()
+
+    report = {
+        "benchmark": "bench_collectors",
+        "started": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mock": {"assets": args.assets, "control": args.control, "counts": counts,
+                 "item_bytes": args.item_bytes, "latency": args.latency, "jitter": args.jitter, "seed": args.seed},
+        "synth": {"snapshots": args.snapshots, "churn": args.churn, "turnover": args.turnover} if args.synth else None,
+        "profiles": {profile: FAULT_PROFILES[profile] for profile in profiles},
+        "params": params,
+        "settings": parse_pairs(args.setting),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        if args.synth:
+            print(f"{args.assets:,} synthetic items per asset type, {args.snapshots} snapshot(s) with "
+                  f"{args.churn:.0%} churn and {args.turnover:.0%} turnover, {args.latency * 1000:.0f} ms per request")
+        else:
+            print(f"{args.assets:,} items per inventory, {args.control:,} per control-plane list, "
+                  f"~{args.item_bytes:,} B per item, {args.latency * 1000:.0f} ms per request")
+        for profile in profiles:
+            print_profile(profile, [r for r in results if r["profile"] == profile])
+        for r in results:
+            if not r["complete"]:
+                print(f"\n{r['profile']} / {r['collector']} @{r.get('snapshot', 0)} (exit {r['exit_code']}):\n{r['stderr_tail']}")
+    # Faults may legitimately cost items; only a clean run has to be complete
+    return 0 if all(r["complete"] for r in results if r["profile"] == "clean") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/bench_event_writer.py
+
+Microsoft Defender EASM for Splunk App
+Benchmark: splunklib EventWriter vs EASMBatchEventWriter
+
+Writes the same raw JSON events (default 1,000,000) to a temporary file
+through:
+
+- splunklib        EventWriter.write_event(Event): ElementTree + flush per event
+- batch/Event      EASMBatchEventWriter.write_event(Event): existing call sites
+- batch/write      EASMBatchEventWriter.write(data, ...): no Event objects
+
+and checks that all three produce byte-identical output.
+
+Run with the Splunk-bundled interpreter so defender_easm_common imports:
+    $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_event_writer.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Microsoft_Defender_EASM_For_Splunk", "bin"),
+)
+
+import splunklib.modularinput as smi  # noqa: E402
+
+from defender_easm_common import EASMBatchEventWriter  # noqa: E402
+
+STANZA = "defender_easm_hosts://default"
+SOURCETYPE = "defender:easm:host"
+INDEX = "security_defender_easm"
+
+
+def make_events(count: int, distinct: int, seed: int):
+    """
+    count event payloads cycling over `distinct` pre-built JSON strings.
+    """
+    rng = random.Random(seed)
+    pool = []
+    for i in range(distinct):
+        name = f"host{i}.contoso.com"
+        pool.append(json.dumps({
+            "id": f"host$${name}",
+            "kind": "host",
+            "name": name,
+            "state": rng.choice(["confirmed", "candidate"]),
+            "asset": {
+                "host": name,
+                "ipAddresses": [{"value": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", "recent": True}],
+                "webComponents": [{"name": "nginx", "version": "1.25", "cves": []}],
+                "banner": "<html>&nbsp;</html>",
+                "notes": "ünïcödé",
+            },
+        }, separators=(",", ":"), ensure_ascii=False))
+    return [pool[i % distinct] for i in range(count)]
+
+
+def run_splunklib(out, events):
+    ew = smi.EventWriter(out, sys.stderr)
+    for data in events:
+        ew.write_event(smi.Event(data=data, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX))
+    ew.close()
+
+
+def run_batch_event(out, events):
+    ew = smi.EventWriter(out, sys.stderr)
+    with EASMBatchEventWriter(ew) as writer:
+        for data in events:
+            writer.write_event(smi.Event(data=data, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX))
+    ew.close()
+
+
+def run_batch_write(out, events):
+    ew = smi.EventWriter(out, sys.stderr)
+    with EASMBatchEventWriter(ew) as writer:
+        for data in events:
+            writer.write(data, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX)
+    ew.close()
+
+
+MODES = (
+    ("splunklib", run_splunklib),
+    ("batch/Event", run_batch_event),
+    ("batch/write", run_batch_write),
+)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000, help="events per mode (default 1,000,000)")
+    parser.add_argument("--distinct", type=int, default=1000, help="distinct payloads to cycle over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    events = make_events(args.events, args.distinct, args.seed)
+    results = []
+    outputs = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fn in MODES:
+            path = os.path.join(tmp, name.replace("/", "_") + ".xml")
+            with open(path, "w", encoding="utf-8") as out:
+                started = time.perf_counter()
+                fn(out, events)
+                elapsed = time.perf_counter() - started
+
+            with open(path, "r", encoding="utf-8") as f:
+                outputs[name] = f.read()
+
+            results.append({
+                "mode": name,
+                "seconds": round(elapsed, 3),
+                "events_per_sec": round(args.events / elapsed),
+                "bytes": os.path.getsize(path),
+            })
+
+    baseline = results[0]["seconds"]
+    for r in results:
+        r["speedup"] = round(baseline / r["seconds"], 2)
+        r["same_events"] = outputs[r["mode"]] == outputs["splunklib"]
+
+    if args.json:
+        print(json.dumps({"events": args.events, "results": results}, indent=2))
+        return 0
+
+    print(f"{args.events:,} events")
+    print(f"{'mode':<13}{'seconds':>9}{'events/s':>12}{'speedup':>9}  same output")
+    for r in results:
+        print(f"{r['mode']:<13}{r['seconds']:>9}{r['events_per_sec']:>12,}{r['speedup']:>8}x  {r['same_events']}")
+    return 0 if all(r["same_events"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/bench_hec_output.py
+
+Microsoft Defender EASM for Splunk App
+Benchmark: EASMHECEventWriter against a local HEC stand-in
+
+Sends the same raw JSON events (default 200,000) through
+EASMHECEventWriter to hec_standin.HECStandIn, for each combination of
+gzip on/off and batches in flight (1 and the default), with a fixed
+per-request latency standing in for the network. A last mode adds
+indexer acknowledgement, each ack reported --ack-delay after its batch
+and polled while sending goes on (the time includes the final wait).
+
+Reported per mode: events/s, batches, bytes on the wire and the highest
+number of concurrent requests the stand-in saw. Every mode is checked to
+deliver each event exactly once with _raw unchanged.
+
+Run with the Splunk-bundled interpreter so defender_easm_common imports:
+    $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_hec_output.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Microsoft_Defender_EASM_For_Splunk", "bin"))
+
+import splunklib.modularinput as smi  # noqa: E402
+
+from defender_easm_common import DEFAULT_HEC_MAX_IN_FLIGHT, EASMHECEventWriter  # noqa: E402
+from hec_standin import HECStandIn  # noqa: E402
+
+TOKEN = "00000000-0000-0000-0000-000000000000"
+STANZA = "defender_easm_hosts://default"
+SOURCETYPE = "defender:easm:host"
+INDEX = "security_defender_easm"
+
+
+def make_events(count: int, seed: int):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        name = f"host{i}.contoso.com"
+        events.append(json.dumps({
+            "id": f"host$${name}",
+            "kind": "host",
+            "name": name,
+            "state": rng.choice(["confirmed", "candidate"]),
+            "asset": {
+                "host": name,
+                "ipAddresses": [{"value": f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", "recent": True}],
+                "webComponents": [{"name": "nginx", "version": "1.25", "cves": []}],
+                "notes": "ünïcödé",
+            },
+        }, separators=(",", ":"), ensure_ascii=False))
+    return events
+
+
+def run(url: str, events, gzip_level: int, max_in_flight: int, ack: bool):
+    ew = smi.EventWriter(open(os.devnull, "w"), sys.stderr)
+    with EASMHECEventWriter(
+        ew, url, TOKEN, gzip_level=gzip_level, max_in_flight=max_in_flight, ack=ack, ack_poll_seconds=0.2
+    ) as writer:
+        for data in events:
+            writer.write(data, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX)
+    return writer.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000, help="events per mode (default 200,000)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in seconds per request (default 0.05)")
+    parser.add_argument("--ack-delay", type=float, default=1.0, help="seconds until a batch is acknowledged (default 1.0)")
+    parser.add_argument("--busy-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    events = make_events(args.events, args.seed)
+    modes = [
+        ("plain x1", 0, 1, False),
+        ("gzip x1", 6, 1, False),
+        (f"plain x{DEFAULT_HEC_MAX_IN_FLIGHT}", 0, DEFAULT_HEC_MAX_IN_FLIGHT, False),
+        (f"gzip x{DEFAULT_HEC_MAX_IN_FLIGHT}", 6, DEFAULT_HEC_MAX_IN_FLIGHT, False),
+        (f"gzip x{DEFAULT_HEC_MAX_IN_FLIGHT} ack", 6, DEFAULT_HEC_MAX_IN_FLIGHT, True),
+    ]
+
+    results = []
+    for name, level, in_flight, ack in modes:
+        standin = HECStandIn(
+            TOKEN, latency=args.latency, busy_rate=args.busy_rate, seed=args.seed, ack=ack, ack_delay=args.ack_delay
+        )
+        standin.keep_events = True
+        url = standin.start()
+        try:
+            started = time.perf_counter()
+            stats = run(url, events, level, in_flight, ack)
+            elapsed = time.perf_counter() - started
+        finally:
+            standin.stop()
+
+        received = [e["event"] for e in standin.events]
+        results.append({
+            "mode": name,
+            "seconds": round(elapsed, 3),
+            "events_per_sec": round(args.events / elapsed),
+            "batches": stats["batches"],
+            "retries": stats["retries"],
+            "wire_mb": round(standin.stats["wire_bytes"] / 1e6, 2),
+            "max_concurrent": standin.stats["max_concurrent"],
+            "acked": stats["acked"],
+            "exactly_once": sorted(received) == sorted(events),
+        })
+
+    if args.json:
+        print(json.dumps({"events": args.events, "latency": args.latency, "results": results}, indent=2))
+        return 0
+
+    print(f"{args.events:,} events, {args.latency * 1000:.0f} ms per request, acks after {args.ack_delay:g}s")
+    print(f"{'mode':<14}{'seconds':>9}{'events/s':>11}{'batches':>9}{'retries':>9}{'wire MB':>9}{'conc':>6}  exactly once")
+    for r in results:
+        print(
+            f"{r['mode']:<14}{r['seconds']:>9}{r['events_per_sec']:>11,}{r['batches']:>9}{r['retries']:>9}"
+            f"{r['wire_mb']:>9}{r['max_concurrent']:>6}  {r['exactly_once']}"
+        )
+    return 0 if all(r["exactly_once"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
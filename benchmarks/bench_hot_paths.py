@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/bench_hot_paths.py
+
+Microsoft Defender EASM for Splunk App
+Microbenchmarks: per-item hot paths, with a regression gate
+
+Times the code every collected item goes through, one operation at a
+time (ns/op over easm_synth.py hosts and exposure insights):
+
+- get_nested             _get_nested(record, path) (exposure insights)
+- pick_timestamp         _pick_timestamp(record), a quarter of the records
+                         only carrying a fallback field
+- json_dumps_asset       json.dumps(asset), as collectors re-serialize items
+- event_construct        smi.Event(data=..., stanza=..., sourcetype=..., index=...)
+- event_write_splunklib  EventWriter.write_event(Event) (ElementTree, flush per event)
+- event_write_batch      EASMBatchEventWriter.write(data, ...)
+- parse_iso_utc          _parse_iso_utc(value), the watermark's timestamp parse
+- watermark_track        EASMWatermark.track(items) on an incremental pull
+- checkpoint_save_load   save_checkpoint() + get_checkpoint() through state.db
+
+Rounds of all benchmarks are interleaved --repeat times and each keeps
+its fastest round, the one least disturbed by the rest of the machine.
+A fixed pure-Python loop (calibration) runs in the same rounds, and
+results are compared with the stored baseline
+(bench_hot_paths.baseline.json) relative to it, so a machine that is
+slower or busier as a whole does not read as a regression. --check
+exits 1 when any benchmark is slower than its baseline by more than its
+threshold (threshold_pct in the baseline, or --threshold for all).
+Baselines are only comparable on the same machine and Python, so take
+one before a change and check after it:
+
+    python benchmarks/bench_hot_paths.py --save-baseline
+    python benchmarks/bench_hot_paths.py --check
+    python benchmarks/bench_hot_paths.py --only watermark_track,parse_iso_utc --check --threshold 5
+
+Run with the Splunk-bundled interpreter so defender_easm_common imports
+(elsewhere bench_collectors.py provides splunk.rest; nothing here
+talks to splunkd):
+    $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_hot_paths.py --check
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "Microsoft_Defender_EASM_For_Splunk", "bin"))
+
+try:
+    import splunk.rest  # noqa: F401
+except ImportError:
+    from bench_collectors import install_splunkd_stub
+    install_splunkd_stub({}, {})
+
+import splunklib.modularinput as smi  # noqa: E402
+
+import defender_easm_common as common  # noqa: E402
+from defender_easm_listing import _parse_iso_utc  # noqa: E402
+from defender_easm_exposure_insights import TS_CANDIDATES, _get_nested, _pick_timestamp  # noqa: E402
+from easm_synth import EASMSynth  # noqa: E402
+
+BASELINE_PATH = os.path.join(HERE, "bench_hot_paths.baseline.json")
+
+DEFAULT_ITEMS = 20_000
+DEFAULT_REPEAT = 10
+DEFAULT_THRESHOLD = 10.0
+
+STANZA = "defender_easm_hosts://default"
+SOURCETYPE = "defender:easm:host"
+INDEX = "security_defender_easm"
+
+# name -> (threshold_pct, factory); factory(data) returns a function
+# that performs one round and returns how many operations it did
+BENCHMARKS = {}
+
+
+def benchmark(name: str, threshold_pct: float = DEFAULT_THRESHOLD):
+    def register(factory):
+        BENCHMARKS[name] = (threshold_pct, factory)
+        return factory
+    return register
+
+
+CALIBRATION = "calibration"
+
+
+# ----------------------------
+# Data
+# ----------------------------
+
+class BenchData:
+    """
+    Synthetic hosts and exposure insights, built once and shared.
+    """
+
+    def __init__(self, items: int, seed: int):
+        synth = EASMSynth(count=items, seed=seed)
+        self.hosts = [item for _, item in synth.iter_items("hosts")]
+        self.insights = []
+        for i, (_, item) in enumerate(synth.iter_items("exposure_insights")):
+            if i % 4 == 3:
+                # Only the last fallback: the full candidate walk
+                item = dict(item, timestamp=item["properties"]["lastUpdatedDateTime"], properties={})
+            self.insights.append(item)
+        self.payloads = [json.dumps(item) for item in self.hosts]
+        self.values = [item["updatedDate"] for item in self.hosts]
+
+
+# ----------------------------
+# Benchmarks
+# ----------------------------
+
+@benchmark(CALIBRATION)
+def bench_calibration(data):
+    # Fixed dict / str / int work independent of the app: the machine's
+    # speed during the rounds
+    table = {f"key{i}": i for i in range(1000)}
+    rounds = 20
+
+    def run():
+        total = 0
+        for _ in range(rounds):
+            for key, value in table.items():
+                if key.endswith("7"):
+                    total += value
+        return rounds * len(table)
+    return run
+
+
+@benchmark("get_nested")
+def bench_get_nested(data):
+    records, path = data.insights, TS_CANDIDATES[0]
+
+    def run():
+        for record in records:
+            _get_nested(record, path)
+        return len(records)
+    return run
+
+
+@benchmark("pick_timestamp")
+def bench_pick_timestamp(data):
+    records = data.insights
+
+    def run():
+        for record in records:
+            _pick_timestamp(record)
+        return len(records)
+    return run
+
+
+@benchmark("json_dumps_asset")
+def bench_json_dumps(data):
+    items, dumps = data.hosts, json.dumps
+
+    def run():
+        for item in items:
+            dumps(item)
+        return len(items)
+    return run
+
+
+@benchmark("event_construct")
+def bench_event_construct(data):
+    payloads, Event = data.payloads, smi.Event
+
+    def run():
+        for payload in payloads:
+            Event(data=payload, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX)
+        return len(payloads)
+    return run
+
+
+@benchmark("event_write_splunklib", threshold_pct=15.0)
+def bench_event_write_splunklib(data):
+    payloads, Event = data.payloads, smi.Event
+
+    def run():
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            ew = smi.EventWriter(out, sys.stderr)
+            for payload in payloads:
+                ew.write_event(Event(data=payload, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX))
+            ew.close()
+        return len(payloads)
+    return run
+
+
+@benchmark("event_write_batch", threshold_pct=15.0)
+def bench_event_write_batch(data):
+    payloads = data.payloads
+
+    def run():
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            ew = smi.EventWriter(out, sys.stderr)
+            with common.EASMBatchEventWriter(ew) as writer:
+                for payload in payloads:
+                    writer.write(payload, stanza=STANZA, sourcetype=SOURCETYPE, index=INDEX)
+            ew.close()
+        return len(payloads)
+    return run
+
+
+@benchmark("parse_iso_utc")
+def bench_parse_iso_utc(data):
+    values, parse = data.values, _parse_iso_utc
+
+    def run():
+        for value in values:
+            parse(value)
+        return len(values)
+    return run
+
+
+@benchmark("watermark_track")
+def bench_watermark_track(data):
+    items = data.hosts
+    key = f"{common.APP_NAME}::hosts::bench::watermark"
+    # An incremental pull from the middle of the range, with ids at the
+    # boundary instant to check against
+    middle = sorted(data.values)[len(data.values) // 2]
+    point = json.dumps({"field": "updatedDate", "value": middle, "runs": 1,
+                        "ids": [item["id"] for item in items if item["updatedDate"] == middle]})
+
+    def run():
+        common.save_checkpoint(key, point)
+        watermark = common.EASMWatermark(key, field="updatedDate", reconcile_every=0)
+        for _ in watermark.track(items):
+            pass
+        return len(items)
+    return run
+
+
+@benchmark("checkpoint_save_load", threshold_pct=25.0)
+def bench_checkpoint(data):
+    # Cursor-sized values over a stanza's worth of keys; commits happen
+    # every STATE_COMMIT_WRITES writes as in a collector
+    keys = [f"{common.APP_NAME}::hosts::bench{i % 64}::nextlink" for i in range(len(data.values) // 4)]
+    values = [f"https://easm.example/assets/hosts?$skip={i}&$top=100" for i in range(len(keys))]
+    save, load = common.save_checkpoint, common.get_checkpoint
+
+    def run():
+        for key, value in zip(keys, values):
+            save(key, value)
+            load(key)
+        common.get_state_store().flush()
+        return len(keys)
+    return run
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+
+def _timed(run) -> float:
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        ops = run()
+        elapsed = time.perf_counter_ns() - started
+    finally:
+        gc.enable()
+    return elapsed / max(1, ops)
+
+
+def measure(runs, repeat: int, progress=None):
+    """
+    {name: (fastest, median) ns per operation}, over repeat rounds that
+    each run every benchmark once, so a slow spell on the machine is
+    spread over all of them instead of landing on one.
+    """
+    for run in runs.values():
+        run()  # warm-up
+    timings = {name: [] for name in runs}
+    for i in range(repeat):
+        for name, run in runs.items():
+            timings[name].append(_timed(run))
+        if progress:
+            progress(i + 1)
+    return {name: (min(t), statistics.median(t)) for name, t in timings.items()}
+
+
+def load_baseline(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Adds baseline_ns, change_pct, threshold_pct and regressed to each
+    result that has a baseline. Changes are relative to the calibration
+    loop when both runs have one.
+    """
+    stored = (baseline or {}).get("results", {})
+    current = {r["benchmark"]: r["ns_per_op"] for r in results}
+    scale = 1.0
+    if CALIBRATION in current and CALIBRATION in stored:
+        scale = stored[CALIBRATION]["ns_per_op"] / current[CALIBRATION]
+    for r in results:
+        base = stored.get(r["benchmark"])
+        if not base or r["benchmark"] == CALIBRATION:
+            continue
+        limit = threshold if threshold is not None else base.get("threshold_pct", DEFAULT_THRESHOLD)
+        change = (r["ns_per_op"] * scale - base["ns_per_op"]) / base["ns_per_op"] * 100.0
+        r.update(baseline_ns=base["ns_per_op"], change_pct=round(change, 1), threshold_pct=limit,
+                 regressed=change > limit)
+
+
+def parse_names(value: str):
+    if not value or value.strip().lower() == "all":
+        return list(BENCHMARKS)
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"unknown benchmarks: {', '.join(unknown)}")
+    # Always measured: the comparison is relative to it
+    return [CALIBRATION] + [n for n in names if n != CALIBRATION]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="all", help=f"comma-separated benchmarks, or 'all' ({', '.join(BENCHMARKS)})")
+    parser.add_argument("--items", type=int, default=DEFAULT_ITEMS,
+                        help=f"synthetic items per round (default {DEFAULT_ITEMS:,})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"timed rounds per benchmark; the fastest counts (default {DEFAULT_REPEAT})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file (default %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit 1 if any benchmark regressed past its threshold")
+    parser.add_argument("--threshold", type=float,
+                        help="allowed slowdown in percent for every benchmark (default: per benchmark)")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        names = parse_names(args.only)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    # The watermark and state store log every pull at INFO
+    logging.disable(logging.INFO)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="easm-hot-paths-") as home:
+        # state.db and checkpoints go to a scratch SPLUNK_HOME
+        os.environ["SPLUNK_HOME"] = home
+        data = BenchData(args.items, args.seed)
+        runs = {name: BENCHMARKS[name][1](data) for name in names}
+        progress = None if args.json else \
+            (lambda i: print(f"  round {i}/{args.repeat}", file=sys.stderr))
+        for name, (fastest, median) in measure(runs, args.repeat, progress).items():
+            results.append({
+                "benchmark": name,
+                "ns_per_op": round(fastest, 1),
+                "median_ns_per_op": round(median, 1),
+                "ops_per_sec": round(1e9 / fastest),
+                "default_threshold_pct": BENCHMARKS[name][0],
+            })
+        common.close_state_store()
+
+    baseline = load_baseline(args.baseline)
+    compare(results, baseline, args.threshold)
+
+    report = {
+        "benchmark": "bench_hot_paths",
+        "started": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "items": args.items,
+        "repeat": args.repeat,
+        "baseline": {k: baseline.get(k) for k in ("saved", "python", "platform")} if baseline else None,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.save_baseline:
+        # Thresholds already tuned in the stored baseline are kept
+        stored = (baseline or {}).get("results", {})
+        saved = {
+            "saved": report["started"],
+            "python": report["python"],
+            "platform": report["platform"],
+            "items": args.items,
+            "results": {
+                r["benchmark"]: {
+                    "ns_per_op": r["ns_per_op"],
+                    "threshold_pct": args.threshold if args.threshold is not None else
+                    stored.get(r["benchmark"], {}).get("threshold_pct", r["default_threshold_pct"]),
+                }
+                for r in results
+            },
+        }
+        for name, entry in stored.items():
+            saved["results"].setdefault(name, entry)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    regressed = [r for r in results if r.get("regressed")]
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        if baseline and baseline.get("python") != report["python"]:
+            print(f"note: baseline taken on Python {baseline.get('python')}, this is {report['python']}")
+        print(f"{args.items:,} items per round, fastest of {args.repeat} rounds")
+        print(f"{'benchmark':<24}{'ns/op':>10}{'ops/s':>13}{'baseline':>10}{'change':>9}{'limit':>8}")
+        for r in results:
+            if "baseline_ns" in r:
+                mark = "  REGRESSED" if r["regressed"] else ""
+                tail = f"{r['baseline_ns']:>10,.0f}{r['change_pct']:>+8.1f}%{r['threshold_pct']:>7.0f}%{mark}"
+            else:
+                tail = f"{'-':>10}"
+            print(f"{r['benchmark']:<24}{r['ns_per_op']:>10,.0f}{r['ops_per_sec']:>13,}{tail}")
+        if args.save_baseline:
+            print(f"baseline saved to {args.baseline}")
+        elif baseline is None:
+            print(f"no baseline at {args.baseline}; --save-baseline stores one")
+
+    if args.check:
+        if baseline is None:
+            print(f"--check: no baseline at {args.baseline}", file=sys.stderr)
+            return 1
+        if regressed:
+            print(f"regressed: {', '.join(r['benchmark'] for r in regressed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/bench_raw_passthrough.py
+
+Microsoft Defender EASM for Splunk App
+Benchmark: raw passthrough vs decode -> re-encode of list pages
+
+Compares, on synthetic asset pages, the ways a collector can turn a
+list-page response into event text:
+
+- loads+dumps      resp.json() then json.dumps(item) per item (previous path)
+- stream+dumps     EASMPageStream items, then json.dumps(item)
+- stream raw       EASMPageStream(raw=True): original item text, no re-encode
+
+Reported per mode: items/s, MB/s of response, bytes written as events and
+peak traced memory while draining one page.
+
+Run with the Splunk-bundled interpreter so defender_easm_common imports:
+    $SPLUNK_HOME/bin/splunk cmd python benchmarks/bench_raw_passthrough.py
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Microsoft_Defender_EASM_For_Splunk", "bin"),
+)
+
+from defender_easm_common import EASMPageStream  # noqa: E402
+
+
+class _FakeResponse:
+    """
+    Just enough of requests.Response for EASMPageStream.
+    """
+
+    url = "https://bench.invalid/assets"
+    status_code = 200
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), chunk_size):
+            yield self._body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def make_item(rng: random.Random, i: int) -> dict:
+    name = f"host{i}.{rng.choice(['contoso', 'fabrikam', 'woodgrove'])}.com"
+    return {
+        "id": f"host$${name}",
+        "kind": "host",
+        "name": name,
+        "displayName": name,
+        "state": rng.choice(["confirmed", "candidate"]),
+        "externalId": f"{rng.getrandbits(64):016x}",
+        "createdDate": "2024-01-02T03:04:05.000Z",
+        "updatedDate": "2024-06-07T08:09:10.000Z",
+        "labels": [rng.choice(["prod", "dev", "test"])],
+        "auditTrail": [{"id": f"d{rng.randint(1, 99)}", "name": "Discovery", "kind": "discoGroup"}],
+        "asset": {
+            "host": name,
+            "domain": name.split(".", 1)[1],
+            "firstSeen": "2023-11-01T00:00:00.000Z",
+            "lastSeen": "2024-06-07T08:09:10.000Z",
+            "count": rng.randint(1, 5000),
+            "ipAddresses": [
+                {"value": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                 "firstSeen": "2023-11-01T00:00:00.000Z", "lastSeen": "2024-06-07T08:09:10.000Z",
+                 "count": rng.randint(1, 100), "recent": True}
+                for _ in range(rng.randint(1, 4))
+            ],
+            "webComponents": [
+                {"name": rng.choice(["nginx", "IIS", "Apache", "jQuery"]), "type": "Server",
+                 "version": f"{rng.randint(1, 9)}.{rng.randint(0, 20)}",
+                 "cves": [{"name": f"CVE-2023-{rng.randint(1000, 49999)}", "cvssScore": round(rng.uniform(1, 10), 1)}
+                          for _ in range(rng.randint(0, 3))]}
+                for _ in range(rng.randint(0, 5))
+            ],
+            "headers": [{"headerName": "Server", "headerValue": "nginx", "firstSeen": "2024-01-01T00:00:00.000Z"}],
+            "notes": "ünïcödé — ✓",
+        },
+    }
+
+
+def make_page(items: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    payload = {
+        "value": [make_item(rng, i) for i in range(items)],
+        "nextLink": "https://bench.invalid/assets?$skip=1000&$top=1000",
+    }
+    # Service responses are compact JSON
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def run_loads_dumps(body: bytes):
+    written = 0
+    for item in json.loads(body)["value"]:
+        written += len(json.dumps(item))
+    return written
+
+
+def run_stream_dumps(body: bytes):
+    written = 0
+    page = EASMPageStream(_FakeResponse(body))
+    for item in page:
+        written += len(json.dumps(item))
+    page.close()
+    return written
+
+
+def run_stream_raw(body: bytes):
+    written = 0
+    page = EASMPageStream(_FakeResponse(body), raw=True)
+    for item in page:
+        written += len(item)
+    page.close()
+    return written
+
+
+MODES = (
+    ("loads+dumps", run_loads_dumps),
+    ("stream+dumps", run_stream_dumps),
+    ("stream raw", run_stream_raw),
+)
+
+
+def measure(fn, body: bytes, repeat: int):
+    best = float("inf")
+    written = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        written = fn(body)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, written, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000, help="items per page (default 5000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per mode; best is kept (default 5)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    body = make_page(args.items, args.seed)
+    results = []
+    for name, fn in MODES:
+        elapsed, written, peak = measure(fn, body, args.repeat)
+        results.append({
+            "mode": name,
+            "seconds": round(elapsed, 4),
+            "items_per_sec": round(args.items / elapsed),
+            "mb_per_sec": round(len(body) / elapsed / 1e6, 1),
+            "event_bytes": written,
+            "peak_mb": round(peak / 1e6, 2),
+        })
+
+    if args.json:
+        print(json.dumps({"items": args.items, "page_bytes": len(body), "results": results}, indent=2))
+        return 0
+
+    print(f"page: {args.items} items, {len(body) / 1e6:.1f} MB (best of {args.repeat})")
+    print(f"{'mode':<14}{'items/s':>12}{'MB/s':>8}{'event MB':>10}{'peak MB':>9}")
+    for r in results:
+        print(
+            f"{r['mode']:<14}{r['items_per_sec']:>12,}{r['mb_per_sec']:>8}"
+            f"{r['event_bytes'] / 1e6:>10.1f}{r['peak_mb']:>9}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/easm_mock.py
+
+Microsoft Defender EASM for Splunk App
+Local Defender EASM / Azure AD mock
+
+Answers the requests the collectors make, the way the service does:
+
+- POST /<tenant>/oauth2/v2.0/token (client credentials) returns a bearer
+  token; API requests without an issued token get 401
+- data-plane routes under .../providers/Microsoft.Easm/workspaces/<ws>
+  and management-plane routes under
+  .../providers/Microsoft.Security/externalAttackSurfaceManagementWorkspaces/<ws>
+  (or directly under the root, for easm_base_url overrides):
+    /assets?assetType=DnsRecord|WhoisContact, /assets/domains, /assets/hosts,
+    /assets/pages, /assets/ipAddresses, /assets/ipBlocks, /assets/asns,
+    /sslCertificates, /exposureInsights, /tasks, /reports, /reports/outputs,
+    /discoveryRuns, /discoveryTemplates, /dataConnections,
+    /dataConnections/validationResults, /roleAssignments, /roleDefinitions,
+    /workspaces, /operations, and /license (a single object)
+- {"value": [...], "nextLink": ...} pages; the nextLink carries the query
+  forward with $skip, so the page size ($top) can be changed mid-listing
+- $top, $skip, $orderby (asc / desc), $count=true (@odata.count) and
+  $filter ge / gt / le / lt / eq clauses on the timestamp fields
+  (createdDate, updatedDate, firstSeen, lastSeen, lastSeenDateTime,
+  lastUpdatedDateTime; bare, quoted, datetimeoffset'...' or null values)
+
+Item i of every collection is stamped 2024-01-01T00:00:00Z + i minutes,
+so window filters and watermarks select predictable ranges. Latency,
+item size and the number of items per collection are configurable.
+
+Fault profiles (--faults, see FAULT_PROFILES) script what production
+looks like on a bad day: 429 windows with Retry-After, 5xx bursts,
+log-normal tail latency with occasional stalls before the first byte,
+connections reset half way through a page, and tokens revoked long
+before their stated expiry.
+
+With --synth (or EASMMock(synth=EASMSynth(...))) the asset types come
+from easm_synth instead: realistic, cross-referenced items at any scale,
+with snapshots that change, remove and add a share of them.
+
+Run standalone and point the app at it (data_plane_endpoint,
+management_endpoint and authority_url = http://127.0.0.1:8080):
+    python benchmarks/easm_mock.py --port 8080 --assets 50000 --latency 0.05
+
+or import EASMMock from a benchmark.
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import heapq
+import socket
+import struct
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode
+
+from easm_synth import DEFAULT_CHURN, DEFAULT_TURNOVER, KINDS as EASM_SYNTH_KINDS, EASMSynth
+
+# name -> (path, assetType, kind, inventory)
+# Names match the all_assets asset types; inventories default to --assets
+# items, the rest (control plane) to --control items.
+COLLECTIONS = {
+    "domains": ("/assets/domains", None, "domain", True),
+    "hosts": ("/assets/hosts", None, "host", True),
+    "pages": ("/assets/pages", None, "page", True),
+    "ip_addresses": ("/assets/ipAddresses", None, "ipAddress", True),
+    "ip_blocks": ("/assets/ipBlocks", None, "ipBlock", True),
+    "asns": ("/assets/asns", None, "as", True),
+    "ssl_certificates": ("/sslCertificates", None, "sslCert", True),
+    "dns_records": ("/assets", "DnsRecord", "dnsRecord", True),
+    "whois_contacts": ("/assets", "WhoisContact", "whoisContact", True),
+    "exposure_insights": ("/exposureInsights", None, "exposureInsight", True),
+    "tasks": ("/tasks", None, "task", False),
+    "reports": ("/reports", None, "report", False),
+    "report_output": ("/reports/outputs", None, "reportOutput", False),
+    "discovery_runs": ("/discoveryRuns", None, "discoveryRun", False),
+    "discovery_templates": ("/discoveryTemplates", None, "discoveryTemplate", False),
+    "data_connections": ("/dataConnections", None, "dataConnection", False),
+    "data_connection_validation": ("/dataConnections/validationResults", None, "validationResult", False),
+    "rbac_role_assignments": ("/roleAssignments", None, "roleAssignment", False),
+    "rbac_role_definitions": ("/roleDefinitions", None, "roleDefinition", False),
+    "workspaces": ("/workspaces", None, "workspace", False),
+    "operations": ("/operations", None, "operation", False),
+}
+LICENSE_PATH = "/license"
+
+_ROUTES = {(path, asset_type): name for name, (path, asset_type, _, _) in COLLECTIONS.items()}
+
+DEFAULT_ASSETS = 5000
+DEFAULT_CONTROL = 50
+DEFAULT_ITEM_BYTES = 1500
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_PAGE_SIZE = 1000
+
+EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+STEP_SECONDS = 60
+
+# Fault knobs, all off by default:
+#   throttle_every / throttle_for  429 for throttle_for seconds out of every
+#                                  throttle_every, with Retry-After: retry_after
+#   error_rate / error_burst       a request starts a run of error_burst 5xx
+#                                  replies with probability error_rate
+#   latency_sigma                  log-normal spread around the base latency
+#   stall_rate / stall_seconds     this fraction waits stall_seconds more
+#                                  before the first byte
+#   reset_rate                     this fraction of pages is cut off half way
+#                                  and the connection reset
+#   token_lifetime                 tokens are refused (401) this many seconds
+#                                  after issue, whatever expires_in said
+FAULT_DEFAULTS = {
+    "throttle_every": 0.0, "throttle_for": 0.0, "retry_after": 1,
+    "error_rate": 0.0, "error_burst": 1,
+    "latency_sigma": 0.0, "stall_rate": 0.0, "stall_seconds": 0.0,
+    "reset_rate": 0.0,
+    "token_lifetime": 0.0,
+}
+
+FAULT_PROFILES = {
+    "clean": {},
+    "throttle": {"throttle_every": 4.0, "throttle_for": 1.0, "retry_after": 1},
+    "errors": {"error_rate": 0.02, "error_burst": 3},
+    "tail_latency": {"latency": 0.01, "latency_sigma": 1.0, "stall_rate": 0.005, "stall_seconds": 2.0},
+    "resets": {"reset_rate": 0.03},
+    "token_expiry": {"token_lifetime": 1.5},
+    "storm": {
+        "throttle_every": 6.0, "throttle_for": 1.0, "retry_after": 1,
+        "error_rate": 0.01, "error_burst": 3,
+        "latency": 0.005, "latency_sigma": 1.0, "stall_rate": 0.002, "stall_seconds": 2.0,
+        "reset_rate": 0.01,
+        "token_lifetime": 3.0,
+    },
+}
+
+ERROR_STATUSES = (500, 502, 503)
+
+TIME_FIELDS = ("createdDate", "updatedDate", "firstSeen", "lastSeen", "lastSeenDateTime", "lastUpdatedDateTime")
+
+_WORKSPACE_RE = re.compile(
+    r"^.*?/(?:providers/Microsoft\.Easm/workspaces|externalAttackSurfaceManagementWorkspaces)/[^/]+(/.*)?$"
+)
+_TOKEN_RE = re.compile(r"^/[^/]+/oauth2/v2\.0/token$")
+_CLAUSE_RE = re.compile(r"^\(?\s*([\w/.]+)\s+(ge|gt|le|lt|eq|ne)\s+(.+?)\s*\)?$", re.IGNORECASE)
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_time(text: str):
+    text = text.strip()
+    if text.lower().startswith("datetimeoffset"):
+        text = text[len("datetimeoffset"):]
+    text = text.strip("'\"")
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00")[:19])
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+def filter_clauses(flt: str):
+    """
+    (field, op, epoch seconds or None for null) for every timestamp
+    clause of a $filter. Clauses on other fields are ignored.
+    """
+    clauses = []
+    for clause in re.split(r"\s+and\s+", flt or "", flags=re.IGNORECASE):
+        match = _CLAUSE_RE.match(clause.strip())
+        if not match:
+            continue
+        field, op, value = re.split(r"[/.]", match.group(1))[-1], match.group(2).lower(), match.group(3)
+        if field not in TIME_FIELDS:
+            continue
+        if value.lower() == "null":
+            clauses.append((field, op, None))
+            continue
+        ts = _parse_time(value)
+        if ts is not None:
+            clauses.append((field, op, ts))
+    return clauses
+
+
+def filter_range(flt: str, count: int):
+    """
+    Index range [lo, hi) of the items a $filter selects.
+    """
+    lo, hi = 0, count
+    for _, op, ts in filter_clauses(flt):
+        if ts is None:
+            # Every item carries every timestamp
+            if op == "eq":
+                hi = lo
+            continue
+        # item i is stamped EPOCH + i * STEP_SECONDS
+        pos = (ts - EPOCH) / STEP_SECONDS
+        first_ge = max(0, -int(-pos // 1))   # ceil
+        last_le = int(pos // 1)              # floor
+        if op == "ge":
+            lo = max(lo, first_ge)
+        elif op == "gt":
+            lo = max(lo, last_le + 1)
+        elif op == "lt":
+            hi = min(hi, first_ge)
+        elif op == "le":
+            hi = min(hi, last_le + 1)
+        elif op == "eq":
+            lo, hi = max(lo, first_ge), min(hi, last_le + 1)
+    return lo, max(lo, hi)
+
+
+_COMPARE = {
+    "ge": lambda a, b: a >= b, "gt": lambda a, b: a > b, "le": lambda a, b: a <= b,
+    "lt": lambda a, b: a < b, "eq": lambda a, b: a == b, "ne": lambda a, b: a != b,
+}
+
+
+def synth_filter(flt: str):
+    """
+    Predicate on (firstSeen, updatedDate) for a $filter over synthetic
+    items: createdDate / firstSeen compare with the first, every other
+    timestamp field with the second.
+    """
+    tests = []
+    for field, op, ts in filter_clauses(flt):
+        if ts is None:
+            # Every item carries every timestamp
+            if op == "eq":
+                return lambda first, updated: False
+            continue
+        tests.append((0 if field in ("createdDate", "firstSeen") else 1, _COMPARE[op], ts))
+    return lambda *times: all(compare(times[which], ts) for which, compare, ts in tests)
+
+
+class EASMMock:
+    """
+    Threaded Defender EASM mock with counters. start() returns the base URL.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 assets: int = DEFAULT_ASSETS, control: int = DEFAULT_CONTROL, counts=None,
+                 item_bytes: int = DEFAULT_ITEM_BYTES, page_size: int = DEFAULT_PAGE_SIZE,
+                 max_page_size: int = DEFAULT_MAX_PAGE_SIZE, latency: float = 0.0, jitter: float = 0.0,
+                 token_ttl: int = 3599, seed: int = 1, faults=None, synth=None):
+        self.counts = {
+            name: (assets if inventory else control) for name, (_, _, _, inventory) in COLLECTIONS.items()
+        }
+        for name, count in (counts or {}).items():
+            if name not in COLLECTIONS:
+                raise ValueError(f"Unknown collection: {name}")
+            self.counts[name] = int(count)
+        # EASMSynth serving its asset types instead of the stamped items;
+        # its snapshot can be moved between pulls
+        self.synth = synth
+        self.item_bytes = item_bytes
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.jitter = jitter
+        self.token_ttl = token_ttl
+        unknown = set(faults or ()) - set(FAULT_DEFAULTS) - {"latency"}
+        if unknown:
+            raise ValueError(f"Unknown fault settings: {', '.join(sorted(unknown))}")
+        self.faults = dict(FAULT_DEFAULTS, **{k: v for k, v in (faults or {}).items() if k != "latency"})
+        self.latency = (faults or {}).get("latency", latency)
+
+        self.stats = {"requests": 0, "token_requests": 0, "pages": 0, "items": 0, "bytes": 0,
+                      "unauthorized": 0, "not_found": 0, "max_concurrent": 0, "collections": {},
+                      "throttled": 0, "errors": 0, "resets": 0, "expired": 0, "stalls": 0}
+        self._lock = threading.Lock()
+        self._active = 0
+        # token -> monotonic time it was issued
+        self._tokens = {}
+        # Pages served in full, to tell first fetches from repeats
+        self._served = set()
+        self._started = time.monotonic()
+        self._burst_left = 0
+        self._rng = random.Random(seed)
+        self._filler = "".join(self._rng.choice("abcdefghijklmnopqrstuvwxyz0123456789 ") for _ in range(65536))
+        self._pad = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = {} if key == "collections" else 0
+            self._served.clear()
+            self._started = time.monotonic()
+            self._burst_left = 0
+
+    def summary(self) -> dict:
+        """
+        stats plus distinct_pages (pages served in full at least once) and
+        wasted_requests (every other API request: faults and repeats).
+        """
+        with self._lock:
+            summary = dict(self.stats, collections=dict(self.stats["collections"]))
+            summary["distinct_pages"] = len(self._served)
+        summary["wasted_requests"] = summary["requests"] - summary["distinct_pages"]
+        return summary
+
+    # -------- faults --------
+
+    def _delay(self) -> float:
+        """Seconds before the first byte of one reply. Caller holds _lock."""
+        delay = self.latency
+        if delay and self.faults["latency_sigma"]:
+            delay *= math.exp(self._rng.gauss(0.0, self.faults["latency_sigma"]))
+        if self.jitter:
+            delay += self._rng.random() * self.jitter
+        if self.faults["stall_rate"] and self._rng.random() < self.faults["stall_rate"]:
+            self.stats["stalls"] += 1
+            delay += self.faults["stall_seconds"]
+        return delay
+
+    def _fault(self):
+        """
+        The scripted failure for one API request, if any: ("throttle",
+        retry_after) or ("error", status). Caller holds _lock.
+        """
+        every, length = self.faults["throttle_every"], self.faults["throttle_for"]
+        if every and length:
+            into = (time.monotonic() - self._started) % every
+            if into < length:
+                self.stats["throttled"] += 1
+                return "throttle", max(self.faults["retry_after"], math.ceil(length - into))
+
+        if self._burst_left == 0 and self.faults["error_rate"] and self._rng.random() < self.faults["error_rate"]:
+            self._burst_left = max(1, int(self.faults["error_burst"]))
+        if self._burst_left:
+            self._burst_left -= 1
+            self.stats["errors"] += 1
+            return "error", self._rng.choice(ERROR_STATUSES)
+        return None
+
+    def _token_state(self, token: str):
+        """None (unknown), "expired" or "valid"."""
+        with self._lock:
+            issued = self._tokens.get(token)
+            if issued is None:
+                return None
+            lifetime = self.faults["token_lifetime"]
+            if lifetime and time.monotonic() - issued > lifetime:
+                self.stats["expired"] += 1
+                return "expired"
+            return "valid"
+
+    def synthetic(self, name: str) -> bool:
+        return self.synth is not None and name in EASM_SYNTH_KINDS
+
+    def expected(self, names) -> int:
+        """Items a full pull of these collections returns."""
+        return sum(self.synth.live_count(name) if self.synthetic(name) else self.counts[name] for name in names)
+
+    # -------- items --------
+
+    def _item(self, name: str, i: int) -> dict:
+        _, _, kind, _ = COLLECTIONS[name]
+        ts = iso(EPOCH + i * STEP_SECONDS)
+        label = f"{kind.lower()}-{i:07d}.contoso.example"
+        return {
+            "id": f"{kind}$${label}",
+            "name": label,
+            "displayName": label,
+            "kind": kind,
+            "uuid": f"{i:08x}-0000-4000-8000-{zlib.crc32(name.encode()):012x}",
+            "state": "confirmed",
+            "createdDate": ts,
+            "updatedDate": ts,
+            "firstSeen": ts,
+            "lastSeen": ts,
+            "lastSeenDateTime": ts,
+            "properties": {
+                "lastUpdatedDateTime": ts,
+                "lastSeenDateTime": ts,
+                "sources": [{"source": "seed", "firstSeen": ts, "lastSeen": ts, "count": 1 + i % 7}],
+                "labels": [],
+                "notes": "",
+            },
+        }
+
+    def item_json(self, name: str, i: int) -> str:
+        item = self._item(name, i)
+        pad = self._pad.get(name)
+        if pad is None:
+            # Sized once per collection from item 0
+            pad = max(0, self.item_bytes - len(json.dumps(item, separators=(",", ":"))))
+            pad = self._pad[name] = min(pad, len(self._filler))
+        if pad:
+            start = (i * 7919) % (len(self._filler) - pad + 1)
+            item["properties"]["notes"] = self._filler[start:start + pad]
+        return json.dumps(item, separators=(",", ":"))
+
+    def license_json(self) -> str:
+        now = iso(time.time())
+        return json.dumps({
+            "id": "license",
+            "name": "default",
+            "properties": {
+                "licenseType": "Standard",
+                "assetsLicensed": 100000,
+                "assetsUsed": sum(self.counts.values()),
+                "lastUpdatedDateTime": now,
+            },
+        }, separators=(",", ":"))
+
+    def page(self, name: str, query: dict, link_base: str):
+        """
+        Returns (body, items in the page) for one list request.
+        """
+        if self.synthetic(name):
+            return self._synth_page(name, query, link_base)
+        count = self.counts[name]
+        lo, hi = filter_range(query.get("$filter"), count)
+        size = int(query.get("$top") or self.page_size)
+        size = max(1, min(size, self.max_page_size))
+        skip = max(0, int(query.get("$skip") or 0))
+        descending = (query.get("$orderby") or "").strip().lower().endswith(" desc")
+
+        start, stop = lo + skip, min(hi, lo + skip + size)
+        indexes = range(start, stop)
+        if descending:
+            indexes = range(hi - 1 - skip, max(lo - 1, hi - 1 - skip - size), -1)
+
+        parts = [self.item_json(name, i) for i in indexes]
+        body = '{"value":[' + ",".join(parts) + "]"
+        if query.get("$count", "").lower() == "true":
+            body += f',"@odata.count":{hi - lo}'
+        if skip + len(parts) < hi - lo:
+            following = dict(query, **{"$skip": str(skip + len(parts)), "$top": str(size)})
+            body += ',"nextLink":' + json.dumps(f"{link_base}?{urlencode(following)}")
+        return body + "}", len(parts)
+
+    def _synth_page(self, name: str, query: dict, link_base: str):
+        """
+        page() over the synthetic inventory. $skip is a position in the
+        type (live or not) rather than an item count, and filters are
+        tested item by item. $orderby answers the first page only, which
+        is all the $top=1 bound probes need.
+        """
+        synth = self.synth
+        test = synth_filter(query.get("$filter"))
+        size = int(query.get("$top") or self.page_size)
+        size = max(1, min(size, self.max_page_size))
+        skip = max(0, int(query.get("$skip") or 0))
+        end = synth.size(name)
+
+        def matching(start):
+            for i in range(start, end):
+                if synth.alive(name, i) and test(*synth.times(name, i)):
+                    yield i
+
+        order = (query.get("$orderby") or "").split()
+        following = None
+        if order:
+            which = 0 if re.split(r"[/.]", order[0])[-1] in ("createdDate", "firstSeen") else 1
+            pick = heapq.nlargest if order[-1].lower() == "desc" else heapq.nsmallest
+            indexes = pick(skip + size, matching(0), key=lambda i: synth.times(name, i)[which])[skip:]
+        else:
+            indexes = []
+            scan = matching(skip)
+            for i in scan:
+                indexes.append(i)
+                if len(indexes) == size:
+                    following = i + 1 if i + 1 < end else None
+                    break
+
+        parts = [json.dumps(synth.item(name, i), separators=(",", ":")) for i in indexes]
+        body = '{"value":[' + ",".join(parts) + "]"
+        if query.get("$count", "").lower() == "true":
+            body += f',"@odata.count":{sum(1 for _ in matching(0))}'
+        if following is not None:
+            link = dict(query, **{"$skip": str(following), "$top": str(size)})
+            body += ',"nextLink":' + json.dumps(f"{link_base}?{urlencode(link)}")
+        return body + "}", len(parts)
+
+    # -------- HTTP --------
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: str, headers=None) -> None:
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, str(value))
+                self.end_headers()
+                self.wfile.write(data)
+                with mock._lock:
+                    mock.stats["bytes"] += len(data)
+
+            def _error(self, status: int, code: str, message: str, headers=None) -> None:
+                self._reply(status, json.dumps({"error": {"code": code, "message": message}}), headers)
+
+            def _reset(self, body: str) -> None:
+                # Full Content-Length, half the body, then RST instead of FIN
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data[:len(data) // 2])
+                self.wfile.flush()
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.close_connection = True
+                with mock._lock:
+                    mock.stats["resets"] += 1
+                    mock.stats["bytes"] += len(data) // 2
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                form = dict(parse_qsl(self.rfile.read(length).decode("utf-8")))
+                if not _TOKEN_RE.match(self.path.split("?", 1)[0]):
+                    return self._error(404, "NotFound", "No route")
+                if form.get("grant_type") != "client_credentials" or not form.get("client_id") \
+                        or not form.get("client_secret"):
+                    return self._error(400, "invalid_request", "client credentials are required")
+
+                with mock._lock:
+                    mock.stats["token_requests"] += 1
+                    token = f"mock-{len(mock._tokens) + 1}-{mock._rng.getrandbits(32):08x}"
+                    mock._tokens[token] = time.monotonic()
+                self._reply(200, json.dumps({
+                    "token_type": "Bearer", "expires_in": mock.token_ttl, "ext_expires_in": mock.token_ttl,
+                    "access_token": token,
+                }))
+
+            def do_GET(self):
+                path, _, query_string = self.path.partition("?")
+                query = dict(parse_qsl(query_string, keep_blank_values=True))
+                match = _WORKSPACE_RE.match(path)
+                route = (match.group(1) or "/") if match else path
+                route = route.rstrip("/") or "/"
+
+                with mock._lock:
+                    mock.stats["requests"] += 1
+                    mock._active += 1
+                    mock.stats["max_concurrent"] = max(mock.stats["max_concurrent"], mock._active)
+                    delay = mock._delay()
+                    fault = mock._fault()
+                    reset = mock.faults["reset_rate"] and mock._rng.random() < mock.faults["reset_rate"]
+                try:
+                    if delay:
+                        time.sleep(delay)
+
+                    if fault and fault[0] == "throttle":
+                        return self._error(429, "TooManyRequests", "Rate limit exceeded.",
+                                           {"Retry-After": fault[1]})
+                    if fault:
+                        return self._error(fault[1], "ServiceUnavailable", "Injected server error.")
+
+                    auth = self.headers.get("Authorization") or ""
+                    state = mock._token_state(auth[len("Bearer "):]) if auth.startswith("Bearer ") else None
+                    if state != "valid":
+                        with mock._lock:
+                            mock.stats["unauthorized"] += 1
+                        message = "The access token has expired." if state == "expired" else \
+                            "The access token is invalid."
+                        return self._error(401, "InvalidAuthenticationToken", message)
+
+                    if route == LICENSE_PATH:
+                        with mock._lock:
+                            mock._served.add(self.path)
+                        return self._reply(200, mock.license_json())
+
+                    name = _ROUTES.get((route, query.get("assetType") if route == "/assets" else None))
+                    if name is None:
+                        with mock._lock:
+                            mock.stats["not_found"] += 1
+                        return self._error(404, "NotFound", f"No collection at {route}")
+
+                    host = self.headers.get("Host") or "%s:%s" % mock._server.server_address[:2]
+                    body, items = mock.page(name, query, f"http://{host}{path}")
+                    if reset:
+                        return self._reset(body)
+                    with mock._lock:
+                        mock._served.add(self.path)
+                        mock.stats["pages"] += 1
+                        mock.stats["items"] += items
+                        mock.stats["collections"][name] = mock.stats["collections"].get(name, 0) + items
+                    return self._reply(200, body)
+                finally:
+                    with mock._lock:
+                        mock._active -= 1
+
+        return Handler
+
+
+def parse_counts(values):
+    counts = {}
+    for value in values or ():
+        name, _, count = value.partition("=")
+        counts[name.strip()] = int(count)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--assets", type=int, default=DEFAULT_ASSETS,
+                        help=f"items per inventory collection (default {DEFAULT_ASSETS})")
+    parser.add_argument("--control", type=int, default=DEFAULT_CONTROL,
+                        help=f"items per control-plane collection (default {DEFAULT_CONTROL})")
+    parser.add_argument("--count", action="append", metavar="NAME=N",
+                        help=f"items for one collection ({', '.join(COLLECTIONS)}); repeatable")
+    parser.add_argument("--item-bytes", type=int, default=DEFAULT_ITEM_BYTES,
+                        help=f"approximate JSON size of one item (default {DEFAULT_ITEM_BYTES})")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"items per page without $top (default {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--max-page-size", type=int, default=DEFAULT_MAX_PAGE_SIZE,
+                        help=f"largest $top honoured (default {DEFAULT_MAX_PAGE_SIZE})")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--faults", default="clean", choices=sorted(FAULT_PROFILES),
+                        help="scripted fault profile (default clean)")
+    parser.add_argument("--synth", action="store_true",
+                        help="serve the asset types from easm_synth (--assets items each) instead of stamped items")
+    parser.add_argument("--snapshot", type=int, default=0, help="synthetic snapshot to serve (default 0)")
+    parser.add_argument("--churn", type=float, default=DEFAULT_CHURN,
+                        help=f"synthetic items changed per snapshot (default {DEFAULT_CHURN})")
+    parser.add_argument("--turnover", type=float, default=DEFAULT_TURNOVER,
+                        help=f"synthetic items replaced per snapshot (default {DEFAULT_TURNOVER})")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    counts = parse_counts(args.count)
+    synth = None
+    if args.synth:
+        synth = EASMSynth({n: c for n, c in counts.items() if n in EASM_SYNTH_KINDS}, args.assets, args.seed,
+                          args.churn, args.turnover, args.snapshot)
+    mock = EASMMock(args.host, args.port, args.assets, args.control, counts,
+                    args.item_bytes, args.page_size, args.max_page_size, args.latency, args.jitter,
+                    seed=args.seed, faults=FAULT_PROFILES[args.faults], synth=synth)
+    url = mock.start()
+    print(f"EASM mock listening on {url} (data_plane_endpoint, management_endpoint, authority_url)", flush=True)
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(mock.summary()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
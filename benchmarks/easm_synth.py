@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/easm_synth.py
+
+Microsoft Defender EASM for Splunk App
+Synthetic Defender EASM inventory generator
+
+Produces realistic asset payloads at any scale (100k-10M per type) for
+sizing forwarders and indexers and for benchmarking incremental and
+delta pulls:
+
+- domains, hosts, pages, IP addresses, IP blocks, ASNs, SSL certificates,
+  WHOIS contacts, DNS records and exposure insights, shaped like the
+  service's asset resources (id, kind, name, createdDate, updatedDate,
+  firstSeen, lastSeen, auditTrail, asset {...})
+- cross-references that hang together: a host's domain, its A record and
+  IP address, that address's IP block and the block's ASN, the host's
+  pages and certificate, the domain's WHOIS registrant, and the hosts an
+  exposure insight affects all name each other
+- deterministic and seedable: item i of a type is a pure function of
+  (seed, type, i, snapshot), so any page can be produced on its own and
+  memory stays constant whatever the count
+- snapshots with churn: from one snapshot to the next a --churn fraction
+  of items changes (new updatedDate / lastSeen and mutated fields) and a
+  --turnover fraction disappears while as many new ones appear; items
+  that did not change are byte-identical across snapshots
+
+Write NDJSON, one file per type:
+    python benchmarks/easm_synth.py --count 1000000 --out-dir /tmp/easm
+    python benchmarks/easm_synth.py --kinds hosts --count 100000 --snapshot 3 --churn 0.05 > hosts.ndjson
+
+or serve it through the mock API (easm_mock.py --synth, bench_collectors.py --synth).
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+
+# name -> asset kind; names match the mock collections and all_assets types
+KINDS = {
+    "domains": "domain",
+    "hosts": "host",
+    "pages": "page",
+    "ip_addresses": "ipAddress",
+    "ip_blocks": "ipBlock",
+    "asns": "as",
+    "ssl_certificates": "sslCert",
+    "whois_contacts": "contact",
+    "dns_records": "dnsRecord",
+    "exposure_insights": "exposureInsight",
+}
+_KIND_IDS = {name: i + 1 for i, name in enumerate(KINDS)}
+
+DEFAULT_COUNT = 100_000
+DEFAULT_CHURN = 0.05
+DEFAULT_TURNOVER = 0.01
+DAY = 86400
+
+# Snapshot 0 spreads first sightings over the year before SNAPSHOT_ZERO;
+# snapshot s is taken at SNAPSHOT_ZERO + s * interval
+EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+SPAN = 365 * DAY
+SNAPSHOT_ZERO = EPOCH + SPAN
+
+_MASK = (1 << 64) - 1
+_SALT_REMOVE, _SALT_MODIFY, _SALT_BODY, _SALT_NAME = 1, 2, 3, 4
+
+_SYLLABLES = ("con", "to", "so", "fab", "ri", "kam", "nor", "th", "wind", "tail", "spin", "ad", "ven",
+              "ture", "lit", "ware", "woodg", "rove", "pro", "se", "ware", "blue", "yon", "der", "air")
+_TLDS = ("com", "net", "org", "io", "co.uk", "de", "fr", "com.au", "ca", "nl")
+_SUBDOMAINS = ("www", "mail", "api", "portal", "vpn", "dev", "staging", "cdn", "shop", "auth", "remote", "git")
+_PATHS = ("", "login", "index.html", "about", "contact", "search", "api/v1/health", "wp-login.php", "admin",
+          "products", "support", "blog")
+_WEB_COMPONENTS = (("nginx", "Server"), ("Apache HTTP Server", "Server"), ("Microsoft IIS", "Server"),
+                   ("jQuery", "JavaScript Library"), ("WordPress", "CMS"), ("PHP", "Programming Language"),
+                   ("OpenSSL", "Security"), ("Bootstrap", "Framework"), ("React", "JavaScript Library"))
+_ISSUERS = ("DigiCert TLS RSA SHA256 2020 CA1", "R3", "GTS CA 1C3", "Sectigo RSA Domain Validation Secure Server CA",
+            "Amazon RSA 2048 M02", "GeoTrust TLS RSA CA G1")
+_REGISTRARS = ("MarkMonitor Inc.", "GoDaddy.com, LLC", "Gandi SAS", "Namecheap, Inc.", "CSC Corporate Domains, Inc.")
+_COUNTRIES = (("US", "United States", "Virginia"), ("NL", "Netherlands", "Noord-Holland"),
+              ("DE", "Germany", "Hessen"), ("GB", "United Kingdom", "England"), ("SG", "Singapore", "Singapore"),
+              ("AU", "Australia", "New South Wales"), ("JP", "Japan", "Tokyo"))
+_DNS_TYPES = ("A", "CNAME", "MX", "TXT", "NS")
+_INSIGHTS = (
+    ("Expired SSL certificate", "high", "configuration", None),
+    ("SSL certificate expiring within 30 days", "medium", "configuration", None),
+    ("Deprecated TLS 1.0 enabled", "medium", "configuration", None),
+    ("Exposed login page over HTTP", "medium", "exposure", None),
+    ("Apache HTTP Server path traversal", "high", "vulnerability", "CVE-2021-41773"),
+    ("OpenSSL infinite loop in BN_mod_sqrt", "high", "vulnerability", "CVE-2022-0778"),
+    ("WordPress core SQL injection", "high", "vulnerability", "CVE-2022-21661"),
+    ("jQuery cross-site scripting", "medium", "vulnerability", "CVE-2020-11023"),
+    ("Open RDP port", "high", "exposure", None),
+    ("Dangling CNAME record", "medium", "configuration", None),
+)
+
+
+def _fmix(h: int) -> int:
+    # splitmix64 finalizer
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK
+    return h ^ (h >> 31)
+
+
+def _mix(*values: int) -> int:
+    h = 0
+    for v in values:
+        h = _fmix((h + v + 0x9E3779B97F4A7C15) & _MASK)
+    return h
+
+
+def iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _base36(n: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if not n:
+            return out
+
+
+def _dotted(addr: int) -> str:
+    return f"{(addr >> 24) & 255}.{(addr >> 16) & 255}.{(addr >> 8) & 255}.{addr & 255}"
+
+
+class EASMSynth:
+    """
+    Random-access synthetic inventory. item(name, i) builds item i of a
+    type at the current snapshot, or returns None if it does not exist
+    there; iter_items() streams a whole type.
+    """
+
+    def __init__(self, counts=None, count: int = DEFAULT_COUNT, seed: int = 1,
+                 churn: float = DEFAULT_CHURN, turnover: float = DEFAULT_TURNOVER,
+                 snapshot: int = 0, interval: int = DAY):
+        self.counts = {name: count for name in KINDS}
+        for name, n in (counts or {}).items():
+            if name not in KINDS:
+                raise ValueError(f"Unknown asset type: {name}")
+            self.counts[name] = max(1, int(n))
+        self.seed = seed
+        self.churn = churn
+        self.turnover = turnover
+        self.snapshot = snapshot
+        self.interval = interval
+
+        self._churn_cut = int(churn * (1 << 64))
+        self._turnover_cut = int(turnover * (1 << 64))
+        # Addresses per IP block, with headroom for the addresses that
+        # turnover adds later
+        per_block = -(-self.counts["ip_addresses"] // self.counts["ip_blocks"])
+        self._block_size = 4
+        while self._block_size < 4 * per_block + 2:
+            self._block_size *= 2
+
+    # -------- snapshots --------
+
+    def snapshot_time(self, s: int) -> int:
+        return SNAPSHOT_ZERO + s * self.interval
+
+    def added(self, name: str) -> int:
+        """New items per snapshot (as many as turnover removes)."""
+        return round(self.counts[name] * self.turnover)
+
+    def size(self, name: str) -> int:
+        """Positions in the type at the current snapshot, live or not."""
+        return self.counts[name] + self.snapshot * self.added(name)
+
+    def born(self, name: str, i: int) -> int:
+        n = self.counts[name]
+        return 0 if i < n else 1 + (i - n) // max(1, self.added(name))
+
+    def alive(self, name: str, i: int) -> bool:
+        born = self.born(name, i)
+        if born > self.snapshot:
+            return False
+        kind_id = _KIND_IDS[name]
+        for s in range(born + 1, self.snapshot + 1):
+            if _mix(self.seed, kind_id, i, s, _SALT_REMOVE) < self._turnover_cut:
+                return False
+        return True
+
+    def version(self, name: str, i: int) -> int:
+        """Snapshot item i last changed in (its birth if never since)."""
+        born = self.born(name, i)
+        kind_id = _KIND_IDS[name]
+        for s in range(self.snapshot, born, -1):
+            if _mix(self.seed, kind_id, i, s, _SALT_MODIFY) < self._churn_cut:
+                return s
+        return born
+
+    def first_seen(self, name: str, i: int) -> int:
+        n = self.counts[name]
+        if i < n:
+            return EPOCH + i * SPAN // n
+        added = max(1, self.added(name))
+        born = self.born(name, i)
+        # Strictly between the two snapshots
+        return self.snapshot_time(born - 1) + (1 + (i - n) % added) * self.interval // (added + 1)
+
+    def times(self, name: str, i: int):
+        """(firstSeen, updatedDate) of item i, as epoch seconds."""
+        first = self.first_seen(name, i)
+        version = self.version(name, i)
+        return first, (first if version == self.born(name, i) else self.snapshot_time(version))
+
+    def live_count(self, name: str) -> int:
+        return sum(1 for i in range(self.size(name)) if self.alive(name, i))
+
+    def changed_count(self, name: str) -> int:
+        """Live items new or changed in the current snapshot."""
+        s = self.snapshot
+        return sum(1 for i in range(self.size(name)) if self.alive(name, i) and self.version(name, i) == s)
+
+    def iter_items(self, name: str, start: int = 0):
+        """Yields (position, item) for every live item from start on."""
+        for i in range(start, self.size(name)):
+            if self.alive(name, i):
+                yield i, self.item(name, i)
+
+    # -------- names (stable across snapshots) --------
+
+    def domain(self, d: int) -> str:
+        h = _mix(self.seed, _SALT_NAME, 1, d)
+        stem = "".join(_SYLLABLES[(h >> (6 * k)) % len(_SYLLABLES)] for k in range(2 + h % 2))
+        return f"{stem}{_base36(d)}.{_TLDS[(h >> 20) % len(_TLDS)]}"
+
+    def host(self, h: int) -> str:
+        nd = self.counts["domains"]
+        slot = h // nd
+        sub = _SUBDOMAINS[slot % len(_SUBDOMAINS)]
+        if slot >= len(_SUBDOMAINS):
+            sub += str(slot // len(_SUBDOMAINS))
+        return f"{sub}.{self.domain(h % nd)}"
+
+    def ip_block(self, b: int):
+        """(cidr, first address) of block b."""
+        size = self._block_size
+        base = (0x14000000 + b * size) & 0xFFFFFFFF
+        return f"{_dotted(base)}/{32 - size.bit_length() + 1}", base
+
+    def ip_address(self, j: int) -> str:
+        nb = self.counts["ip_blocks"]
+        _, base = self.ip_block(j % nb)
+        return _dotted(base + 1 + (j // nb) % (self._block_size - 2))
+
+    def asn(self, a: int) -> int:
+        return 4200000000 + a
+
+    def host_ip(self, h: int) -> int:
+        return h % self.counts["ip_addresses"]
+
+    def ssl_sha1(self, c: int) -> str:
+        return hashlib.sha1(f"{self.seed}:cert:{c}".encode()).hexdigest()
+
+    def contact_email(self, w: int) -> str:
+        return f"hostmaster{_base36(w)}@{self.domain(w % self.counts['domains'])}"
+
+    # -------- items --------
+
+    def item(self, name: str, i: int):
+        if not self.alive(name, i):
+            return None
+        first, updated = self.times(name, i)
+        rng = _mix(self.seed, _KIND_IDS[name], i, self.version(name, i), _SALT_BODY)
+        return getattr(self, f"_{name}")(i, iso(first), iso(updated), rng)
+
+    def _resource(self, kind: str, name: str, first: str, updated: str, rng: int, asset: dict, trail=None):
+        return {
+            "id": f"{kind}$${name}",
+            "kind": kind,
+            "name": name,
+            "displayName": name,
+            "uuid": f"{rng & 0xFFFFFFFF:08x}-{(rng >> 32) & 0xFFFF:04x}-4{(rng >> 48) & 0xFFF:03x}-8000-"
+                    f"{_mix(rng, 1) & 0xFFFFFFFFFFFF:012x}",
+            "createdDate": first,
+            "updatedDate": updated,
+            "firstSeen": first,
+            "lastSeen": updated,
+            "lastSeenDateTime": updated,
+            "state": "confirmed" if rng % 10 else "candidate",
+            "externalId": None,
+            "labels": [],
+            "wildcard": False,
+            "discoGroupName": "Synthetic",
+            "auditTrail": trail or [],
+            "reason": None,
+            "asset": asset,
+            "properties": {"lastUpdatedDateTime": updated, "lastSeenDateTime": updated},
+        }
+
+    def _location(self, rng: int) -> dict:
+        code, country, region = _COUNTRIES[(rng >> 8) % len(_COUNTRIES)]
+        return {"countryCode": code, "countryName": country, "region": region, "latitude": 0.0, "longitude": 0.0}
+
+    def _sources(self, first: str, updated: str, rng: int) -> list:
+        return [{"source": "crawl" if rng & 1 else "dns", "firstSeen": first, "lastSeen": updated,
+                 "count": 1 + rng % 97}]
+
+    def _web_components(self, rng: int) -> list:
+        out = []
+        for k in range(1 + rng % 3):
+            name, kind = _WEB_COMPONENTS[(rng >> (4 * k)) % len(_WEB_COMPONENTS)]
+            out.append({"name": name, "type": kind, "version": f"{1 + (rng >> (8 + k)) % 9}.{(rng >> 20) % 30}",
+                        "cves": []})
+        return out
+
+    def _domains(self, d, first, updated, rng):
+        name = self.domain(d)
+        nw = self.counts["whois_contacts"]
+        registrar = _REGISTRARS[rng % len(_REGISTRARS)]
+        return self._resource("domain", name, first, updated, rng, {
+            "domain": name,
+            "whoisId": d,
+            "registrarNames": [{"value": registrar, "firstSeen": first, "lastSeen": updated}],
+            "registrantContacts": [{"value": self.contact_email(d % nw), "firstSeen": first, "lastSeen": updated}],
+            "nameServers": [{"value": f"ns{k + 1}.{name}", "firstSeen": first, "lastSeen": updated} for k in range(2)],
+            "mailServers": [{"value": f"mail.{name}", "firstSeen": first, "lastSeen": updated}],
+            "registrarExpiresAt": [{"value": iso(SNAPSHOT_ZERO + (rng % 730) * DAY)}],
+            "sources": self._sources(first, updated, rng),
+        })
+
+    def _hosts(self, h, first, updated, rng):
+        name = self.host(h)
+        domain = self.domain(h % self.counts["domains"])
+        return self._resource("host", name, first, updated, rng, {
+            "host": name,
+            "domain": domain,
+            "ipAddresses": [{"value": self.ip_address(self.host_ip(h)), "firstSeen": first, "lastSeen": updated}],
+            "cnames": [],
+            "sslCerts": [{"sha1": self.ssl_sha1(h % self.counts["ssl_certificates"]), "firstSeen": first,
+                          "lastSeen": updated}],
+            "webComponents": self._web_components(rng),
+            "location": [self._location(rng)],
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": domain, "name": domain, "kind": "domain", "reason": "Host of domain"}])
+
+    def _pages(self, p, first, updated, rng):
+        nh = self.counts["hosts"]
+        host = self.host(p % nh)
+        path = _PATHS[(p // nh) % len(_PATHS)]
+        if p // nh >= len(_PATHS):
+            path = f"{path or 'page'}/{p // nh // len(_PATHS)}"
+        url = f"https://{host}/{path}"
+        status = (200, 200, 200, 301, 302, 403, 404, 500)[rng % 8]
+        return self._resource("page", url, first, updated, rng, {
+            "url": url,
+            "host": host,
+            "domain": self.domain((p % nh) % self.counts["domains"]),
+            "ipAddresses": [{"value": self.ip_address(self.host_ip(p % nh)), "firstSeen": first,
+                             "lastSeen": updated}],
+            "httpResponseCodes": [{"value": status, "firstSeen": first, "lastSeen": updated}],
+            "contentTypes": [{"value": "text/html", "firstSeen": first, "lastSeen": updated}],
+            "titles": [{"value": f"{host} - {path or 'home'}", "firstSeen": first, "lastSeen": updated}],
+            "webComponents": self._web_components(rng),
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": host, "name": host, "kind": "host", "reason": "Page on host"}])
+
+    def _ip_addresses(self, j, first, updated, rng):
+        nb = self.counts["ip_blocks"]
+        address = self.ip_address(j)
+        cidr, _ = self.ip_block(j % nb)
+        asn = self.asn((j % nb) % self.counts["asns"])
+        nh = self.counts["hosts"]
+        hosts = [self.host(h) for h in range(j, min(j + 2 * self.counts["ip_addresses"], nh),
+                                             self.counts["ip_addresses"])]
+        return self._resource("ipAddress", address, first, updated, rng, {
+            "ipAddress": address,
+            "ipBlocks": [{"ipBlock": cidr, "firstSeen": first, "lastSeen": updated}],
+            "asns": [{"value": str(asn), "firstSeen": first, "lastSeen": updated}],
+            "hosts": [{"value": h, "firstSeen": first, "lastSeen": updated} for h in hosts],
+            "location": [self._location(rng)],
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": cidr, "name": cidr, "kind": "ipBlock", "reason": "Address in block"}])
+
+    def _ip_blocks(self, b, first, updated, rng):
+        cidr, _ = self.ip_block(b)
+        asn = self.asn(b % self.counts["asns"])
+        return self._resource("ipBlock", cidr, first, updated, rng, {
+            "ipBlock": cidr,
+            "asns": [{"value": str(asn), "firstSeen": first, "lastSeen": updated}],
+            "netNames": [{"value": f"NET-{cidr.replace('.', '-').replace('/', '-')}"}],
+            "orgNames": [{"value": f"Synthetic Networks {b % 97}"}],
+            "location": [self._location(rng)],
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": str(asn), "name": str(asn), "kind": "as", "reason": "Block announced by ASN"}])
+
+    def _asns(self, a, first, updated, rng):
+        asn = str(self.asn(a))
+        return self._resource("as", asn, first, updated, rng, {
+            "asn": int(asn),
+            "asNames": [{"value": f"SYNTH-AS{a}", "firstSeen": first, "lastSeen": updated}],
+            "orgNames": [{"value": f"Synthetic Networks {a % 97}", "firstSeen": first, "lastSeen": updated}],
+            "registries": [{"value": ("ARIN", "RIPE NCC", "APNIC")[rng % 3]}],
+            "sources": self._sources(first, updated, rng),
+        })
+
+    def _ssl_certificates(self, c, first, updated, rng):
+        sha1 = self.ssl_sha1(c)
+        host = self.host(c % self.counts["hosts"])
+        not_before = SNAPSHOT_ZERO - (rng % 300) * DAY
+        return self._resource("sslCert", sha1, first, updated, rng, {
+            "sha1": sha1,
+            "subjectCommonNames": [host],
+            "subjectAlternativeNames": [host, host.split(".", 1)[1]],
+            "issuerCommonNames": [_ISSUERS[rng % len(_ISSUERS)]],
+            "serialNumber": f"{_mix(rng, 2):016x}",
+            "invalidBefore": iso(not_before),
+            "invalidAfter": iso(not_before + (90 if rng & 1 else 397) * DAY),
+            "keyAlgorithm": "RSA" if rng % 3 else "EC",
+            "keySize": 2048 if rng % 3 else 256,
+            "selfSigned": rng % 50 == 0,
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": host, "name": host, "kind": "host", "reason": "Certificate served by host"}])
+
+    def _whois_contacts(self, w, first, updated, rng):
+        email = self.contact_email(w)
+        nd, nw = self.counts["domains"], self.counts["whois_contacts"]
+        domains = [self.domain(d) for d in range(w, min(w + 3 * nw, nd), nw)]
+        return self._resource("contact", email, first, updated, rng, {
+            "email": email,
+            "names": [{"value": f"Hostmaster {_base36(w).upper()}"}],
+            "organizations": [{"value": f"Synthetic Holdings {w % 211}"}],
+            "phones": [{"value": f"+1.555{rng % 10000000:07d}"}],
+            "domains": [{"value": d, "firstSeen": first, "lastSeen": updated} for d in domains],
+            "sources": self._sources(first, updated, rng),
+        })
+
+    def _dns_records(self, r, first, updated, rng):
+        nh = self.counts["hosts"]
+        host = self.host(r % nh)
+        rtype = _DNS_TYPES[(r // nh) % len(_DNS_TYPES)]
+        value = {
+            "A": self.ip_address(self.host_ip(r % nh)),
+            "CNAME": f"edge{rng % 40}.cdn.{host.split('.', 1)[1]}",
+            "MX": f"10 mail.{host.split('.', 1)[1]}",
+            "TXT": f"v=spf1 include:_spf.{host.split('.', 1)[1]} ~all",
+            "NS": f"ns1.{host.split('.', 1)[1]}",
+        }[rtype]
+        name = f"{host}/{rtype}/{r // nh}"
+        return self._resource("dnsRecord", name, first, updated, rng, {
+            "name": host,
+            "type": rtype,
+            "value": value,
+            "ttl": (60, 300, 3600, 86400)[rng % 4],
+            "sources": self._sources(first, updated, rng),
+        }, [{"id": host, "name": host, "kind": "host", "reason": "Record of host"}])
+
+    def _exposure_insights(self, e, first, updated, rng):
+        title, severity, category, cve = _INSIGHTS[e % len(_INSIGHTS)]
+        nh = self.counts["hosts"]
+        affected = [(rng >> (16 * k)) % nh for k in range(1 + rng % 3)]
+        return {
+            "id": f"insight-{_base36(e)}",
+            "name": title,
+            "createdDate": first,
+            "updatedDate": updated,
+            "firstSeen": first,
+            "lastSeen": updated,
+            "properties": {
+                "title": title,
+                "severity": severity,
+                "category": category,
+                "cveIds": [cve] if cve else [],
+                "cvssScore": {"high": 8.1, "medium": 5.3}[severity],
+                "firstSeenDateTime": first,
+                "lastUpdatedDateTime": updated,
+                "affectedAssets": [
+                    {"id": f"host$${self.host(h)}", "kind": "host", "name": self.host(h)} for h in affected
+                ],
+            },
+        }
+
+
+def parse_counts(values):
+    counts = {}
+    for value in values or ():
+        name, _, count = value.partition("=")
+        counts[name.strip()] = int(count)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", default="all", help=f"comma-separated types, or 'all' ({', '.join(KINDS)})")
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT,
+                        help=f"items per type at snapshot 0 (default {DEFAULT_COUNT:,})")
+    parser.add_argument("--type-count", action="append", metavar="NAME=N", help="items for one type; repeatable")
+    parser.add_argument("--snapshot", type=int, default=0, help="snapshot to write (default 0)")
+    parser.add_argument("--churn", type=float, default=DEFAULT_CHURN,
+                        help=f"fraction of items changed per snapshot (default {DEFAULT_CHURN})")
+    parser.add_argument("--turnover", type=float, default=DEFAULT_TURNOVER,
+                        help=f"fraction of items replaced per snapshot (default {DEFAULT_TURNOVER})")
+    parser.add_argument("--interval", type=int, default=DAY, help="seconds between snapshots (default 1 day)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out-dir", help="write <type>.ndjson files here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    names = list(KINDS) if args.kinds.strip().lower() == "all" else \
+        [n.strip() for n in args.kinds.split(",") if n.strip()]
+    unknown = [n for n in names if n not in KINDS]
+    if unknown:
+        parser.error(f"unknown types: {', '.join(unknown)}")
+
+    synth = EASMSynth(parse_counts(args.type_count), args.count, args.seed, args.churn, args.turnover,
+                      args.snapshot, args.interval)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    for name in names:
+        out = open(os.path.join(args.out_dir, f"{name}.ndjson"), "w", encoding="utf-8") if args.out_dir \
+            else sys.stdout
+        started = time.perf_counter()
+        items = nbytes = 0
+        try:
+            for _, item in synth.iter_items(name):
+                line = json.dumps(item, separators=(",", ":")) + "\n"
+                out.write(line)
+                items += 1
+                nbytes += len(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {items:,} items, {nbytes / 1e6:.1f} MB in {elapsed:.1f}s "
+              f"({items / max(elapsed, 1e-9):,.0f} items/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
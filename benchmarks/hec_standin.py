@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks/hec_standin.py
+
+Microsoft Defender EASM for Splunk App
+Local HTTP Event Collector stand-in
+
+Accepts POST /services/collector/event (and /services/collector) the way
+a Splunk HEC endpoint does:
+
+- Authorization: Splunk <token> is checked (401 / code 4 otherwise)
+- Content-Encoding: gzip bodies are decompressed
+- the body is a sequence of JSON event envelopes, counted and optionally
+  appended to a file as one envelope per line
+- optional per-request latency and a 503 "server is busy" rate, to see
+  retries and batches in flight
+- optional indexer acknowledgement: with --ack every POST needs an
+  X-Splunk-Request-Channel header and returns an ackId, which
+  POST /services/collector/ack reports true after --ack-delay seconds
+  (--ack-loss drops that fraction of acks, to exercise resends)
+
+Run standalone and point the app at it (output_mode = hec,
+hec_url = http://127.0.0.1:8088, hec_verify_ssl = false):
+    python benchmarks/hec_standin.py --port 8088 --token 00000000-0000-0000-0000-000000000000
+
+or import HECStandIn from a benchmark.
+"""
+
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HEC_PATHS = ("/services/collector/event", "/services/collector")
+HEC_ACK_PATH = "/services/collector/ack"
+
+_decoder = json.JSONDecoder()
+
+
+def iter_envelopes(text: str):
+    """
+    HEC bodies are JSON objects back to back, optionally whitespace-separated.
+    """
+    pos, end = 0, len(text)
+    while True:
+        while pos < end and text[pos] in " \t\r\n":
+            pos += 1
+        if pos >= end:
+            return
+        obj, pos = _decoder.raw_decode(text, pos)
+        yield obj
+
+
+class HECStandIn:
+    """
+    Threaded HEC stand-in with counters. start() returns the base URL.
+    """
+
+    def __init__(self, token: str, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, busy_rate: float = 0.0, out=None, seed: int = 1,
+                 ack: bool = False, ack_delay: float = 0.0, ack_loss: float = 0.0):
+        self.token = token
+        self.latency = latency
+        self.busy_rate = busy_rate
+        self.ack = ack
+        self.ack_delay = ack_delay
+        self.ack_loss = ack_loss
+        # channel -> {ackId: monotonic time it reports true}; lost acks are never added
+        self.channels: dict = {}
+        self._next_ack: dict = {}
+        self.out = out
+        self.events: list = []
+        self.keep_events = False
+        self.stats = {"requests": 0, "events": 0, "bytes": 0, "wire_bytes": 0, "busy": 0, "max_concurrent": 0,
+                      "ack_polls": 0, "acks_lost": 0}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, text: str, code: int) -> None:
+                self._reply_json(status, {"text": text, "code": code})
+
+            def _reply_json(self, status: int, obj) -> None:
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _channel(self):
+                channel = self.headers.get("X-Splunk-Request-Channel")
+                if not channel:
+                    query = self.path.split("?", 1)[1] if "?" in self.path else ""
+                    for part in query.split("&"):
+                        if part.startswith("channel="):
+                            channel = part[len("channel="):]
+                return channel
+
+            def _ack(self, wire: bytes):
+                channel = self._channel()
+                if not standin.ack:
+                    return self._reply(400, "ACK is disabled", 14)
+                if not channel:
+                    return self._reply(400, "Data channel is missing", 10)
+                ids = json.loads(wire or b"{}").get("acks") or []
+                now = time.monotonic()
+                with standin._lock:
+                    standin.stats["ack_polls"] += 1
+                    pending = standin.channels.get(channel, {})
+                    acks = {}
+                    for ack_id in ids:
+                        ready = pending.get(ack_id)
+                        acks[str(ack_id)] = ready is not None and ready <= now
+                        if acks[str(ack_id)]:
+                            del pending[ack_id]
+                return self._reply_json(200, {"acks": acks})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                wire = self.rfile.read(length)
+                path = self.path.split("?", 1)[0]
+
+                if path not in HEC_PATHS and path != HEC_ACK_PATH:
+                    return self._reply(404, "Not Found", 404)
+                if self.headers.get("Authorization") != f"Splunk {standin.token}":
+                    return self._reply(401, "Invalid token", 4)
+                if path == HEC_ACK_PATH:
+                    return self._ack(wire)
+                channel = self._channel()
+                if standin.ack and not channel:
+                    return self._reply(400, "Data channel is missing", 10)
+
+                with standin._lock:
+                    standin.stats["requests"] += 1
+                    standin._active += 1
+                    standin.stats["max_concurrent"] = max(standin.stats["max_concurrent"], standin._active)
+                    busy = standin.busy_rate and standin._rng.random() < standin.busy_rate
+                try:
+                    if standin.latency:
+                        time.sleep(standin.latency)
+                    if busy:
+                        with standin._lock:
+                            standin.stats["busy"] += 1
+                        return self._reply(503, "Server is busy", 9)
+
+                    body = wire
+                    if (self.headers.get("Content-Encoding") or "").lower() == "gzip":
+                        body = gzip.decompress(wire)
+                    try:
+                        envelopes = list(iter_envelopes(body.decode("utf-8")))
+                    except ValueError:
+                        return self._reply(400, "Invalid data format", 6)
+                    if any("event" not in e for e in envelopes):
+                        return self._reply(400, "Event field is required", 12)
+
+                    ack_id = None
+                    with standin._lock:
+                        standin.stats["events"] += len(envelopes)
+                        standin.stats["bytes"] += len(body)
+                        standin.stats["wire_bytes"] += len(wire)
+                        if standin.keep_events:
+                            standin.events.extend(envelopes)
+                        if standin.out is not None:
+                            for e in envelopes:
+                                standin.out.write(json.dumps(e) + "\n")
+                        if standin.ack:
+                            ack_id = standin._next_ack.get(channel, 0)
+                            standin._next_ack[channel] = ack_id + 1
+                            if standin.ack_loss and standin._rng.random() < standin.ack_loss:
+                                standin.stats["acks_lost"] += 1
+                            else:
+                                standin.channels.setdefault(channel, {})[ack_id] = time.monotonic() + standin.ack_delay
+                    if ack_id is None:
+                        return self._reply(200, "Success", 0)
+                    return self._reply_json(200, {"text": "Success", "code": 0, "ackId": ack_id})
+                finally:
+                    with standin._lock:
+                        standin._active -= 1
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--busy-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--ack", action="store_true", help="require channels and return ackIds (hec_ack = true)")
+    parser.add_argument("--ack-delay", type=float, default=0.0, help="seconds until an ackId reports true")
+    parser.add_argument("--ack-loss", type=float, default=0.0, help="fraction of ackIds never reported true")
+    parser.add_argument("--out", help="append received envelopes to this file, one per line")
+    args = parser.parse_args(argv)
+
+    out = open(args.out, "a", encoding="utf-8") if args.out else None
+    standin = HECStandIn(args.token, args.host, args.port, args.latency, args.busy_rate, out,
+                         ack=args.ack, ack_delay=args.ack_delay, ack_loss=args.ack_loss)
+    print(f"HEC stand-in listening on {standin.start()}", flush=True)
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(standin.stats), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
+        if out is not None:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
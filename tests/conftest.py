@@ -0,0 +1,222 @@
+"""
+tests/conftest.py
+Microsoft Defender EASM for Splunk App
+Shared fixtures: import path, splunkd stand-in, a throwaway SPLUNK_HOME,
+a fake list-page API and in-process modular input runs against the
+benchmark mocks
+
+Run from the repository root:
+    python -m pytest -q
+"""
+
+import io
+import os
+import json
+import sys
+import signal
+from xml.sax.saxutils import escape, quoteattr
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, os.path.join(ROOT, "Microsoft_Defender_EASM_For_Splunk", "bin"))
+
+from bench_collectors import install_splunkd_stub  # noqa: E402
+
+try:
+    import splunk.rest
+except ImportError:
+    install_splunkd_stub({}, {})
+    import splunk.rest
+
+from splunklib.modularinput import EventWriter  # noqa: E402
+
+import defender_easm_common as common  # noqa: E402
+import defender_easm_ratelimit  # noqa: E402
+from easm_mock import EASMMock  # noqa: E402
+from hec_standin import HECStandIn  # noqa: E402
+
+SESSION_KEY = "test-session-key"
+HEC_TOKEN = "00000000-0000-0000-0000-00000000000a"
+
+
+@pytest.fixture(autouse=True)
+def splunk_home(tmp_path, monkeypatch):
+    """
+    Points SPLUNK_HOME (state.db, checkpoints, ratelimit.json) at a fresh
+    directory and drops the per-process singletons built on the old one.
+    """
+    monkeypatch.setenv("SPLUNK_HOME", str(tmp_path))
+    monkeypatch.setattr(defender_easm_ratelimit, "_rate_limiter", None)
+    yield tmp_path
+    common.close_state_store()
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """
+    Makes backoff delays instant.
+    """
+    monkeypatch.setattr(defender_easm_ratelimit.time, "sleep", lambda seconds: None)
+
+
+class FakePage:
+    """
+    One list page; iterating it is logged as ("read", item) when a log
+    is given.
+    """
+
+    def __init__(self, items, next_link, log=None):
+        self.items = items
+        self.next_link = next_link
+        self.count = len(items)
+        self.log = log
+
+    def __iter__(self):
+        for item in self.items:
+            if self.log is not None:
+                self.log.append(("read", item))
+            yield item
+
+    def close(self):
+        pass
+
+
+class FakeAPI:
+    """
+    Serves list pages to the resumable and partitioned listings.
+
+    Each walk (the request's $filter, "page" without one) has its own
+    pages of raw {"id": ...} items; cursors are "<walk>/<n>" and the
+    listing path is page 0. pages fixes the "page" walk; other walks get
+    two pages of page_items ids each (none for an "eq null" slice).
+    get() rejects $count, as some services do.
+    """
+
+    def __init__(self, pages=None, page_items=4, path="/assets"):
+        self.path = path
+        self.page_items = page_items
+        self.slices = {} if pages is None else {"page": pages}
+        self.log = []
+        self.walks = []
+        self.starts = []
+
+    @property
+    def pages(self):
+        return self.slices["page"]
+
+    def _pages(self, walk):
+        if "eq null" in walk:
+            return [[]]
+        n = len(self.slices)
+        return [[f"s{n}-{p}-{i}" for i in range(self.page_items)] for p in range(2)]
+
+    def everything(self):
+        return sorted(i for pages in self.slices.values() for page in pages for i in page)
+
+    def list_pages(self, start, params=None, raw=False):
+        self.starts.append(start)
+        if start == self.path:
+            walk, first = (params or {}).get("$filter", "page"), 0
+        else:
+            walk, first = start.rsplit("/", 1)
+        self.walks.append((walk, int(first), params))
+        pages = self.slices.setdefault(walk, self._pages(walk))
+        for p in range(int(first), len(pages)):
+            link = f"{walk}/{p + 1}" if p + 1 < len(pages) else None
+            yield FakePage([json.dumps({"id": item}) for item in pages[p]], link, self.log)
+
+    def get(self, path, params=None):
+        # Planning probes: this service rejects $count
+        if "$count" in (params or {}):
+            raise common.EASMAPIError("$count is not supported", 400, path)
+        raise AssertionError(f"unexpected GET {path} {params}")
+
+
+@pytest.fixture
+def fake_api():
+    """
+    FakeAPI factory: fake_api(pages=None, page_items=4).
+    """
+    return FakeAPI
+
+
+@pytest.fixture
+def easm_mock():
+    """
+    Local Defender EASM mock (token endpoint and both API planes) holding
+    a few items per collection.
+    """
+    mock = EASMMock(assets=5, control=5)
+    mock.start()
+    yield mock
+    mock.stop()
+
+
+@pytest.fixture
+def splunkd(easm_mock, monkeypatch):
+    """
+    The app settings and secrets splunkd answers with, pointed at
+    easm_mock. Edit them before running an input.
+    """
+    settings = {
+        "tenant_id": "00000000-0000-0000-0000-000000000001",
+        "client_id": "00000000-0000-0000-0000-000000000002",
+        "subscription_id": "00000000-0000-0000-0000-000000000003",
+        "resource_group": "test-rg",
+        "workspace_name": "test-ws",
+        "authority_url": easm_mock.url,
+        "data_plane_endpoint": easm_mock.url,
+        "management_endpoint": easm_mock.url,
+    }
+    secrets = {"client_secret": "test-client-secret"}
+    monkeypatch.setattr(splunk.rest, "simpleRequest", splunk.rest.simpleRequest)
+    install_splunkd_stub(settings, secrets)
+    yield {"settings": settings, "secrets": secrets}
+    common.invalidate_config_cache()
+
+
+@pytest.fixture
+def hec(splunkd):
+    """
+    HEC stand-in keeping every envelope it receives; splunkd is switched
+    to output_mode = hec against it.
+    """
+    standin = HECStandIn(HEC_TOKEN)
+    standin.keep_events = True
+    standin.start()
+    splunkd["settings"].update(output_mode="hec", hec_url=standin.url, hec_verify_ssl="false")
+    splunkd["secrets"]["hec_token"] = HEC_TOKEN
+    yield standin
+    standin.stop()
+
+
+@pytest.fixture
+def run_input(splunkd):
+    """
+    Runs a modular input in-process the way splunkd does: run_input(script,
+    stanza, **params) feeds it the input definition and returns
+    (exit code, stdout). SIGTERM / SIGINT handlers it installs are undone.
+    """
+    handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+    def run(script, stanza: str, **params):
+        common.invalidate_config_cache()
+        body = "".join(f"<param name={quoteattr(k)}>{escape(str(v))}</param>" for k, v in params.items())
+        definition = (
+            "<input>"
+            "<server_host>test</server_host>"
+            "<server_uri>https://127.0.0.1:8089</server_uri>"
+            f"<session_key>{SESSION_KEY}</session_key>"
+            "<checkpoint_dir>/tmp</checkpoint_dir>"
+            f"<configuration><stanza name={quoteattr(stanza)}>{body}</stanza></configuration>"
+            "</input>"
+        )
+        out, err = io.StringIO(), io.StringIO()
+        code = script().run_script([stanza], EventWriter(out, err), io.StringIO(definition))
+        return code, out.getvalue()
+
+    yield run
+    for sig, handler in handlers.items():
+        signal.signal(sig, handler)
@@ -0,0 +1,87 @@
+"""
+tests/test_adaptive_paging.py
+Microsoft Defender EASM for Splunk App
+Adaptive $top only on data-plane listings; nextLinks followed as returned
+"""
+
+import defender_easm_common as common
+import defender_easm_http
+from test_page_stream import BASE_URL, FakeResponse, FakeSession, page_body
+
+# An opaque server link: its own page-size knob and a continuation token
+NEXT_LINK = f"{BASE_URL}/assets?maxpagesize=25&$skiptoken=abc%3D%3D"
+
+
+def client(session, plane="data"):
+    return common.EASMAPIClient(
+        BASE_URL,
+        session=session,
+        api_version=None,
+        prefetch_pages=0,
+        plane=plane,
+        rate_limiter=common.EASMRateLimiter(rate=1000.0, burst=1000.0),
+    )
+
+
+def walk(api, path, params=None):
+    seen = []
+    for page in api.list_pages(path, params=params):
+        seen.extend(item["id"] for item in page)
+    return seen
+
+
+def two_pages():
+    return FakeSession(
+        FakeResponse(None, page_body(range(3), next_link=NEXT_LINK)),
+        FakeResponse(None, page_body(range(3, 5))),
+    )
+
+
+def test_top_is_sent_once_and_next_links_are_untouched():
+    session = two_pages()
+    api = client(session)
+    top = api.controller_for("/assets").page_size
+
+    assert walk(api, "/assets", {"$filter": "kind eq 'host'"}) == list(range(5))
+    assert session.urls == [f"{BASE_URL}/assets?$filter=kind eq 'host'&$top={top}", NEXT_LINK]
+
+
+def test_callers_top_is_the_starting_point():
+    session = two_pages()
+    walk(client(session), "assets/hosts", {"$top": 40})
+    assert session.urls[0] == f"{BASE_URL}/assets/hosts?$top=40"
+    assert session.urls[1] == NEXT_LINK
+
+
+def test_management_plane_is_never_adapted():
+    session = two_pages()
+    api = client(session, plane="management")
+
+    assert walk(api, "/assets") == list(range(5))
+    assert session.urls == [f"{BASE_URL}/assets", NEXT_LINK]
+    assert not api._controllers
+
+
+def test_unlisted_paths_and_stored_links_are_left_alone():
+    api = client(FakeSession())
+    assert not api.adapts("/discoGroups")
+    assert not api.adapts("/assetsummaries")
+    assert not api.adapts(NEXT_LINK)
+    assert api.adapts("/sslCertificates?$filter=x")
+
+    session = two_pages()
+    walk(client(session), NEXT_LINK)
+    assert session.urls == [NEXT_LINK, NEXT_LINK]
+
+
+def test_chunked_pages_are_capped_on_the_bytes_read(monkeypatch):
+    # No Content-Length, as on a chunked response; about 3 KB for 100 items
+    body = page_body(range(100))
+    monkeypatch.setattr(defender_easm_http, "MAX_PAGE_BYTES", 2000)
+    api = client(FakeSession(FakeResponse(None, body)))
+    ctrl = api.controller_for("/assets")
+
+    assert walk(api, "/assets") == list(range(100))
+    assert ctrl.bytes_per_item == len(body) / 100
+    # Shrunk to the largest page that fits
+    assert ctrl.page_size == int(2000 / ctrl.bytes_per_item)
@@ -0,0 +1,89 @@
+"""
+tests/test_collectors.py
+Microsoft Defender EASM for Splunk App
+Modular inputs run end to end against the EASM mock
+"""
+
+from functools import partial
+
+import pytest
+
+import defender_easm_common as common
+from defender_easm_all_assets import DefenderEASMAllAssets
+from defender_easm_asns import DefenderEASMAsnsInput
+import defender_easm_domains as domains
+import defender_easm_hosts as hosts
+import defender_easm_pages as pages
+from defender_easm_ssl_certificates import DefenderEASMSslCertificates
+
+
+def test_asns_hec_envelopes_carry_the_stanza_index(run_input, hec):
+    code, _ = run_input(DefenderEASMAsnsInput, "defender_easm_asns://x", index="easm_asns")
+
+    assert code == 0
+    assets = [e for e in hec.events if e["sourcetype"] == "defender:easm:asn"]
+    assert len(assets) == 5
+    assert {e.get("index") for e in assets} == {"easm_asns"}
+
+
+class KeySpy:
+    """
+    Records the checkpoint keys written to the state store, with the
+    stanza name replaced by <stanza>.
+    """
+
+    def __init__(self, monkeypatch):
+        self.stanza = None
+        self.keys = set()
+        set_many = common.EASMStateStore.set_many
+
+        def spy(store, values):
+            self.keys.update(key.replace(self.stanza, "<stanza>") for key in values)
+            return set_many(store, values)
+
+        monkeypatch.setattr(common.EASMStateStore, "set_many", spy)
+
+
+def management_input(module, cls, name):
+    return partial(cls, asset_name=name, sourcetype=module.SOURCETYPE, path=module.API_PATH)
+
+
+STANDALONE = {
+    "domains": (management_input(domains, domains.DefenderEASMDomains, "domains"), "defender_easm_domains://x"),
+    "pages": (management_input(pages, pages.DefenderEASMPages, "pages"), "defender_easm_pages://x"),
+    "hosts": (management_input(hosts, hosts.DefenderEASMHosts, "hosts"), "defender_easm_hosts://x"),
+    "asns": (DefenderEASMAsnsInput, "defender_easm_asns://x"),
+    "ssl_certificates": (DefenderEASMSslCertificates, "defender_easm_ssl_certificates"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(STANDALONE))
+def test_all_assets_uses_the_standalone_index_and_checkpoint_keys(run_input, hec, splunkd, monkeypatch, name):
+    splunkd["settings"]["target_index"] = "easm_targets"
+    spy = KeySpy(monkeypatch)
+    runs = []
+    for script, stanza, params in (
+        (*STANDALONE[name], {}),
+        (DefenderEASMAllAssets, "defender_easm_all_assets://x", {"asset_types": name}),
+    ):
+        hec.events.clear()
+        spy.stanza, spy.keys = stanza, set()
+        code, _ = run_input(script, stanza, index="easm_stanza", **params)
+        assert code == 0
+        assets = [e for e in hec.events if e["sourcetype"] != common.METRICS_SOURCETYPE]
+        runs.append(({e.get("index") for e in assets}, spy.keys, len(assets)))
+
+    standalone, combined = runs
+    assert standalone == combined
+    assert standalone[1] and standalone[2] == 5
+
+
+def test_ssl_certificates_listing_checkpoint_is_apart_from_the_run_namespace(run_input, hec, monkeypatch):
+    stanza = "defender_easm_ssl_certificates"
+    spy = KeySpy(monkeypatch)
+    spy.stanza = stanza
+
+    code, _ = run_input(DefenderEASMSslCertificates, stanza)
+
+    assert code == 0
+    assert spy.keys == {f"{common.APP_NAME}::ssl_certificates::<stanza>::nextlink"}
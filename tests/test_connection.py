@@ -0,0 +1,54 @@
+"""
+tests/test_connection.py
+Microsoft Defender EASM for Splunk App
+Per-stanza connection settings over the app setup
+"""
+
+import defender_easm_auth
+import defender_easm_common as common
+
+STANZA = {
+    "tenant_id": "tenant-b",
+    "client_id": "client-b",
+    "client_secret": "secret-b",
+    "subscription_id": "sub-b",
+    "resource_group": "rg-b",
+    "workspace_name": " ws-b ",
+    "interval": "3600",
+}
+
+
+def test_stanza_connection_keeps_only_the_connection_keys_it_sets():
+    assert common.stanza_connection({"tenant_id": "t", "client_id": ""}) == {"tenant_id": "t"}
+    assert common.stanza_connection(None) == {}
+    assert common.stanza_connection(STANZA)["workspace_name"] == "ws-b"
+    assert "interval" not in common.stanza_connection(STANZA)
+
+
+def test_management_url_uses_the_stanza_workspace():
+    url = common.get_management_base_url("session", common.stanza_connection(STANZA))
+    assert url.endswith(
+        "/subscriptions/sub-b/resourceGroups/rg-b/providers/Microsoft.Security"
+        "/externalAttackSurfaceManagementWorkspaces/ws-b"
+    )
+
+
+def test_token_provider_uses_the_stanza_tenant_and_secret(monkeypatch):
+    fetched = []
+
+    def fetch(session_key, cfg, scope, client_secret):
+        fetched.append((cfg["tenant_id"], cfg["client_id"], client_secret))
+        return {"access_token": f"token-{cfg['tenant_id']}", "expires_at": 2 ** 31}
+
+    monkeypatch.setattr(defender_easm_auth, "_fetch_token", fetch)
+    monkeypatch.setattr(defender_easm_auth, "_token_memo", {})
+
+    tenant_b = common.EASMTokenProvider("session", overrides=common.stanza_connection(STANZA))
+    tenant_c = common.EASMTokenProvider(
+        "session", overrides=common.stanza_connection({**STANZA, "tenant_id": "tenant-c"})
+    )
+
+    assert tenant_b.get_token() == "token-tenant-b"
+    assert tenant_c.get_token() == "token-tenant-c"
+    assert tenant_b.cache_key != tenant_c.cache_key
+    assert fetched == [("tenant-b", "client-b", "secret-b"), ("tenant-c", "client-b", "secret-b")]
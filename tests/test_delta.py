@@ -0,0 +1,80 @@
+"""
+tests/test_delta.py
+Microsoft Defender EASM for Splunk App
+Delta mode: which re-crawled assets count as changed
+"""
+
+import json
+
+import defender_easm_common as common
+from defender_easm_delta import _drop_paths, _path_tree
+
+
+def host(i, **changes):
+    item = {
+        "id": f"host$$h{i}",
+        "name": f"h{i}.contoso.com",
+        "updatedDate": "2024-06-01T00:00:00Z",
+        "asset": {
+            "lastSeen": "2024-06-01T00:00:00Z",
+            "count": 10,
+            "ipAddresses": [{"value": f"10.0.0.{i}", "count": 1, "recent": True}],
+            "webComponents": [{"name": "nginx", "count": 1}],
+        },
+    }
+    for path, value in changes.items():
+        node = item
+        *parents, last = path.split("__")
+        for name in parents:
+            node = node[name]
+        node[last] = value
+    return item
+
+
+def pull(items, full_every=0, **stanza):
+    """
+    One complete pull; returns the ids written.
+    """
+    with common.open_delta_index(
+        {"delta_mode": "true", "full_snapshot_every": str(full_every), **stanza}, "test::delta"
+    ) as delta:
+        return [json.loads(raw)["id"] for raw in delta.filter(json.dumps(item) for item in items)]
+
+
+def test_volatile_paths_do_not_make_an_asset_changed():
+    assert len(pull([host(i) for i in range(3)])) == 3
+
+    recrawled = [
+        host(0, updatedDate="2024-06-02T00:00:00Z"),
+        host(1, asset__lastSeen="2024-06-02T00:00:00Z"),
+        host(2, asset__count=11),
+    ]
+    assert pull(recrawled) == []
+
+
+def test_same_names_below_the_top_level_paths_still_count():
+    pull([host(i) for i in range(3)])
+
+    nested = [
+        host(0, asset__webComponents=[{"name": "nginx", "count": 2}]),
+        host(1, asset__ipAddresses=[{"value": "10.0.0.1", "count": 1, "recent": False}]),
+        host(2),
+    ]
+    assert pull(nested) == ["host$$h0", "host$$h1"]
+
+
+def test_ignore_fields_setting_replaces_the_defaults():
+    stanza = {"delta_ignore_fields": "asset.webComponents, name"}
+    pull([host(0)], **stanza)
+
+    assert pull([host(0, name="renamed", asset__webComponents=[])], **stanza) == []
+    assert pull([host(0, name="renamed", asset__webComponents=[], asset__count=3)], **stanza) == ["host$$h0"]
+
+
+def test_path_tree():
+    assert _path_tree(["a", "b.c", "b.d"]) == {"a": None, "b": {"c": None, "d": None}}
+    assert _path_tree(["b.c", "b"]) == {"b": None}
+
+    obj = {"a": 1, "b": [{"c": 1}], "c": {"c": 1, "d": 2}}
+    _drop_paths(obj, _path_tree(["a", "b.c", "c.c", "x.y"]))
+    assert obj == {"b": [{"c": 1}], "c": {"d": 2}}
@@ -0,0 +1,73 @@
+"""
+tests/test_event_writer.py
+Microsoft Defender EASM for Splunk App
+Batched stdout event output against splunklib's EventWriter
+"""
+
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+from splunklib.modularinput import Event, EventWriter
+
+import defender_easm_common as common
+
+EVENTS = [
+    '{"id":"host$$a","banner":"<html>&nbsp;</html>"}',
+    '{"id":"host$$b","notes":"ünïcödé \\" \'"}',
+    '{"id":"host$$c"}',
+]
+
+
+def splunklib_output():
+    out = io.StringIO()
+    ew = EventWriter(out, io.StringIO())
+    for data in EVENTS:
+        ew.write_event(Event(data=data, stanza="defender_easm_hosts://x", sourcetype="defender:easm:host"))
+    ew.close()
+    return out.getvalue()
+
+
+def test_output_is_byte_identical_to_splunklib():
+    out = io.StringIO()
+    ew = EventWriter(out, io.StringIO())
+    with common.EASMBatchEventWriter(ew, batch_bytes=1) as writer:
+        for data in EVENTS:
+            writer.write(data, stanza="defender_easm_hosts://x", sourcetype="defender:easm:host")
+    ew.close()
+
+    assert out.getvalue() == splunklib_output()
+
+
+def test_batches_share_one_stream_with_direct_writes():
+    out = io.StringIO()
+    ew = EventWriter(out, io.StringIO())
+    writer = common.EASMBatchEventWriter(ew, batch_bytes=1)
+
+    writer.write(EVENTS[0], sourcetype="a")
+    ew.write_event(Event(data=EVENTS[1], sourcetype="b"))
+    writer.write(EVENTS[2], sourcetype="c")
+    writer.close()
+    ew.close()
+
+    root = ET.fromstring(out.getvalue())
+    assert root.tag == "stream"
+    assert [e.findtext("sourcetype") for e in root] == ["a", "b", "c"]
+    assert out.getvalue().count("<stream>") == 1
+
+
+def test_nothing_written_leaves_no_stream():
+    out = io.StringIO()
+    ew = EventWriter(out, io.StringIO())
+    common.EASMBatchEventWriter(ew).close()
+    ew.close()
+    assert out.getvalue() == ""
+
+
+def test_event_writer_without_the_pinned_internals_is_refused():
+    class OtherWriter:
+        def write_event(self, event):
+            pass
+
+    with pytest.raises(RuntimeError, match="splunk-sdk"):
+        common.EASMBatchEventWriter(OtherWriter())
@@ -0,0 +1,189 @@
+"""
+tests/test_page_stream.py
+Microsoft Defender EASM for Splunk App
+Streamed page decoding and mid-body retries
+"""
+
+import json
+import time
+
+import pytest
+import requests
+
+import defender_easm_common as common
+
+BASE_URL = "https://easm.test/workspaces/ws"
+
+
+class FakeResponse:
+    """
+    A streamed response whose body can break off after cut bytes, either
+    with a transport error (reset=True) or by just ending.
+    """
+
+    def __init__(self, url, body, cut=None, reset=True, status_code=200):
+        self.url = url
+        self.status_code = status_code
+        self.headers = {}
+        self.body = body
+        self.cut = cut
+        self.reset = reset
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        end = len(self.body) if self.cut is None else self.cut
+        for start in range(0, end, 7):
+            yield self.body[start:min(start + 7, end)]
+        if self.cut is not None and self.reset:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken: IncompleteRead")
+
+    @property
+    def content(self):
+        return self.body
+
+    @property
+    def text(self):
+        return self.body.decode()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """
+    Serves the queued responses in order and records each URL requested.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def request(self, method, url, params=None, **kwargs):
+        if params:
+            url = f"{url}?" + "&".join(f"{k}={v}" for k, v in params.items())
+        self.urls.append(url)
+        resp = self.responses.pop(0)
+        resp.url = url
+        return resp
+
+
+def page_body(ids, next_link=None):
+    payload = {"value": [{"id": i, "name": f"asset-{i}"} for i in ids]}
+    if next_link:
+        payload["nextLink"] = next_link
+    return json.dumps(payload).encode()
+
+
+def client(session, prefetch_pages=0):
+    return common.EASMAPIClient(
+        BASE_URL,
+        session=session,
+        api_version=None,
+        prefetch_pages=prefetch_pages,
+        adaptive=False,
+        rate_limiter=common.EASMRateLimiter(rate=1000.0, burst=1000.0),
+    )
+
+
+def collect(api, raw=False):
+    seen, links = [], []
+    for page in api.list_pages("assets", raw=raw):
+        for item in page:
+            seen.append(json.loads(item)["id"] if raw else item["id"])
+        links.append(page.next_link)
+    return seen, links
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_reset_mid_page_rereads_the_page_and_skips_yielded_items(no_sleep, raw):
+    first = page_body(range(10), next_link=f"{BASE_URL}/assets?$skip=10")
+    second = page_body(range(10, 15))
+    broken = FakeResponse(None, first, cut=len(first) // 2)
+    session = FakeSession(broken, FakeResponse(None, first), FakeResponse(None, second))
+
+    seen, links = collect(client(session), raw=raw)
+
+    assert seen == list(range(15))
+    assert links == [f"{BASE_URL}/assets?$skip=10", None]
+    # The cut page was requested again at the very same URL
+    assert session.urls == [f"{BASE_URL}/assets", f"{BASE_URL}/assets", f"{BASE_URL}/assets?$skip=10"]
+    assert broken.closed
+
+
+def test_body_ending_early_is_retried(no_sleep):
+    body = page_body(range(6))
+    session = FakeSession(FakeResponse(None, body, cut=len(body) - 20, reset=False), FakeResponse(None, body))
+
+    seen, links = collect(client(session))
+
+    assert seen == list(range(6))
+    assert links == [None]
+    assert len(session.urls) == 2
+
+
+def test_cut_pages_draw_on_the_retry_limit(no_sleep):
+    body = page_body(range(6))
+    cut = [FakeResponse(None, body, cut=40) for _ in range(common.MAX_RETRIES + 1)]
+    session = FakeSession(*cut)
+
+    with pytest.raises(common.EASMPageCutError):
+        collect(client(session))
+    assert len(session.urls) == common.MAX_RETRIES + 1
+
+
+def test_invalid_json_is_not_retried(no_sleep):
+    session = FakeSession(FakeResponse(None, b'{"value": [{"id": 1}, oops]}'), FakeResponse(None, page_body([1])))
+
+    with pytest.raises(common.EASMAPIError) as info:
+        collect(client(session))
+    assert not isinstance(info.value, common.EASMPageCutError)
+    assert len(session.urls) == 1
+
+
+def test_prefetched_stream_requests_the_next_page_while_the_current_one_is_written(no_sleep):
+    first = page_body(range(10), next_link=f"{BASE_URL}/assets?$skip=10")
+    broken = page_body(range(10, 15))
+    session = FakeSession(
+        FakeResponse(None, first),
+        FakeResponse(None, broken, cut=len(broken) // 2),
+        FakeResponse(None, broken),
+    )
+
+    seen, links = [], []
+    for page in client(session, prefetch_pages=2).list_pages("assets"):
+        for item in page:
+            if not seen:
+                # Writer holds the first item; the fetcher carries on
+                deadline = time.monotonic() + 5
+                while len(session.urls) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                assert len(session.urls) >= 2
+            seen.append(item["id"])
+        links.append(page.next_link)
+
+    assert seen == list(range(15))
+    assert links == [f"{BASE_URL}/assets?$skip=10", None]
+    assert len(session.urls) == 3
+
+
+def test_prefetcher_closed_early_stops_the_fetcher_and_closes_its_source():
+    fetched, closed = [], []
+
+    def source():
+        try:
+            for n in range(100):
+                fetched.append(n)
+                yield n
+        finally:
+            closed.append(True)
+
+    with common.EASMPrefetcher(source(), depth=2) as prefetcher:
+        for page in prefetcher:
+            break
+
+    assert closed == [True]
+    assert not prefetcher._thread.is_alive()
+    assert prefetcher._queue.empty()
+    # No more than the queue's worth was read ahead
+    assert len(fetched) <= 4
+
@@ -0,0 +1,103 @@
+"""
+tests/test_partitioned_listing.py
+Microsoft Defender EASM for Splunk App
+Parallel $filter slices: plan reuse and resuming mid-page
+"""
+
+import json
+
+import pytest
+
+import defender_easm_common as common
+import defender_easm_listing
+
+KEY = "test::partitions"
+
+
+def listing(api, monkeypatch, params=None, partitions=2, count=False):
+    out = common.EASMPartitionedListing(api, "/assets", KEY, partitions, params=params or {"$filter": "kind eq 'host'"})
+    monkeypatch.setattr(out, "_bound", lambda order: 1_000_000.0 if order == "asc" else 2_000_000.0)
+    if not count:
+        monkeypatch.setattr(out, "_count", lambda flt: None)
+    return out
+
+
+def ids(emitted):
+    return [json.loads(raw)["id"] for raw in emitted]
+
+
+def failing_after(n, emitted):
+    def emit(items):
+        if len(emitted) + len(items) > n:
+            raise RuntimeError("crash")
+        emitted.extend(items)
+    return emit
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(defender_easm_listing, "SLICE_BATCH_ITEMS", 2)
+
+
+def test_pages_are_streamed_to_emit_page(fake_api, small_batches, monkeypatch):
+    api = fake_api()
+    emitted = []
+
+    def emit(items):
+        api.log.append(("emit", len(items)))
+        emitted.extend(items)
+
+    # One worker, so reads and writes are not interleaved with another slice's
+    assert listing(api, monkeypatch, partitions=1).run(emit) == 8
+    assert sorted(ids(emitted)) == api.everything()
+    # No page is read to the end before its first items are written
+    first_emit = api.log.index(("emit", 2))
+    assert sum(1 for entry in api.log[:first_emit] if entry[0] == "read") == 2
+
+
+def test_resume_after_a_crash_mid_page_writes_each_item_once(fake_api, small_batches, monkeypatch):
+    api = fake_api()
+    emitted = []
+    with pytest.raises(RuntimeError):
+        listing(api, monkeypatch).run(failing_after(6, emitted))
+    plan = json.loads(common.get_checkpoint(KEY))
+    assert any(sl["offset"] for sl in plan["slices"])
+
+    listing(api, monkeypatch).run(emitted.extend)
+
+    # Ids are unique, so nothing was written twice
+    assert sorted(ids(emitted)) == api.everything()
+    assert common.get_checkpoint(KEY) is None
+
+
+def test_stored_plan_needs_the_same_query_and_partitioning(fake_api, small_batches, monkeypatch):
+    api = fake_api()
+    with pytest.raises(RuntimeError):
+        listing(api, monkeypatch).run(failing_after(3, []))
+
+    for changed in ({"params": {"$filter": "kind eq 'domain'"}}, {"partitions": 3}):
+        stored = json.loads(common.get_checkpoint(KEY))
+        api.walks.clear()
+        with pytest.raises(RuntimeError):
+            listing(api, monkeypatch, **changed).run(failing_after(0, []))
+        # Re-planned: every slice starts from its first page again
+        assert all(first == 0 and params is not None for _, first, params in api.walks)
+        assert json.loads(common.get_checkpoint(KEY))["signature"] != stored["signature"]
+
+    # The same listing again picks the plan up where it stopped
+    with pytest.raises(RuntimeError):
+        listing(api, monkeypatch, partitions=3).run(failing_after(3, []))
+    before = set(api.slices)
+    emitted = []
+    listing(api, monkeypatch, partitions=3).run(emitted.extend)
+    assert set(api.slices) == before
+    assert len(emitted) == 3 * 8 - 2
+
+
+def test_count_errors_fall_back_to_equal_width_slices(fake_api, small_batches, monkeypatch):
+    api = fake_api()
+    emitted = []
+
+    # $count raising is planned like a service without $count support
+    assert listing(api, monkeypatch, count=True).run(emitted.extend) == 16
+    assert sorted(ids(emitted)) == api.everything()
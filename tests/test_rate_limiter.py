@@ -0,0 +1,101 @@
+"""
+tests/test_rate_limiter.py
+Microsoft Defender EASM for Splunk App
+Shared token bucket leases and per-run retry budgets
+"""
+
+import json
+import threading
+
+import defender_easm_common as common
+
+HOST = "easm.test"
+
+
+def bucket(limiter):
+    with open(limiter._state_path()) as f:
+        return json.load(f)[HOST]
+
+
+def count_updates(limiter, monkeypatch):
+    calls = []
+    update = limiter._update
+
+    def counted(host, fn):
+        calls.append(host)
+        return update(host, fn)
+
+    monkeypatch.setattr(limiter, "_update", counted)
+    return calls
+
+
+def test_tokens_are_leased_in_batches(monkeypatch):
+    limiter = common.EASMRateLimiter(rate=20.0, burst=40.0)
+    calls = count_updates(limiter, monkeypatch)
+
+    for _ in range(10):
+        limiter.acquire(HOST)
+
+    # 0.25 s of a 20/s rate is 5 tokens per lease: 2 file updates, not 10
+    assert len(calls) == 2
+    assert limiter.stats["leases"] == 2
+    assert bucket(limiter)["tokens"] < 40.0 - 9
+
+
+def test_unused_lease_goes_back_to_the_bucket(monkeypatch):
+    limiter = common.EASMRateLimiter(rate=20.0, burst=40.0)
+    limiter.acquire(HOST)
+    assert limiter._leases[HOST][0] == 4.0
+
+    # Lapse the lease; the next one hands the 4 unused tokens back first
+    limiter._leases[HOST][1] = 0.0
+    limiter.acquire(HOST)
+    assert 40.0 - 6.0 <= bucket(limiter)["tokens"] <= 40.0 - 5.0 + 0.5
+
+
+def test_another_process_429_holds_back_the_next_lease():
+    mine, other = common.EASMRateLimiter(), common.EASMRateLimiter()
+    mine.acquire(HOST)
+
+    other.block(HOST, 30.0)
+
+    wait, granted = mine._update(HOST, lambda b, now: mine._lease(b, now, 0.0))
+    assert granted == 0.0 and wait > 25.0
+
+
+def test_own_429_stops_local_lease_at_once():
+    limiter = common.EASMRateLimiter()
+    limiter.acquire(HOST)
+    limiter.block(HOST, 30.0)
+    assert HOST not in limiter._leases
+    assert limiter._blocked[HOST] > 0
+
+
+def test_retry_budget_is_per_input_run():
+    limiter = common.EASMRateLimiter(retry_budget=3)
+
+    with common.EASMRunGuard("test::run-1") as run:
+        assert [limiter.take_retry() for _ in range(4)] == [True, True, True, False]
+        assert run.retries == 3
+
+    # A new run (the next launch, or the next stanza) starts afresh
+    with common.EASMRunGuard("test::run-2"):
+        assert limiter.take_retry()
+
+    assert limiter.stats["retries"] == 4
+
+
+def test_worker_threads_spend_their_runs_budget():
+    limiter = common.EASMRateLimiter(retry_budget=4)
+    results = []
+
+    with common.EASMRunGuard("test::run") as run:
+        worker = common.run_context_bound(lambda: results.extend(limiter.take_retry() for _ in range(3)))
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sorted(results) == [False, False, True, True, True, True]
+    assert run.retries == 4
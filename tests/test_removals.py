@@ -0,0 +1,103 @@
+"""
+tests/test_removals.py
+Microsoft Defender EASM for Splunk App
+Removed-asset tombstones from id snapshots
+"""
+
+import json
+
+import pytest
+
+import defender_easm_common as common
+import defender_easm_removals
+
+
+@pytest.fixture(params=["numpy", "pure-python"])
+def sorter(request, monkeypatch):
+    """
+    Runs each test with numpy (when installed) and with the pure-Python
+    sort, the latter in tiny runs so the run merge is exercised.
+    """
+    if request.param == "numpy":
+        if defender_easm_removals.np is None:
+            pytest.skip("numpy not installed")
+    else:
+        monkeypatch.setattr(defender_easm_removals, "np", None)
+        monkeypatch.setattr(defender_easm_removals, "_SORT_RUN", 3)
+    return request.param
+
+
+def pull(ids, complete=True, written=None):
+    """
+    One pull listing ids; returns the ids tombstoned.
+    """
+    removed = []
+    tracker = common.EASMRemovalTracker("test::ids", "hosts", lambda raw: removed.append(json.loads(raw)))
+    items = [json.dumps({"id": i, "name": f"host-{i}"}) for i in ids]
+    for raw in tracker.track(items):
+        if written is not None:
+            written.append(raw)
+    tracker.finish(complete=complete)
+    return sorted(t["id"] for t in removed)
+
+
+def test_tombstones_are_the_ids_gone_since_the_last_complete_pull(sorter):
+    first = [f"asset-{i}" for i in range(50)]
+    assert pull(first) == []
+
+    second = first[5:40] + ["asset-new-1", "asset-new-2"]
+    assert pull(second) == sorted(first[:5] + first[40:])
+
+    # Nothing else disappeared: the second pull is now the baseline
+    assert pull(second + ["asset-new-3"]) == []
+
+
+def test_duplicate_ids_within_a_pull_count_once(sorter):
+    pull(["a", "b", "c", "b", "a"])
+    assert pull(["c", "c"]) == ["a", "b"]
+
+
+def test_tombstone_record_fields(sorter):
+    removed = []
+    for ids in (["a", "b"], ["a"]):
+        tracker = common.EASMRemovalTracker("test::ids", "domains", removed.append)
+        list(tracker.track(json.dumps({"id": i}) for i in ids))
+        tracker.finish(complete=True)
+
+    (record,) = [json.loads(raw) for raw in removed]
+    assert record["id"] == "b"
+    assert record["assetType"] == "domains"
+    assert record["state"] == "removed"
+    assert record["removedDate"].endswith("Z") and record["lastSnapshotDate"].endswith("Z")
+
+
+def test_interrupted_pull_resumes_its_snapshot(sorter):
+    ids = [f"asset-{i}" for i in range(20)]
+    pull(ids)
+
+    # The first half, then a crash: nothing may be treated as removed
+    assert pull(ids[:10], complete=False) == []
+    # The resumed pull lists only the rest, and the spool fills the gap
+    assert pull(ids[10:19]) == ["asset-19"]
+
+
+def test_empty_pull_keeps_the_previous_snapshot(sorter):
+    pull(["a", "b"])
+    assert pull([]) == []
+    assert pull(["a"]) == ["b"]
+
+
+def test_items_pass_through_unchanged(sorter):
+    written = []
+    pull(["x", "y"], written=written)
+    assert [json.loads(raw)["id"] for raw in written] == ["x", "y"]
+
+
+def test_tracking_is_opt_in():
+    def write(raw):
+        raise AssertionError("no tombstones expected")
+
+    assert not common.open_removal_tracker({}, "test::ids", "hosts", write).enabled
+    tracker = common.open_removal_tracker({"track_removals": "1"}, "test::ids", "hosts", write)
+    assert tracker.enabled
+    tracker.finish(complete=False)
@@ -0,0 +1,75 @@
+"""
+tests/test_resumable_listing.py
+Microsoft Defender EASM for Splunk App
+Item-level resume points: crash, resume, and pages that shift in between
+"""
+
+import json
+
+import pytest
+
+import defender_easm_common as common
+
+KEY = "test::nextlink"
+
+
+def ids(n_pages, per_page):
+    return [[f"p{p}-{i}" for i in range(per_page)] for p in range(n_pages)]
+
+
+def drain(api, emitted, fail_after=None, every=2):
+    with common.EASMResumableListing(api, KEY, "/assets", raw=True, every=every) as listing:
+        for page in listing.pages():
+            for raw in page:
+                if fail_after is not None and len(emitted) == fail_after:
+                    raise RuntimeError("crash")
+                emitted.append(json.loads(raw)["id"])
+    return listing
+
+
+def test_resume_after_a_crash_writes_each_item_once(fake_api):
+    api = fake_api(ids(3, 5))
+    emitted = []
+    with pytest.raises(RuntimeError):
+        drain(api, emitted, fail_after=7)
+
+    point = json.loads(common.get_checkpoint(KEY))
+    assert (point["cursor"], point["offset"], point["last_id"]) == ("page/1", 2, "p1-1")
+
+    listing = drain(api, emitted)
+    assert listing.resumed
+    assert api.starts[-1] == "page/1"
+    assert emitted == [i for page in api.pages for i in page]
+    assert common.get_checkpoint(KEY) is None
+
+
+def test_shifted_page_lines_up_on_the_last_written_id(fake_api):
+    api = fake_api(ids(2, 5))
+    emitted = []
+    with pytest.raises(RuntimeError):
+        drain(api, emitted, fail_after=3)
+
+    # Two new items land ahead of the ones already written
+    api.pages[0][0:0] = ["new-0", "new-1"]
+    drain(api, emitted)
+    assert emitted == ["p0-0", "p0-1", "p0-2", "p0-3", "p0-4"] + api.pages[1]
+
+
+def test_page_without_the_last_written_id_is_written_again_whole(fake_api):
+    api = fake_api(ids(2, 4))
+    emitted = []
+    with pytest.raises(RuntimeError):
+        drain(api, emitted, fail_after=2)
+
+    api.pages[0] = ["q-0", "q-1", "q-2"]
+    drain(api, emitted)
+    # Duplicates rather than a gap
+    assert emitted == ["p0-0", "p0-1", "q-0", "q-1", "q-2"] + api.pages[1]
+
+
+def test_bare_nextlink_checkpoint_is_read_as_a_cursor(fake_api):
+    api = fake_api(ids(3, 2))
+    common.save_checkpoint(KEY, "page/2")
+    emitted = []
+    drain(api, emitted)
+    assert emitted == api.pages[2]
@@ -0,0 +1,53 @@
+"""
+tests/test_run_guard.py
+Microsoft Defender EASM for Splunk App
+Overlapping launches are skipped, recorded and reported as metrics
+"""
+
+import json
+
+import defender_easm_common as common
+
+NAMESPACE = f"{common.APP_NAME}::hosts::test"
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.events = []
+
+    def write(self, data, **meta):
+        self.events.append((json.loads(data), meta))
+
+
+def test_overlapping_launch_is_skipped_and_written_as_metrics():
+    ew = RecordingWriter()
+    with common.open_run_guard({}, NAMESPACE, ew=ew, stanza_name="test") as running:
+        assert running.acquired
+        with common.open_run_guard({}, NAMESPACE, ew=ew, stanza_name="test") as overlap:
+            assert not overlap.acquired
+
+    ((record, meta),) = ew.events
+    assert meta["sourcetype"] == common.METRICS_SOURCETYPE
+    assert record["record"] == "run"
+    assert record["status"] == "skipped"
+    assert record["reason"] == "previous run still in progress"
+    assert record["input"] == "hosts" and record["stanza"] == "test"
+    assert record["items"] == 0
+
+    assert [r["status"] for r in common.get_state_store().runs(NAMESPACE)] == ["skipped"]
+
+
+def test_acquired_run_writes_nothing_itself():
+    ew = RecordingWriter()
+    with common.open_run_guard({}, NAMESPACE, ew=ew, stanza_name="test") as guard:
+        assert guard.acquired
+    assert ew.events == []
+
+
+def test_metrics_off_leaves_only_the_run_history():
+    ew = RecordingWriter()
+    with common.open_run_guard({}, NAMESPACE):
+        with common.open_run_guard({"metrics": "false"}, NAMESPACE, ew=ew) as overlap:
+            assert not overlap.acquired
+    assert ew.events == []
+    assert common.get_state_store().runs(NAMESPACE)[0]["status"] == "skipped"
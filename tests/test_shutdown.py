@@ -0,0 +1,65 @@
+"""
+tests/test_shutdown.py
+Microsoft Defender EASM for Splunk App
+SIGTERM / SIGINT only flag the stop; check_shutdown() acts on it
+"""
+
+import io
+import os
+import signal
+import threading
+import time
+
+import pytest
+from splunklib.modularinput import EventWriter
+
+import defender_easm_all_assets
+import defender_easm_common as common
+import defender_easm_runs
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    monkeypatch.setattr(defender_easm_runs, "_shutdown", threading.Event())
+    saved = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+    yield
+    for sig, handler in saved.items():
+        signal.signal(sig, handler)
+
+
+def test_signal_sets_the_flag_without_raising(handlers):
+    common.install_shutdown_handlers()
+    common.check_shutdown()
+
+    os.kill(os.getpid(), signal.SIGTERM)
+
+    # A second signal is left to kill the process
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+    assert signal.getsignal(signal.SIGINT) is signal.SIG_DFL
+    assert common.shutdown_requested()
+    with pytest.raises(common.EASMShutdown):
+        common.check_shutdown()
+
+
+def test_opening_an_event_writer_leaves_the_signal_handlers_alone(handlers, splunkd):
+    before = signal.getsignal(signal.SIGTERM)
+
+    common.open_event_writer(EventWriter(io.StringIO(), io.StringIO()), "test-session-key").close()
+
+    assert signal.getsignal(signal.SIGTERM) is before
+
+
+def test_all_assets_waits_a_bounded_time_for_workers_after_a_stop(handlers, monkeypatch):
+    monkeypatch.setattr(defender_easm_all_assets, "SHUTDOWN_JOIN_SECONDS", 0.2)
+    release = threading.Event()
+    scheduler = defender_easm_all_assets._FairScheduler(2)
+    # Stuck in a request that does not look at the flag
+    scheduler.submit(defender_easm_all_assets.BULK, "hosts", lambda: release.wait(10))
+    common.install_shutdown_handlers()
+
+    threading.Timer(0.1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+    started = time.monotonic()
+    scheduler.run()
+    release.set()
+
+    assert time.monotonic() - started < 5
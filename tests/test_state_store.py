@@ -0,0 +1,99 @@
+"""
+tests/test_state_store.py
+Microsoft Defender EASM for Splunk App
+SQLite state store: grouped commits, legacy checkpoint import, run history
+"""
+
+import json
+import os
+import time
+
+import defender_easm_common as common
+import defender_easm_state
+
+NAMESPACE = f"{common.APP_NAME}::hosts::test"
+
+
+def store_path():
+    return common.get_state_store().path
+
+
+def test_grouped_writes_commit_together_and_survive_a_reopen():
+    store = common.get_state_store()
+    store.set_many({f"{NAMESPACE}::nextlink": "page/2", f"{NAMESPACE}::watermark": "w1"})
+
+    # Staged: read back by this process, not yet visible to another one
+    other = common.EASMStateStore(store_path())
+    assert store.get(f"{NAMESPACE}::nextlink") == "page/2"
+    assert other.get(f"{NAMESPACE}::nextlink") is None
+
+    store.flush()
+    assert other.get(f"{NAMESPACE}::nextlink") == "page/2"
+    assert other.get(f"{NAMESPACE}::watermark") == "w1"
+    other.close()
+
+    common.save_checkpoint(f"{NAMESPACE}::nextlink", None)
+    common.close_state_store()
+    assert common.get_checkpoint(f"{NAMESPACE}::nextlink") is None
+    assert common.get_checkpoint(f"{NAMESPACE}::watermark") == "w1"
+
+
+def test_idle_checkpoint_is_committed_without_a_further_write(monkeypatch):
+    monkeypatch.setattr(defender_easm_state, "STATE_COMMIT_SECONDS", 0.05)
+    common.get_state_store().set(f"{NAMESPACE}::nextlink", "page/3")
+
+    # Another process sees it once the group's time is up, though nothing else was written
+    other = common.EASMStateStore(store_path())
+    deadline = time.monotonic() + 5
+    while other.get(f"{NAMESPACE}::nextlink") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert other.get(f"{NAMESPACE}::nextlink") == "page/3"
+    other.close()
+
+
+def test_legacy_checkpoint_file_is_moved_into_the_store():
+    key = f"{NAMESPACE}::nextlink"
+    path = defender_easm_state.legacy_checkpoint_path(key)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"value": "page/7", "updated": 0}, f)
+
+    assert common.get_checkpoint(key) == "page/7"
+    assert not os.path.exists(path)
+    assert common.get_state_store().stats["migrated"] == 1
+
+    common.close_state_store()
+    assert common.get_checkpoint(key) == "page/7"
+
+
+def test_cleared_key_does_not_come_back_from_a_legacy_file():
+    key = f"{NAMESPACE}::nextlink"
+    common.save_checkpoint(key, "page/1")
+    common.get_state_store().flush()
+
+    # Left behind by an older version running alongside
+    with open(defender_easm_state.legacy_checkpoint_path(key), "w", encoding="utf-8") as f:
+        json.dump({"value": "stale"}, f)
+
+    common.save_checkpoint(key, None)
+    common.close_state_store()
+    assert common.get_checkpoint(key) is None
+
+
+def test_run_history_is_newest_first_and_trimmed(monkeypatch):
+    monkeypatch.setattr(defender_easm_state, "STATE_RUN_HISTORY", 3)
+    store = common.get_state_store()
+    for n in range(5):
+        store.record_run(NAMESPACE, float(n), float(n) + 1, "ok", n)
+    store.record_run(f"{common.APP_NAME}::domains::test", 0.0, 1.0, "error", 0, "boom")
+
+    assert [r["events"] for r in store.runs(NAMESPACE)] == [4, 3, 2]
+    assert store.runs(NAMESPACE, limit=1)[0]["status"] == "ok"
+    assert store.runs(f"{common.APP_NAME}::domains::test")[0]["detail"] == "boom"
+
+
+def test_tuning_round_trip():
+    store = common.get_state_store()
+    assert store.get_tuning("/assets") is None
+    store.set_tuning("/assets", {"page_size": 250, "limit": 4.0})
+    common.close_state_store()
+    assert common.get_state_store().get_tuning("/assets") == {"page_size": 250, "limit": 4.0}
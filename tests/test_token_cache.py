@@ -0,0 +1,89 @@
+"""
+tests/test_token_cache.py
+Microsoft Defender EASM for Splunk App
+Shared on-disk token cache
+"""
+
+import os
+import stat
+import time
+
+import pytest
+
+import defender_easm_auth
+from defender_easm_auth import _token_cache_path, _token_cache_read, _token_cache_write
+
+SECRET = "client-secret"
+
+# The disk cache only exists with cryptography (tokens are never stored in plaintext)
+needs_cryptography = pytest.mark.skipif(defender_easm_auth.AESGCM is None, reason="cryptography not installed")
+
+
+def entry(token="token-1", ttl=3600):
+    return {"access_token": token, "expires_at": int(time.time()) + ttl}
+
+
+@needs_cryptography
+def test_cache_file_is_owner_only_whatever_the_umask():
+    old = os.umask(0)
+    try:
+        _token_cache_write("key", SECRET, entry())
+    finally:
+        os.umask(old)
+
+    mode = stat.S_IMODE(os.stat(_token_cache_path()).st_mode)
+    assert mode == 0o600
+
+
+@needs_cryptography
+def test_round_trip_and_expired_entries_are_dropped():
+    _token_cache_write("old", SECRET, entry("stale", ttl=-1))
+    _token_cache_write("key", SECRET, entry("token-2"))
+
+    assert _token_cache_read("key", SECRET)["access_token"] == "token-2"
+    assert _token_cache_read("old", SECRET) is None
+
+
+@needs_cryptography
+def test_leftover_tmp_file_does_not_block_writes():
+    path = _token_cache_path()
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        f.write("partial")
+
+    _token_cache_write("key", SECRET, entry())
+
+    assert _token_cache_read("key", SECRET)["access_token"] == "token-1"
+    assert not os.path.exists(f"{path}.{os.getpid()}.tmp")
+
+
+@needs_cryptography
+def test_token_is_encrypted_when_cryptography_is_available():
+    _token_cache_write("key", SECRET, entry("secret-token"))
+
+    with open(_token_cache_path()) as f:
+        assert "secret-token" not in f.read()
+    assert _token_cache_read("key", SECRET)["access_token"] == "secret-token"
+    # A rotated client secret turns the cached token into a miss
+    assert _token_cache_read("key", "rotated") is None
+
+
+def test_without_cryptography_nothing_is_written(monkeypatch):
+    monkeypatch.setattr(defender_easm_auth, "AESGCM", None)
+    monkeypatch.setattr(defender_easm_auth, "_token_cache_disabled_logged", False)
+    warnings = []
+    monkeypatch.setattr(defender_easm_auth.get_logger("auth"), "warning", warnings.append)
+
+    _token_cache_write("key", SECRET, entry("live-token"))
+    _token_cache_write("other", SECRET, entry("live-token"))
+
+    assert not os.path.exists(_token_cache_path())
+    assert _token_cache_read("key", SECRET) is None
+    # Warned once per process, not on every fetch
+    assert len(warnings) == 1
+
+
+def test_plaintext_records_from_older_releases_are_ignored():
+    with open(_token_cache_path(), "w") as f:
+        f.write('{"key": {"access_token": "live-token", "expires_at": %d}}' % (time.time() + 3600))
+
+    assert _token_cache_read("key", SECRET) is None
@@ -0,0 +1,85 @@
+"""
+tests/test_watermark.py
+Microsoft Defender EASM for Splunk App
+Watermark pulls: ids at the boundary instant, skew and reconciliation
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+
+import defender_easm_common as common
+
+KEY = "test::watermark"
+T1 = "2024-06-01T00:00:00Z"
+T2 = "2024-06-02T00:00:00Z"
+
+
+def asset(item_id, updated):
+    return json.dumps({"id": item_id, "updatedDate": updated})
+
+
+def pull(items, reconcile_every=0):
+    """
+    One complete pull; returns (ids written, the watermark).
+    """
+    watermark = common.EASMWatermark(KEY, reconcile_every=reconcile_every)
+    written = [json.loads(raw)["id"] for raw in watermark.track(items)]
+    common.save_checkpoints(watermark.checkpoint())
+    return written, watermark
+
+
+def stored():
+    return json.loads(common.get_checkpoint(KEY))
+
+
+def test_ids_at_the_boundary_are_skipped_once_and_new_ties_are_written():
+    written, watermark = pull([asset("a", T1), asset("b", T1), asset("c", "2024-05-01T00:00:00Z")])
+    assert watermark.full and written == ["a", "b", "c"]
+    assert (stored()["value"], stored()["ids"]) == (T1, ["a", "b"])
+
+    # "ge" lists the boundary again: a and b were written, d is new at T1
+    written, watermark = pull([asset("a", T1), asset("b", T1), asset("d", T1)])
+    assert not watermark.full
+    assert watermark.filter == f"updatedDate ge {T1}"
+    assert written == ["d"]
+    assert watermark.stats["skipped"] == 2
+    assert stored()["ids"] == ["a", "b", "d"]
+
+    # Moving past the boundary keeps only the ids at the new instant
+    written, _ = pull([asset("a", T1), asset("b", T1), asset("d", T1), asset("e", T2)])
+    assert written == ["e"]
+    assert (stored()["value"], stored()["ids"]) == (T2, ["e"])
+
+
+def test_values_within_the_skew_of_the_pull_start_do_not_move_it():
+    pull([asset("a", T1)])
+
+    recent = datetime.fromtimestamp(time.time() - 10, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    written, _ = pull([asset("a", T1), asset("b", recent)])
+
+    assert written == ["b"]
+    # Still on T1, so b is listed (and written) again next run
+    assert (stored()["value"], stored()["ids"]) == (T1, ["a"])
+
+
+def test_every_nth_pull_is_a_full_reconciliation():
+    kinds = [pull([asset("a", T1)], reconcile_every=2)[1].full for _ in range(4)]
+    assert kinds == [True, False, True, False]
+
+
+def test_an_interrupted_pull_resumes_as_the_same_kind_with_its_progress():
+    pull([asset("a", T1)])
+
+    interrupted = common.EASMWatermark(KEY)
+    assert list(interrupted.track([asset("b", T2)]))
+    progress = json.loads(json.dumps(interrupted.progress))
+
+    # reconcile_every = 1 would make a new pull full; the pending one stays incremental
+    resumed = common.EASMWatermark(KEY, reconcile_every=1)
+    assert not resumed.full
+    resumed.resume(progress)
+    assert [json.loads(raw)["id"] for raw in resumed.track([asset("c", T1)])] == ["c"]
+    common.save_checkpoints(resumed.checkpoint())
+
+    assert (stored()["value"], stored()["ids"]) == (T2, ["b"])